@@ -0,0 +1,102 @@
+'''
+The copyright in this software is being made available under the Clear BSD
+License, included below. No patent rights, trademark rights and/or
+other Intellectual Property Rights other than the copyrights concerning
+the Software are granted under this license.
+
+The Clear BSD License
+
+Copyright (c) 2019-2025, Fraunhofer-Gesellschaft zur Förderung der angewandten Forschung e.V. & The NNCodec Authors.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted (subject to the limitations in the disclaimer below) provided that
+the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+     this list of conditions and the following disclaimer.
+
+     * Redistributions in binary form must reproduce the above copyright
+     notice, this list of conditions and the following disclaimer in the
+     documentation and/or other materials provided with the distribution.
+
+     * Neither the name of the copyright holder nor the names of its
+     contributors may be used to endorse or promote products derived from this
+     software without specific prior written permission.
+
+NO EXPRESS OR IMPLIED LICENSES TO ANY PARTY'S PATENT RIGHTS ARE GRANTED BY
+THIS LICENSE. THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+'''
+import time
+import argparse
+import numpy as np
+from nncodec.extensions import deepCABAC
+from nncodec.nnc_core.approximator import codebook
+from nncodec.nnc_core.hdsp.hdsp_tool import HDSP_OPTS_OFF
+
+parser = argparse.ArgumentParser(description='Compares the histogram-based codebook zero-offset search with the exhaustive search')
+parser.add_argument('--rows', type=int, default=512, help='number of rows of the synthetic tensors (default: 512)')
+parser.add_argument('--cols', type=int, default=512, help='number of columns of the synthetic tensors (default: 512)')
+parser.add_argument('--qp', type=int, default=-38, help='quantization parameter (default: -38)')
+parser.add_argument('--cabac_unary_length_minus1', type=int, default=10, help='number of greater flags (default: 10)')
+parser.add_argument('--max_loss', type=float, default=0.5, help='maximum allowed bitstream size increase in percent (default: 0.5)')
+
+def synthetic_tensors(rows, cols):
+    rng = np.random.default_rng(0)
+    return {
+        "gaussian": rng.normal(0, 0.02, (rows, cols)),
+        "laplace": rng.laplace(0, 0.02, (rows, cols)),
+        "skewed": rng.gamma(2.0, 0.02, (rows, cols)) - 0.02,
+        "sparse": rng.normal(0, 0.05, (rows, cols)) * (rng.random((rows, cols)) < 0.2),
+        "positive": np.abs(rng.normal(0, 0.02, (rows, cols))),
+    }
+
+def quantize(weights, qp):
+    weights = np.ascontiguousarray(weights, dtype=np.float32)
+    levels = np.zeros(weights.shape, dtype=np.int32)
+    encoder = deepCABAC.Encoder()
+    encoder.initCtxModels(10, 0)
+    encoder.quantLayer(weights, levels, 0, 2, qp, 0.0, 10, 0, 0)
+    return levels
+
+def encoded_bytes(indexes, cabac_unary_length_minus1):
+    encoder = deepCABAC.Encoder()
+    encoder.initCtxModels(cabac_unary_length_minus1, 1)
+    encoder.encodeLayer(indexes, 0, 0, 0, 0, 0, np.zeros(indexes.shape[0], dtype=np.int32), *HDSP_OPTS_OFF(), 0, 0)
+    return len(encoder.finish())
+
+def main():
+    args = parser.parse_args()
+
+    worst_loss = 0.0
+    for name, weights in synthetic_tensors(args.rows, args.cols).items():
+        cb, indices = codebook.derive_sorted_codebook_from_tensor(quantize(weights, args.qp))
+
+        results = []
+        for exhaustive in [True, False]:
+            start = time.perf_counter()
+            _, indexes, offset = codebook.get_codebook_offset(cb, indices, args.cabac_unary_length_minus1, exhaustive=exhaustive)
+            elapsed = time.perf_counter() - start
+            results.append((offset, encoded_bytes(indexes, args.cabac_unary_length_minus1), elapsed))
+
+        (ref_offset, ref_bytes, ref_time), (offset, num_bytes, elapsed) = results
+        loss = 100.0 * (num_bytes - ref_bytes) / ref_bytes
+        worst_loss = max(worst_loss, loss)
+        print(f"{name:9s} codebook: {len(cb):5d}  exhaustive: offset {ref_offset:5d} {ref_bytes:9d} bytes {ref_time:8.3f} s  |  "
+              f"histogram: offset {offset:5d} {num_bytes:9d} bytes {elapsed:8.3f} s  |  speed-up: {ref_time / elapsed:6.1f}x  size: {loss:+.3f} %")
+
+    if worst_loss > args.max_loss:
+        raise SystemExit(f"Histogram-based search loses {worst_loss:.3f} % > {args.max_loss} % against the exhaustive search")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+'''
+The copyright in this software is being made available under the Clear BSD
+License, included below. No patent rights, trademark rights and/or
+other Intellectual Property Rights other than the copyrights concerning
+the Software are granted under this license.
+
+The Clear BSD License
+
+Copyright (c) 2019-2025, Fraunhofer-Gesellschaft zur Förderung der angewandten Forschung e.V. & The NNCodec Authors.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted (subject to the limitations in the disclaimer below) provided that
+the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+     this list of conditions and the following disclaimer.
+
+     * Redistributions in binary form must reproduce the above copyright
+     notice, this list of conditions and the following disclaimer in the
+     documentation and/or other materials provided with the distribution.
+
+     * Neither the name of the copyright holder nor the names of its
+     contributors may be used to endorse or promote products derived from this
+     software without specific prior written permission.
+
+NO EXPRESS OR IMPLIED LICENSES TO ANY PARTY'S PATENT RIGHTS ARE GRANTED BY
+THIS LICENSE. THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+'''
+import argparse
+import numpy as np
+import torch
+from nncodec import nnc
+
+parser = argparse.ArgumentParser(description='Regression check for decoding into preallocated (prefilled) output arrays and models')
+parser.add_argument('--qp', type=int, default=-32, help='quantization parameter (default: -32)')
+parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic tensors (default: 0)')
+parser.add_argument('--device', type=str, default='cpu', help='device of the model decoded into by decompress_into (default: cpu)')
+
+def build_parameters(seed):
+    ##every 4th row of the weight is pruned and one weight is all-zero, so that row skipping skips rows
+    rng = np.random.default_rng(seed)
+    weight = rng.normal(0, 0.05, (64, 32)).astype(np.float32)
+    weight[::4] = 0
+    return {"pruned.weight": weight,
+            "zero.weight": np.zeros((16, 16), dtype=np.float32),
+            "pruned.bias": rng.normal(0, 0.01, (64,)).astype(np.float32)}
+
+def check_arrays(name, decoded, reference):
+    failed = [param for param in reference if not np.array_equal(decoded[param], reference[param].astype(decoded[param].dtype))]
+    print(f"{name:40s} {'OK' if not failed else 'FAILED: ' + ', '.join(failed)}")
+    return not failed
+
+def build_model(dtype, device):
+    ##model with the parameter names of build_parameters, all weights are nonzero before decoding
+    model = torch.nn.ModuleDict({"pruned": torch.nn.Linear(32, 64), "zero": torch.nn.Linear(16, 16, bias=False)})
+    with torch.no_grad():
+        for tensor in model.parameters():
+            tensor.fill_(123.0)
+    return model.to(device=device, dtype=dtype)
+
+def check_model(name, model, reference):
+    state_dict = model.state_dict()
+    failed = [param for param in reference if not torch.equal(state_dict[param].cpu(), torch.from_numpy(reference[param]).to(state_dict[param].dtype))]
+    print(f"{name:40s} {'OK' if not failed else 'FAILED: ' + ', '.join(failed)}")
+    return not failed
+
+def main():
+    args = parser.parse_args()
+
+    parameters = build_parameters(args.seed)
+    bitstream = nnc.compress(parameters, bitstream_path=None, qp=args.qp, row_skipping=True, return_bitstream=True)
+    reference = nnc.decompress(bitstream)
+
+    ok = True
+    for dtype in (np.float32, np.float16):
+        ##the output arrays hold nonzero values before decoding, skipped rows must be zero afterwards
+        out = {param: np.full(value.shape, 123.0, dtype=dtype) for param, value in parameters.items()}
+        ok &= check_arrays(f"decompress(out=) {np.dtype(dtype).name}", nnc.decompress(bitstream, out=out), reference)
+        out = {param: np.full(value.shape, 123.0, dtype=dtype) for param, value in parameters.items()}
+        ok &= check_arrays(f"decompress_iter(out=) {np.dtype(dtype).name}", dict(nnc.decompress_iter(bitstream, out=out)), reference)
+
+    for dtype in (torch.float32, torch.float16, torch.bfloat16):
+        for stream in (False, True):
+            model = build_model(dtype, args.device)
+            decoded = nnc.decompress_into(model, bitstream, stream=stream)
+            if stream:
+                for _ in decoded: pass
+            ok &= check_model(f"decompress_into(stream={stream}) {str(dtype)[6:]}", model, reference)
+
+    if not ok:
+        raise SystemExit("Decoding into prefilled output arrays or models doesn't match the reference decoding")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+'''
+The copyright in this software is being made available under the Clear BSD
+License, included below. No patent rights, trademark rights and/or
+other Intellectual Property Rights other than the copyrights concerning
+the Software are granted under this license.
+
+The Clear BSD License
+
+Copyright (c) 2019-2025, Fraunhofer-Gesellschaft zur Förderung der angewandten Forschung e.V. & The NNCodec Authors.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted (subject to the limitations in the disclaimer below) provided that
+the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+     this list of conditions and the following disclaimer.
+
+     * Redistributions in binary form must reproduce the above copyright
+     notice, this list of conditions and the following disclaimer in the
+     documentation and/or other materials provided with the distribution.
+
+     * Neither the name of the copyright holder nor the names of its
+     contributors may be used to endorse or promote products derived from this
+     software without specific prior written permission.
+
+NO EXPRESS OR IMPLIED LICENSES TO ANY PARTY'S PATENT RIGHTS ARE GRANTED BY
+THIS LICENSE. THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+'''
+
+import time
+import argparse
+import numpy as np
+from nncodec.nnc_core import hls
+
+parser = argparse.ArgumentParser(description='Checks and benchmarks walking the NNR units of a synthetic bitstream')
+parser.add_argument('--num_ndus', type=int, default=10000, help='number of NDUs in the largest bitstream (default: 10000)')
+parser.add_argument('--steps', type=int, default=4, help='number of bitstream sizes, halving num_ndus each step (default: 4)')
+parser.add_argument('--tensor_size', type=int, default=16, help='number of float32 values per NDU (default: 16)')
+parser.add_argument('--max_ratio', type=float, default=2.0, help='maximum allowed growth of the per-unit parsing time (default: 2.0)')
+parser.add_argument('--legacy', action='store_true', help='additionally time the former slice-per-unit parsing for comparison')
+
+def encode_unit(nnr_unit):
+    bs = hls.encode_nnr_unit_with_size_dummy(nnr_unit)
+    bs, _ = hls.update_nnr_unit_size(bs)
+    return bs
+
+def topology_elem_id(i):
+    ##includes multi-byte UTF-8 and long names, so that strings spanning several search windows of BitReader.st are parsed
+    if i % 7 == 3:
+        return "blöck%d.gewicht" % i
+    if i % 5 == 4:
+        return "encoder." * 24 + "layer%d.weight" % i
+    return "layer%d.weight" % i
+
+def build_bitstream(num_ndus, tensor_size):
+    bs = encode_unit({"nnr_unit_type": hls.NnrUnitType.NNR_STR,
+                      "independently_decodable_flag": 1,
+                      "partial_data_counter_present_flag": 0,
+                      "general_profile_idc": 0})
+    for i in range(num_ndus):
+        bs.extend(encode_unit({"nnr_unit_type": hls.NnrUnitType.NNR_NDU,
+                               "independently_decodable_flag": 1,
+                               "partial_data_counter_present_flag": 0,
+                               "nnr_compressed_data_unit_payload_type": hls.CompressedDataUnitPayloadType.NNR_PT_RAW_FLOAT,
+                               "nnr_multiple_topology_elements_present_flag": 0,
+                               "nnr_decompressed_data_format_present_flag": 0,
+                               "input_parameters_present_flag": 1,
+                               "mps_topology_indexed_reference_flag": 0,
+                               "topology_elem_id": topology_elem_id(i),
+                               "general_profile_idc": 0,
+                               "tensor_dimensions_flag": 1,
+                               "cabac_unary_length_flag": 0,
+                               "compressed_parameter_types": 0,
+                               "count_tensor_dimensions": 1,
+                               "tensor_dimensions": np.array([tensor_size], dtype=np.uint32),
+                               "raw_float32_parameter": np.full(tensor_size, i, dtype=np.float32)}))
+    return bs
+
+def walk_bitstream(bitstream, legacy=False, nnr_units=None):
+    ##with nnr_units (a list), the decoded syntax elements of each unit are appended to it
+    bytes_read = 0
+    num_units = 0
+    while bytes_read < len(bitstream):
+        nnr_unit = {"mps_topology_indexed_reference_flag": 0, "general_profile_idc": 0}
+        if legacy:
+            nnr_gen = hls.decode_nnr_unit(bitstream[bytes_read:], nnr_unit)
+        else:
+            nnr_gen = hls.decode_nnr_unit(bitstream, nnr_unit, bytes_read)
+        for bytes_unit in nnr_gen: pass
+        assert bytes_unit == nnr_unit["nnr_unit_size"], "nnr_unit_size doesn't match the number of decoded bytes."
+        bytes_read += bytes_unit
+        num_units += 1
+        if nnr_units is not None:
+            nnr_units.append(nnr_unit)
+    return num_units
+
+def check_parsing(num_ndus=64, tensor_size=16):
+    ##regression check: parsing at offsets into the bitstream yields the same syntax elements as parsing a slice per unit
+    ##(the former way) and as were encoded; raises an AssertionError otherwise and returns the number of units
+    bitstream = build_bitstream(num_ndus, tensor_size)
+    units, legacy_units = [], []
+    num_units = walk_bitstream(bitstream, nnr_units=units)
+    walk_bitstream(bitstream, legacy=True, nnr_units=legacy_units)
+    assert num_units == num_ndus + 1 == len(legacy_units)
+    for i, (unit, legacy_unit) in enumerate(zip(units, legacy_units)):
+        assert unit.keys() == legacy_unit.keys(), "Syntax elements of NNR unit {} differ".format(i)
+        for key, value in unit.items():
+            assert np.array_equal(value, legacy_unit[key]), "{} of NNR unit {} differs".format(key, i)
+    for i, unit in enumerate(units[1:]):
+        assert unit["topology_elem_id"] == topology_elem_id(i), "topology_elem_id of NDU {} differs".format(i)
+        assert np.array_equal(unit["raw_float32_parameter"], np.full(tensor_size, i, dtype=np.float32)), "raw_float32_parameter of NDU {} differs".format(i)
+    return num_units
+
+def main():
+    args = parser.parse_args()
+
+    check_parsing(tensor_size=args.tensor_size)
+
+    results = []
+    for step in range(args.steps - 1, -1, -1):
+        num_ndus = max(args.num_ndus >> step, 1)
+        bitstream = build_bitstream(num_ndus, args.tensor_size)
+
+        modes = [False, True] if args.legacy else [False]
+        times = []
+        for legacy in modes:
+            start = time.perf_counter()
+            num_units = walk_bitstream(bitstream, legacy)
+            times.append(time.perf_counter() - start)
+            assert num_units == num_ndus + 1
+
+        us_per_unit = 1e6 * times[0] / num_units
+        results.append(us_per_unit)
+        line = f"NDUs: {num_ndus:6d}  bytes: {len(bitstream):9d}  time: {times[0]:7.3f} s  per unit: {us_per_unit:7.2f} us"
+        if args.legacy:
+            line += f"  |  legacy time: {times[1]:7.3f} s  per unit: {1e6 * times[1] / num_units:7.2f} us"
+        print(line)
+
+    ratio = results[-1] / results[0]
+    print(f"per-unit time growth from smallest to largest bitstream: {ratio:.2f}x")
+    if ratio > args.max_ratio:
+        raise SystemExit(f"Parsing does not scale linearly (growth {ratio:.2f}x > {args.max_ratio}x)")
+
+if __name__ == '__main__':
+    main()
@@ -97,6 +97,7 @@ parser.add_argument('--qp', type=int, default=-32, help='quantization parameter
 parser.add_argument('--qp_density', type=int, default=2, help='quantization scale parameter (default: 2)')
 parser.add_argument('--nonweight_qp', type=int, default=-75, help='qp for non-weights, e.g., 1D or BatchNorm params (default: -75)')
 parser.add_argument("--opt_qp", action="store_true", help='Modifies QP layer-wise based on relative layer size within NN')
+parser.add_argument('--target_size', type=int, default=None, help='Optional: size limit of the bitstream in bytes (default: None); note: overwrites the weight QPs.')
 parser.add_argument("--use_dq", action="store_true", help='Enable dependent scalar / Trellis-coded quantization')
 parser.add_argument('--approx_method', type=str, default='uniform',  help='Approximation method [uniform or codebook]')
 parser.add_argument('--bitdepth', type=int, default=None, help='Optional: integer-aligned bitdepth for limited precision (default: None); note: overwrites QPs.')
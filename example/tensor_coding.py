@@ -80,6 +80,7 @@ parser.add_argument('--nonweight_qp', type=int, default=-75, help='qp for non-we
 parser.add_argument('--bitdepth', type=int, default=None, help='Optional: integer-aligned bitdepth for limited precision (default: None); note: overwrites QPs.')
 parser.add_argument('--approx_method', type=str, default='uniform',  help='Approximation method [uniform or codebook]')
 parser.add_argument('--opt_qp', action='store_true', help='Modifies QP layer-wise')
+parser.add_argument('--target_size', type=int, default=None, help='Optional: size limit of the bitstream in bytes (default: None); note: overwrites the QPs.')
 parser.add_argument('--use_dq', action='store_true', help='Enable dependent scalar / Trellis-coded quantization')
 parser.add_argument('--sparsity', type=float, default=0.0, help='Sparsity rate (default: 0.0)')
 parser.add_argument('--struct_spars_factor', type=float, default=0.0, help='Factor for structured sparsification (default: 0.0, recommended 0.75-0.95)')
@@ -106,8 +106,8 @@ def cpp_flag(compiler):
     raise RuntimeError('Unsupported compiler: C++11 or better required.')
 
 class BuildExt(build_ext):
-    c_opts = {'msvc': ['/EHsc'], 'unix': []}
-    l_opts = {'msvc': [], 'unix': []}
+    c_opts = {'msvc': ['/EHsc'], 'unix': ['-pthread']}
+    l_opts = {'msvc': [], 'unix': ['-pthread']}
 
     if sys.platform == 'darwin':
         darwin_opts = ['-stdlib=libc++', '-mmacosx-version-min=10.14']
@@ -168,6 +168,7 @@ setup(
         "flwr[simulation]>=1.5",
         "hydra-core>=1.3.2",
         "sentencepiece>=0.1.99",
+        "ml_dtypes>=0.2",
         "numpy<2"
     ],
     setup_requires=['pybind11>=2.6.2'],
@@ -41,6 +41,10 @@ POSSIBILITY OF SUCH DAMAGE.
 ------------------------------------------------------------------------------------------- */
 #include "CABACDecoder.h"
 #include <iostream>
+#include <atomic>
+#include <exception>
+#include <mutex>
+#include <thread>
 
 void CABACDecoder::startCabacDecoding(uint8_t *pBytestream)
 {
@@ -257,75 +261,67 @@ void CABACDecoder::decodeWeightsBase(int32_t* pWeights, int32_t* pWeightsBase, u
     entryPoints.insert(entryPoints.begin(),firstEp.getEntryPointInt());
 
     EntryPoint finalEntryPoint;
+    const int numBlockRows = (int)entryPoints.size();
+    const int numThreads   = (int)std::min<uint32_t>(m_NumThreads, numBlockRows);
 
-    for(int epIdx = (int)entryPoints.size() - 1; epIdx >= 0; epIdx--)
+    if(numThreads > 1)
     {
-      //int epIdx2 = epIdx == -1 ? m_EntryPoints.size() - 1 : epIdx;
-      scanIterator.seekBlockRow(epIdx);
-      EntryPoint ep;
-      ep.setEntryPointInt(entryPoints[epIdx]);
-      m_BinDecoder.setEntryPoint(ep);
-      stateId = ep.dqState;
-      resetCtxMdls();
-      m_CtxModeler.resetNeighborCtx(); //TODO HAASE: WHAT ABPUT THIS?
-
-      int32_t skipRow = 0;
+      // each worker decodes whole block rows with its own copy of the (reset) decoder state
+      std::atomic<int>   nextBlockRow(0);
+      std::exception_ptr workerError = nullptr;
+      std::mutex         errorMutex;
 
-      while(true)
+      auto worker = [&]()
       {
-        if(general_profile_idc == 1 && rowSkipFlag && layerWidth > 1 && numWeights > layerWidth&& scanIterator.isFirstPositionOfRowInBlock() && codebook_size != 1)
+        try
         {
-          uint32_t currRow = scanIterator.getRow();
-
-          skipRow = chanSkip.at(currRow);
-          if(skipRow)
+          CABACDecoder rowDecoder(*this);
+          for(int epIdx = nextBlockRow++; epIdx < numBlockRows; epIdx = nextBlockRow++)
           {
-            scanIterator.seekRowEndOfCurrBlockAndReturnInc();
-            if(dq_flag)
+            rowDecoder.xDecodeBlockRow<trellisDef,bPrevCtx>(pWeights, pWeightsBase, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, rowSkipFlag, chanSkip, hist_dep_sig_prob_enabled_flag, codebook_size, codebook_zero_offset, hdspOpts, epIdx, entryPoints[epIdx]);
+            if(epIdx == numBlockRows - 1) //last Entry Point
             {
-              for(int a = 0; a <= (int)layerWidth - 1; a++)
-              {
-                stateId = sttab[stateId][0];
-              }
+              finalEntryPoint = rowDecoder.m_BinDecoder.getEntryPoint();
+              byteStreamPtrAfter = rowDecoder.m_BinDecoder.getByteStreamPtr();
             }
           }
         }
-        if(!skipRow || general_profile_idc == 0)
+        catch(...)
         {
-          pWeights[scanIterator.posInMat()] = 0;
-          if(bPrevCtx && general_profile_idc == 1)
-          {
-            m_CtxModeler.updateBaseMdlCtx(pWeightsBase[scanIterator.posInMat()]);
-          }
-          if(general_profile_idc == 1)
-          {
-            m_CtxModeler.updateHdspEnabled( hist_dep_sig_prob_enabled_flag == 1 && hdspOpts.getEnabledAt( scanIterator.posInMat()   )  );
-          }
-          decodeWeightVal(pWeights[scanIterator.posInMat()],stateId, general_profile_idc, codebook_size, codebook_zero_offset);
-          m_CtxModeler.updateNeighborCtx(pWeights[scanIterator.posInMat()],scanIterator.posInMat(),layerWidth);
-          if(dq_flag)
+          std::lock_guard<std::mutex> lock(errorMutex);
+          if(!workerError)
           {
-            int32_t newState = sttab[stateId][pWeights[scanIterator.posInMat()] & 1];
-
-            if(pWeights[scanIterator.posInMat()] != 0)
-            {
-              pWeights[scanIterator.posInMat()] <<= 1;
-              pWeights[scanIterator.posInMat()] += pWeights[scanIterator.posInMat()] < 0 ? (stateId & 1) : -(stateId & 1);
-            }
-
-            stateId = newState;
+            workerError = std::current_exception();
           }
+          nextBlockRow = numBlockRows;
         }
-        if(scanIterator.isLastPosOfBlockRow())
+      };
+
+      std::vector<std::thread> workers;
+      for(int t = 1; t < numThreads; t++)
+      {
+        workers.emplace_back(worker);
+      }
+      worker();
+      for(auto& w : workers)
+      {
+        w.join();
+      }
+      if(workerError)
+      {
+        std::rethrow_exception(workerError);
+      }
+    }
+    else
+    {
+      for(int epIdx = numBlockRows - 1; epIdx >= 0; epIdx--)
+      {
+        xDecodeBlockRow<trellisDef,bPrevCtx>(pWeights, pWeightsBase, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, rowSkipFlag, chanSkip, hist_dep_sig_prob_enabled_flag, codebook_size, codebook_zero_offset, hdspOpts, epIdx, entryPoints[epIdx]);
+        if(epIdx == numBlockRows - 1) //last Entry Point
         {
-          if(epIdx == entryPoints.size() - 1) //last Entry Point
-          {
-            finalEntryPoint = m_BinDecoder.getEntryPoint();
-            byteStreamPtrAfter = m_BinDecoder.getByteStreamPtr();
-          }
-          break;
+          finalEntryPoint = m_BinDecoder.getEntryPoint();
+          byteStreamPtrAfter = m_BinDecoder.getByteStreamPtr();
         }
-        scanIterator++;
       }
     }
 
@@ -414,6 +410,76 @@ void CABACDecoder::decodeWeightsBase(int32_t* pWeights, int32_t* pWeightsBase, u
 }
 
 
+template <class trellisDef,bool bPrevCtx >
+void CABACDecoder::xDecodeBlockRow(int32_t* pWeights, int32_t* pWeightsBase, uint32_t layerWidth, uint32_t numWeights, uint8_t dq_flag, const int32_t scan_order, uint8_t general_profile_idc, uint8_t rowSkipFlag, const std::vector<int32_t>& chanSkip, uint8_t hist_dep_sig_prob_enabled_flag, uint32_t codebook_size, uint32_t codebook_zero_offset, const HdspOpts& hdspOpts, int32_t blockRow, uint64_t entryPoint)
+{
+  typename trellisDef::stateTransTab sttab = trellisDef::getStateTransTab();
+
+  Scan scanIterator(ScanType(scan_order),numWeights,layerWidth);
+  scanIterator.seekBlockRow(blockRow);
+
+  EntryPoint ep;
+  ep.setEntryPointInt(entryPoint);
+  m_BinDecoder.setEntryPoint(ep);
+  int32_t stateId = ep.dqState;
+  resetCtxMdls();
+  m_CtxModeler.resetNeighborCtx();
+
+  int32_t skipRow = 0;
+
+  while(true)
+  {
+    if(general_profile_idc == 1 && rowSkipFlag && layerWidth > 1 && numWeights > layerWidth&& scanIterator.isFirstPositionOfRowInBlock() && codebook_size != 1)
+    {
+      uint32_t currRow = scanIterator.getRow();
+
+      skipRow = chanSkip.at(currRow);
+      if(skipRow)
+      {
+        scanIterator.seekRowEndOfCurrBlockAndReturnInc();
+        if(dq_flag)
+        {
+          for(int a = 0; a <= (int)layerWidth - 1; a++)
+          {
+            stateId = sttab[stateId][0];
+          }
+        }
+      }
+    }
+    if(!skipRow || general_profile_idc == 0)
+    {
+      pWeights[scanIterator.posInMat()] = 0;
+      if(bPrevCtx && general_profile_idc == 1)
+      {
+        m_CtxModeler.updateBaseMdlCtx(pWeightsBase[scanIterator.posInMat()]);
+      }
+      if(general_profile_idc == 1)
+      {
+        m_CtxModeler.updateHdspEnabled( hist_dep_sig_prob_enabled_flag == 1 && hdspOpts.getEnabledAt( scanIterator.posInMat()   )  );
+      }
+      decodeWeightVal(pWeights[scanIterator.posInMat()],stateId, general_profile_idc, codebook_size, codebook_zero_offset);
+      m_CtxModeler.updateNeighborCtx(pWeights[scanIterator.posInMat()],scanIterator.posInMat(),layerWidth);
+      if(dq_flag)
+      {
+        int32_t newState = sttab[stateId][pWeights[scanIterator.posInMat()] & 1];
+
+        if(pWeights[scanIterator.posInMat()] != 0)
+        {
+          pWeights[scanIterator.posInMat()] <<= 1;
+          pWeights[scanIterator.posInMat()] += pWeights[scanIterator.posInMat()] < 0 ? (stateId & 1) : -(stateId & 1);
+        }
+
+        stateId = newState;
+      }
+    }
+    if(scanIterator.isLastPosOfBlockRow())
+    {
+      break;
+    }
+    scanIterator++;
+  }
+}
+
 void CABACDecoder::decodeWeights(int32_t *pWeights, uint32_t layerWidth, uint32_t numWeights, uint8_t dq_flag, const int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, uint32_t codebook_size, uint32_t codebook_zero_offset, const HdspOpts& hdspOpts)
 {
   const QuantType qtype = QuantType(dq_flag);
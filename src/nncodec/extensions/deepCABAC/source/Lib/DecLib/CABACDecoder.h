@@ -54,7 +54,7 @@ POSSIBILITY OF SUCH DAMAGE.
 class CABACDecoder
 {
 public:
-    CABACDecoder() {}
+    CABACDecoder() : m_NumThreads( 1 ) {}
     ~CABACDecoder() {}
 
     void     startCabacDecoding    ( uint8_t* pBytestream );
@@ -71,6 +71,7 @@ public:
     void decodeWeightsAndCreateEPs2(int32_t *pWeights, int32_t* pWeightsBase, uint32_t layerWidth, uint32_t numWeights, uint8_t dq_flag, const int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, std::vector<uint64_t>& entryPoints, uint32_t codebook_size, uint32_t codebook_zero_offset, const HdspOpts& hdspOpts);
     
     void setEntryPoints           (uint64_t* pEntryPoints, uint64_t numEntryPoints);
+    void setNumThreads            ( uint32_t numThreads ) { m_NumThreads = std::max<uint32_t>( numThreads, 1 ); }
 
 uint32_t
 getBytesRead();
@@ -80,6 +81,9 @@ protected:
   template <class trellisDef,bool bCreateEntryPoints,bool bPrevCtx >
   void decodeWeightsBase(int32_t* pWeights,int32_t* pWeightsBase,uint32_t layerWidth,uint32_t numWeights,uint8_t dq_flag,const int32_t scan_order,uint8_t general_profile_idc,uint8_t parent_node_id_present_flag,std::vector<uint64_t>& entryPoints, uint32_t codebook_size, uint32_t codebook_zero_offset, const HdspOpts& hdspOpts);
 
+  template <class trellisDef,bool bPrevCtx >
+  void xDecodeBlockRow(int32_t* pWeights,int32_t* pWeightsBase,uint32_t layerWidth,uint32_t numWeights,uint8_t dq_flag,const int32_t scan_order,uint8_t general_profile_idc,uint8_t rowSkipFlag,const std::vector<int32_t>& chanSkip,uint8_t hist_dep_sig_prob_enabled_flag, uint32_t codebook_size, uint32_t codebook_zero_offset, const HdspOpts& hdspOpts, int32_t blockRow, uint64_t entryPoint);
+
     void decodeWeightVal           ( int32_t &decodedIntVal, int32_t stateId, uint8_t general_profile_idc, uint32_t codebook_size=0, uint32_t codebook_zero_offset=0 );
     int32_t decodeRemAbsLevel      ();
     void xShiftParameterIds         ( uint8_t dq_flag, bool useTca, bool useHdsp, uint32_t codebook_size, uint32_t codebook_zero_offset );
@@ -90,5 +94,6 @@ private:
     BinDec                m_BinDecoder;
     uint32_t              m_NumGtxFlags;
     std::vector<uint64_t> m_EntryPoints;
+    uint32_t              m_NumThreads;
 };
 #endif // __CABACDEC__
@@ -70,6 +70,15 @@ void BinEnc::startBinEncoder()
 }
 
 
+void BinEnc::startBinEstimation()
+{
+    // bins are only accumulated to the estimated rate and no bytes are produced
+    startBinEncoder();
+    m_EstimateOnly       = true;
+    m_ScaledEstBits      = 0;
+}
+
+
 void BinEnc::setByteStreamBuf( std::vector<uint8_t> *byteStreamBuf )
 {
     m_ByteBuf = byteStreamBuf;
@@ -78,6 +87,13 @@ void BinEnc::setByteStreamBuf( std::vector<uint8_t> *byteStreamBuf )
 
 uint32_t BinEnc::encodeBin( uint32_t bin, SBMPCtx &ctxMdl )
 {
+  if( m_EstimateOnly )
+  {
+    m_ScaledEstBits += ctxMdl.getBits().scaledEstBits[ bin ];
+    ctxMdl.updateState( -(int32_t)bin );
+    return 0;
+  }
+
   uint32_t rlps = ctxMdl.getRLPS( m_Range );
   m_Range -= rlps;
 
@@ -117,6 +133,12 @@ void BinEnc::pseudoEncodeBin( uint32_t bin, SBMPCtxOptimizer &ctxMdl )
 
 uint32_t BinEnc::encodeBinEP( uint32_t bin )
 {
+    if( m_EstimateOnly )
+    {
+        m_ScaledEstBits += 1 << 15;
+        return 0;
+    }
+
     m_Low <<= 1;
     if (bin)
     {
@@ -134,6 +156,12 @@ uint32_t BinEnc::encodeBinEP( uint32_t bin )
 uint32_t BinEnc::encodeBinsEP( uint32_t bins, uint32_t numBins )
 {
     CHECK( bins >= ( 1u << numBins ), printf( "%i can not be coded with %i EP-Bins", bins, numBins ) )
+
+    if( m_EstimateOnly )
+    {
+        m_ScaledEstBits += uint64_t( numBins ) << 15;
+        return 0;
+    }
     
     if (m_Range == 256)
     {
@@ -178,6 +206,18 @@ uint32_t BinEnc::encodeBinsEP( uint32_t bins, uint32_t numBins )
 }
 
 
+EncEntryPoint BinEnc::getEntryPoint( int32_t dqState ) const
+{
+  // bit position of the decoder after the same number of renormalizations
+  EncEntryPoint e;
+  e.totalBitOffset = 8 * uint64_t( m_ByteBuf->size() + m_NumBufferedBytes ) + 23 - m_BitsLeft;
+  e.deltaBitOffset = 0;
+  e.lowBits        = m_Low & 511;
+  e.dqState        = dqState;
+  return e;
+}
+
+
 void BinEnc::write_out()
 {
     uint32_t lead_byte = m_Low >> (24 - m_BitsLeft);
@@ -212,6 +252,10 @@ void BinEnc::write_out()
 
 void BinEnc::encodeBinTrm( unsigned bin )
 {
+  if( m_EstimateOnly )
+  {
+    return;
+  }
   m_Range -= 2;
   if( bin )
   {
@@ -238,6 +282,10 @@ void BinEnc::encodeBinTrm( unsigned bin )
 
 void BinEnc::finish()
 {
+  if( m_EstimateOnly )
+  {
+    return;
+  }
   if( m_Low >> ( 32 - m_BitsLeft ) )
   {
     m_ByteBuf->push_back( m_BufferedByte + 1 );
@@ -45,6 +45,14 @@ POSSIBILITY OF SUCH DAMAGE.
 #include "CommonLib/ContextModel.h"
 #include <iostream>
 
+struct EncEntryPoint
+{
+    uint64_t totalBitOffset;
+    uint64_t deltaBitOffset;
+    uint32_t lowBits;
+    int32_t  dqState;
+};
+
 class BinEnc
 {
 public:
@@ -52,10 +60,13 @@ public:
     ~BinEnc () {}
 
     void      startBinEncoder      ();
+    void      startBinEstimation   ();
     void      setByteStreamBuf     ( std::vector<uint8_t> *byteStreamBuf );
+    uint64_t  getScaledEstBits     () const { return m_ScaledEstBits; }
 
     uint32_t  encodeBin            ( uint32_t bin,  SBMPCtx &ctxMdl  );
     void      entryPointStart      () { m_Range = 256; }
+    EncEntryPoint getEntryPoint    ( int32_t dqState ) const;
 
     void      pseudoEncodeBin      ( uint32_t bin,       SBMPCtxOptimizer &ctxMdl );
 
@@ -74,6 +85,8 @@ private:
     uint8_t                 m_BufferedByte;
     uint32_t                m_NumBufferedBytes;
     uint32_t                m_BitsLeft;
+    bool                    m_EstimateOnly = false;
+    uint64_t                m_ScaledEstBits = 0;
     static const uint32_t   m_auiGoRiceRange[ 10 ];
 };
 
@@ -51,6 +51,11 @@ void CABACEncoder::startCabacEncoding( std::vector<uint8_t>* pBytestream )
     m_BinEncoder.startBinEncoder();
 }
 
+void CABACEncoder::startCabacEstimation()
+{
+    m_BinEncoder.startBinEstimation();
+}
+
 void CABACEncoder::initCtxMdls(uint32_t numGtxFlags, uint8_t param_opt_flag)
 {
   TCABACEncoder<BinEnc>::xInitCtxModels(numGtxFlags);
@@ -99,6 +104,32 @@ void CABACEncoder::terminateCabacEncoding()
     m_BinEncoder.finish();
 }
 
+void CABACEncoder::xAddEntryPoint( int32_t dqState )
+{
+  EncEntryPoint ep = m_BinEncoder.getEntryPoint( dqState );
+  ep.deltaBitOffset = ep.totalBitOffset - m_LastEntryPointOffset;
+  m_LastEntryPointOffset = ep.totalBitOffset;
+  m_EntryPoints.push_back( ep );
+}
+
+void CABACEncoder::getEntryPoints( const std::vector<uint8_t>& bytestream, std::vector<uint64_t>& entryPoints ) const
+{
+  for( const EncEntryPoint& ep : m_EntryPoints )
+  {
+    // the decoder value register equals the 9 stream bits at the entry point minus the encoder low
+    uint32_t streamBits = 0;
+    for( uint64_t bitPos = ep.totalBitOffset; bitPos < ep.totalBitOffset + 9; bitPos++ )
+    {
+      uint64_t bytePos = bitPos >> 3;
+      uint32_t bit     = bytePos < bytestream.size() ? ( bytestream[bytePos] >> ( 7 - ( bitPos & 7 ) ) ) & 1 : 0;
+      streamBits       = ( streamBits << 1 ) | bit;
+    }
+    uint32_t value = ( streamBits - ep.lowBits ) & 511;
+    CHECK( value > 255, "Invalid entry point value" );
+    entryPoints.push_back( ( ep.deltaBitOffset << 11 ) + ( value << 3 ) + ( ep.dqState & 7 ) );
+  }
+}
+
 void CABACEncoder::pseudoEncodeRemAbsLevelNew(uint32_t value, uint32_t remMaxAbsVal )
 {
   int32_t  remAbsBaseLevel = 0;
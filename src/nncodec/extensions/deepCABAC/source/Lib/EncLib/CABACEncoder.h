@@ -199,10 +199,12 @@ protected:
 class CABACEncoder : protected TCABACEncoder<BinEnc>
 {
 public:
-  CABACEncoder() {}
+  CABACEncoder() : m_LastEntryPointOffset( 0 ) {}
   ~CABACEncoder() {}
 
   void      startCabacEncoding      (std::vector<uint8_t>* pBytestream);
+  void      startCabacEstimation    ();
+  double    getEstimatedBits        () const { return double( m_BinEncoder.getScaledEstBits() ) / double( 1 << 15 ); }
   void      initCtxMdls             (uint32_t numGtxFlags,uint8_t param_opt_flag);
   void      resetCtxMdls            ();
 
@@ -214,6 +216,7 @@ public:
   void      pseudoEncodeRemAbsLevelNew(uint32_t value, uint32_t remMaxAbsVal);
 
   void      terminateCabacEncoding  ();
+  void      getEntryPoints          ( const std::vector<uint8_t>& bytestream, std::vector<uint64_t>& entryPoints ) const;
   void      iae_v                   (uint8_t v,int32_t value);
   void      uae_v                   (uint8_t v,uint32_t value);
 
@@ -305,6 +308,7 @@ void xEncodeWeightsBase(Scan& scanIterator,int32_t* pWeights,int32_t* pWeightsBa
           resetCtxMdls();
           m_CtxModeler.resetNeighborCtx();
           m_BinEncoder.entryPointStart();
+          xAddEntryPoint( stateId );
         }
       }
 
@@ -348,6 +352,7 @@ void xEncodeWeightsBase(Scan& scanIterator,int32_t* pWeights,int32_t* pWeightsBa
     if(scan_order != 0 && scanIterator.getNumOfBlockRows() > 1)
     {
       m_BinEncoder.entryPointStart();
+      m_LastEntryPointOffset = m_BinEncoder.getEntryPoint( 0 ).totalBitOffset;
     }
 
     xEncodeWeightsBase<trellisDef,false,useTca>(scanIterator,pWeights,pWeightsBase,layerWidth,numWeights,dq_flag,general_profile_idc,hist_dep_sig_prob_enabled_flag,rowSkipFlag,pChanZeroList, codebook_size, codebook_zero_offset, hdspOpts);
@@ -356,7 +361,10 @@ void xEncodeWeightsBase(Scan& scanIterator,int32_t* pWeights,int32_t* pWeightsBa
   }
 
   void xEncRowSkip     ( uint8_t general_profile_idc, uint8_t rowSkipFlag,uint32_t layerWidth,uint32_t numWeights,int32_t* pChanZeroList, uint32_t codebook_size);
+  void xAddEntryPoint  ( int32_t dqState );
   uint8_t                       m_ParamOptFlag;
+  std::vector<EncEntryPoint>    m_EntryPoints;
+  uint64_t                      m_LastEntryPointOffset;
 
 };
 
@@ -46,10 +46,21 @@ POSSIBILITY OF SUCH DAMAGE.
 #include <Lib/EncLib/CABACEncoder.h>
 #include <Lib/DecLib/CABACDecoder.h>
 #include <iostream>
+#include <memory>
+#include <algorithm>
+#include <vector>
+#include <cstring>
 #include <math.h>
 
 namespace py = pybind11;
 
+// The heavy calls (quantLayer, quantizeAndEncodeLayer, encodeLayer*, decodeLayer*, decodeAndDequantLayer, dequantLayer) release the GIL
+// once all buffers have been requested, so tensors can be processed from several Python
+// threads. An Encoder/Decoder instance keeps its coding state between calls and must not
+// be shared between threads; distinct instances are independent. The numpy arrays passed
+// in must not be modified by other threads while a call is running.
+// Decoder.setNumThreads(n) additionally decodes the block rows of a tensor coded with
+// entry points (scan_order > 0) on up to n threads.
 
 class Encoder
 {
@@ -61,37 +72,31 @@ public:
   void                  uae_v( uint8_t v, uint32_t value )           { m_CABACEncoder.uae_v( v, value ); }
   uint32_t              encodeLayer( py::array_t<int32_t, py::array::c_style> qindex, uint8_t dq_flag, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, uint8_t rowSkipFlag, py::array_t<int32_t, py::array::c_style> ChanZeroList , HdspMode hdspMode, HdspPyAryType hdspHist , uint32_t codebook_size = 0, uint32_t codebook_zero_offset=0    );
   uint32_t              encodeLayer2( py::array_t<int32_t, py::array::c_style> qindex, py::array_t<int32_t, py::array::c_style> baseWeights, uint8_t dq_flag, int32_t scan_order,  uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, uint8_t rowSkipFlag, py::array_t<int32_t, py::array::c_style> ChanZeroList , HdspMode hdspMode, HdspPyAryType hdspHist , uint32_t codebook_size = 0, uint32_t codebook_zero_offset=0);
+  double                estimateLayerBits( py::array_t<int32_t, py::array::c_style> qindex, uint8_t dq_flag, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, uint8_t rowSkipFlag, py::array_t<int32_t, py::array::c_style> ChanZeroList , HdspMode hdspMode, HdspPyAryType hdspHist , uint32_t codebook_size = 0, uint32_t codebook_zero_offset=0    );
+  double                estimateLayerBits2( py::array_t<int32_t, py::array::c_style> qindex, py::array_t<int32_t, py::array::c_style> baseWeights, uint8_t dq_flag, int32_t scan_order,  uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, uint8_t rowSkipFlag, py::array_t<int32_t, py::array::c_style> ChanZeroList , HdspMode hdspMode, HdspPyAryType hdspHist , uint32_t codebook_size = 0, uint32_t codebook_zero_offset=0);
   int32_t               quantLayer( py::array_t<float32_t, py::array::c_style> Weights, py::array_t<int32_t, py::array::c_style> qIndex, uint8_t dq_flag, int32_t qpDensity, int32_t qp,float32_t lambdaScale, uint32_t maxNumNoRem, int32_t scan_order, uint8_t general_profile_idc=0 );
+  int32_t               quantizeAndEncodeLayer( py::array_t<float32_t, py::array::c_style> Weights, py::array_t<float32_t, py::array::c_style> recWeights, uint8_t dq_flag, int32_t qpDensity, int32_t qp, uint8_t qpOffsetPresent, int32_t qpOffsetBase, float32_t lambdaScale, uint32_t maxNumNoRem, uint32_t cabac_unary_length, uint8_t param_opt_flag, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, uint8_t rowSkipFlag, HdspMode hdspMode, HdspPyAryType hdspHist );
   py::array_t<uint8_t>  finish();
+  py::array_t<uint64_t> getEntryPoints();
 private:
+  int32_t               xQuantize( float32_t* pWeights, int32_t* pQIndex, uint32_t layerWidth, uint32_t numWeights, uint8_t dq_flag, int32_t qpDensity, int32_t qp, float32_t lambdaScale, uint32_t maxNumNoRem, int32_t scan_order, uint8_t general_profile_idc );
+  bool                  m_Finished = false;
   std::vector<uint8_t>  m_Bytestream;
+  std::vector<uint64_t> m_EntryPoints;
   CABACEncoder          m_CABACEncoder;
 };
 
-int32_t Encoder::quantLayer(py::array_t<float32_t, py::array::c_style> Weights, py::array_t<int32_t, py::array::c_style> qIndex, uint8_t dq_flag, int32_t qpDensity, int32_t qp, float32_t lambdaScale, uint32_t maxNumNoRem, int32_t scan_order, uint8_t general_profile_idc )
+static float32_t getQStepSize( int32_t qpDensity, int32_t qp )
 {
-  py::buffer_info bi_Weights = Weights.request();
-  py::buffer_info bi_qIndex = qIndex.request();
-  float32_t* pWeights          = (float32_t*) bi_Weights.ptr;
-  int32_t* pQIndex = (int32_t*) bi_qIndex.ptr;
-
-  uint32_t layerWidth = 1;
-  uint32_t numWeights = 1;
-  for (size_t idx = 0; idx < (size_t)bi_Weights.ndim; idx++)
-  {
-    numWeights *= bi_Weights.shape[idx];
-    if( idx == 0 ) { continue; }
-    layerWidth *= bi_Weights.shape[idx];
-  }
-  if( layerWidth == 1 || numWeights == layerWidth )
-      scan_order = 0;
-      
   int32_t k = 1 << qpDensity;
   int32_t mul = k + (qp & (k-1));
   int32_t shift = qp >> qpDensity;
-  float32_t qStepSize = mul * pow(2.0, shift - qpDensity);
+  return mul * pow(2.0, shift - qpDensity);
+}
 
-  int32_t success = quantize(pWeights, pQIndex, qStepSize, layerWidth, numWeights, DIST_MSE, lambdaScale, dq_flag, maxNumNoRem, scan_order, general_profile_idc);
+int32_t Encoder::xQuantize( float32_t* pWeights, int32_t* pQIndex, uint32_t layerWidth, uint32_t numWeights, uint8_t dq_flag, int32_t qpDensity, int32_t qp, float32_t lambdaScale, uint32_t maxNumNoRem, int32_t scan_order, uint8_t general_profile_idc )
+{
+  int32_t success = quantize(pWeights, pQIndex, getQStepSize(qpDensity, qp), layerWidth, numWeights, DIST_MSE, lambdaScale, dq_flag, maxNumNoRem, scan_order, general_profile_idc);
 
   if( !success )
   {
@@ -105,22 +110,102 @@ int32_t Encoder::quantLayer(py::array_t<float32_t, py::array::c_style> Weights,
       }
     }
 
+    int32_t k = 1 << qpDensity;
     double minStepsize = (double)(maxAbs) / ((double)((1u << 31) - 3));
 
     float32_t baseQP = floor(log2(minStepsize)) * k;
     float32_t newQp = baseQP + ((minStepsize * k) / pow(2.0, (baseQP / k)) - k);
     qp = (int32_t)(ceil(newQp));
 
-    mul = k + (qp & (k - 1));
-    shift = qp >> qpDensity;
-    qStepSize = mul * pow(2.0, shift - qpDensity);
-
-    success = quantize(pWeights, pQIndex, qStepSize, layerWidth, numWeights, DIST_MSE, lambdaScale, dq_flag, maxNumNoRem, scan_order, general_profile_idc);
+    success = quantize(pWeights, pQIndex, getQStepSize(qpDensity, qp), layerWidth, numWeights, DIST_MSE, lambdaScale, dq_flag, maxNumNoRem, scan_order, general_profile_idc);
     CHECK( !success, "Prevention of integer-overflow failed!");
   }
   return qp;
 }
 
+int32_t Encoder::quantLayer(py::array_t<float32_t, py::array::c_style> Weights, py::array_t<int32_t, py::array::c_style> qIndex, uint8_t dq_flag, int32_t qpDensity, int32_t qp, float32_t lambdaScale, uint32_t maxNumNoRem, int32_t scan_order, uint8_t general_profile_idc )
+{
+  py::buffer_info bi_Weights = Weights.request();
+  py::buffer_info bi_qIndex = qIndex.request();
+  float32_t* pWeights          = (float32_t*) bi_Weights.ptr;
+  int32_t* pQIndex = (int32_t*) bi_qIndex.ptr;
+
+  uint32_t layerWidth = 1;
+  uint32_t numWeights = 1;
+  for (size_t idx = 0; idx < (size_t)bi_Weights.ndim; idx++)
+  {
+    numWeights *= bi_Weights.shape[idx];
+    if( idx == 0 ) { continue; }
+    layerWidth *= bi_Weights.shape[idx];
+  }
+  if( layerWidth == 1 || numWeights == layerWidth )
+      scan_order = 0;
+
+  py::gil_scoped_release release;
+  return xQuantize(pWeights, pQIndex, layerWidth, numWeights, dq_flag, qpDensity, qp, lambdaScale, maxNumNoRem, scan_order, general_profile_idc);
+}
+
+// Quantizes a tensor into a temporary index buffer and encodes it right away (qp offset, context
+// initialization and layer), so the quantized tensor never reaches Python. The channel skip list
+// of profile 1 is derived from the indices. If recWeights is not empty, the dequantized tensor is
+// written to it. Returns the qp, which may have been raised to avoid an int32_t overflow.
+int32_t Encoder::quantizeAndEncodeLayer( py::array_t<float32_t, py::array::c_style> Weights, py::array_t<float32_t, py::array::c_style> recWeights, uint8_t dq_flag, int32_t qpDensity, int32_t qp, uint8_t qpOffsetPresent, int32_t qpOffsetBase, float32_t lambdaScale, uint32_t maxNumNoRem, uint32_t cabac_unary_length, uint8_t param_opt_flag, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, uint8_t rowSkipFlag, HdspMode hdspMode, HdspPyAryType hdspHist )
+{
+  py::buffer_info bi_Weights = Weights.request();
+  py::buffer_info bi_recWeights = recWeights.request();
+  float32_t* pWeights    = (float32_t*) bi_Weights.ptr;
+  float32_t* pRecWeights = (float32_t*) bi_recWeights.ptr;
+
+  uint32_t layerWidth = 1;
+  uint32_t numWeights = 1;
+  for (size_t idx = 0; idx < (size_t)bi_Weights.ndim; idx++)
+  {
+    numWeights *= bi_Weights.shape[idx];
+    if( idx == 0 ) { continue; }
+    layerWidth *= bi_Weights.shape[idx];
+  }
+  if( layerWidth == 1 || numWeights == layerWidth )
+      scan_order = 0;
+  CHECK( bi_recWeights.size != 0 && bi_recWeights.size != numWeights, "recWeights must be empty or have the size of Weights!" );
+
+  uint32_t numRows = bi_Weights.ndim > 0 ? bi_Weights.shape[0] : 1;
+  bool     multiDim = bi_Weights.ndim >= 2;
+
+  HdspOpts hdspOpts( hdspMode, hdspHist );
+
+  py::gil_scoped_release release;
+
+  std::vector<int32_t> qIndex( numWeights );
+  qp = xQuantize(pWeights, qIndex.data(), layerWidth, numWeights, dq_flag, qpDensity, qp, lambdaScale, maxNumNoRem, scan_order, general_profile_idc);
+
+  std::vector<int32_t> chanZeroList( numRows, 0 );
+  if( general_profile_idc == 1 && multiDim )
+  {
+    for( uint32_t row = 0; row < numRows; row++ )
+    {
+      const int32_t* pRow = qIndex.data() + (size_t)row * layerWidth;
+      chanZeroList[row] = std::all_of( pRow, pRow + layerWidth, []( int32_t q ) { return q == 0; } ) ? 1 : 0;
+    }
+  }
+  if( general_profile_idc != 1 )
+  {
+    rowSkipFlag = 0;
+  }
+
+  if( qpOffsetPresent )
+  {
+    m_CABACEncoder.iae_v( 6 + qpDensity, qp - qpOffsetBase );
+  }
+  m_CABACEncoder.initCtxMdls( cabac_unary_length, param_opt_flag );
+  m_CABACEncoder.encodeWeights( qIndex.data(), layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, rowSkipFlag, chanZeroList.data(), 0, 0, hdspOpts );
+
+  if( bi_recWeights.size != 0 )
+  {
+    deQuantize( pRecWeights, qIndex.data(), getQStepSize(qpDensity, qp), numWeights, layerWidth, scan_order );
+  }
+  return qp;
+}
+
 uint32_t Encoder::encodeLayer( py::array_t<int32_t, py::array::c_style> qindex, uint8_t dq_flag, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, uint8_t rowSkipFlag, py::array_t<int32_t, py::array::c_style> ChanZeroList, HdspMode hdspMode, HdspPyAryType hdspHist , uint32_t codebook_size, uint32_t codebook_zero_offset)
 {
   py::buffer_info bi_qindex = qindex.request();
@@ -140,7 +225,10 @@ uint32_t Encoder::encodeLayer( py::array_t<int32_t, py::array::c_style> qindex,
   if( layerWidth == 1 || numWeights == layerWidth )
       scan_order = 0;
 
-  return m_CABACEncoder.encodeWeights(pQindex, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, rowSkipFlag, pChanZeroList, codebook_size, codebook_zero_offset, HdspOpts( hdspMode, hdspHist ) );
+  HdspOpts hdspOpts( hdspMode, hdspHist );
+
+  py::gil_scoped_release release;
+  return m_CABACEncoder.encodeWeights(pQindex, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, rowSkipFlag, pChanZeroList, codebook_size, codebook_zero_offset, hdspOpts );
 }
 
 uint32_t Encoder::encodeLayer2( py::array_t<int32_t, py::array::c_style> qindex, py::array_t<int32_t, py::array::c_style> baseWeights, uint8_t dq_flag, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, uint8_t rowSkipFlag, py::array_t<int32_t, py::array::c_style> ChanZeroList,HdspMode hdspMode, HdspPyAryType hdspHist, uint32_t codebook_size, uint32_t codebook_zero_offset  )
@@ -165,20 +253,95 @@ uint32_t Encoder::encodeLayer2( py::array_t<int32_t, py::array::c_style> qindex,
   if( layerWidth == 1 || numWeights == layerWidth )
       scan_order = 0;
 
-  return m_CABACEncoder.encodeWeights2(pQindex, pBaseWeights, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, rowSkipFlag, pChanZeroList, codebook_size, codebook_zero_offset, HdspOpts( hdspMode, hdspHist ) );
+  HdspOpts hdspOpts( hdspMode, hdspHist );
+
+  py::gil_scoped_release release;
+  return m_CABACEncoder.encodeWeights2(pQindex, pBaseWeights, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, rowSkipFlag, pChanZeroList, codebook_size, codebook_zero_offset, hdspOpts );
+}
+
+double Encoder::estimateLayerBits( py::array_t<int32_t, py::array::c_style> qindex, uint8_t dq_flag, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, uint8_t rowSkipFlag, py::array_t<int32_t, py::array::c_style> ChanZeroList, HdspMode hdspMode, HdspPyAryType hdspHist , uint32_t codebook_size, uint32_t codebook_zero_offset)
+{
+  py::buffer_info bi_qindex = qindex.request();
+  int32_t* pQindex          = (int32_t*) bi_qindex.ptr;
+
+  py::buffer_info bi_ChanZeroList = ChanZeroList.request();
+  int32_t* pChanZeroList = (int32_t*) bi_ChanZeroList.ptr;
+
+  uint32_t layerWidth = 1;
+  uint32_t numWeights = 1;
+  for( size_t idx = 0; idx < (size_t)bi_qindex.ndim; idx++ )
+  {
+    numWeights *= bi_qindex.shape[idx];
+    if( idx == 0 ) { continue; }
+    layerWidth *= bi_qindex.shape[idx];
+  }
+  if( layerWidth == 1 || numWeights == layerWidth )
+      scan_order = 0;
+
+  HdspOpts hdspOpts( hdspMode, hdspHist );
+
+  py::gil_scoped_release release;
+  // the estimation runs on a copy, so the context models of this encoder are left untouched
+  CABACEncoder cabacEstimator( m_CABACEncoder );
+  cabacEstimator.startCabacEstimation();
+  cabacEstimator.encodeWeights(pQindex, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, rowSkipFlag, pChanZeroList, codebook_size, codebook_zero_offset, hdspOpts );
+  return cabacEstimator.getEstimatedBits();
+}
+
+double Encoder::estimateLayerBits2( py::array_t<int32_t, py::array::c_style> qindex, py::array_t<int32_t, py::array::c_style> baseWeights, uint8_t dq_flag, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, uint8_t rowSkipFlag, py::array_t<int32_t, py::array::c_style> ChanZeroList,HdspMode hdspMode, HdspPyAryType hdspHist, uint32_t codebook_size, uint32_t codebook_zero_offset  )
+{
+  py::buffer_info bi_qindex = qindex.request();
+  int32_t* pQindex          = (int32_t*) bi_qindex.ptr;
+
+  py::buffer_info bi_ChanZeroList = ChanZeroList.request();
+  int32_t* pChanZeroList = (int32_t*) bi_ChanZeroList.ptr;
+
+  py::buffer_info bi_baseWeights = baseWeights.request();
+  int32_t* pBaseWeights          = (int32_t*) bi_baseWeights.ptr;
+
+  uint32_t layerWidth = 1;
+  uint32_t numWeights = 1;
+  for( size_t idx = 0; idx < (size_t)bi_qindex.ndim; idx++ )
+  {
+    numWeights *= bi_qindex.shape[idx];
+    if( idx == 0 ) { continue; }
+    layerWidth *= bi_qindex.shape[idx];
+  }
+  if( layerWidth == 1 || numWeights == layerWidth )
+      scan_order = 0;
+
+  HdspOpts hdspOpts( hdspMode, hdspHist );
+
+  py::gil_scoped_release release;
+  CABACEncoder cabacEstimator( m_CABACEncoder );
+  cabacEstimator.startCabacEstimation();
+  cabacEstimator.encodeWeights2(pQindex, pBaseWeights, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, rowSkipFlag, pChanZeroList, codebook_size, codebook_zero_offset, hdspOpts );
+  return cabacEstimator.getEstimatedBits();
 }
 
 py::array_t<uint8_t> Encoder::finish()
 {
   m_CABACEncoder.terminateCabacEncoding();
+  m_CABACEncoder.getEntryPoints( m_Bytestream, m_EntryPoints );
+  m_Finished = true;
 
-  auto Result = py::array_t<uint8_t, py::array::c_style>(m_Bytestream.size());
+  // hand the bytestream over to the returned array without copying it
+  std::vector<uint8_t>* pBytestream = new std::vector<uint8_t>( std::move( m_Bytestream ) );
+  py::capsule owner( pBytestream, []( void* p ) { delete reinterpret_cast<std::vector<uint8_t>*>( p ); } );
+  return py::array_t<uint8_t>( pBytestream->size(), pBytestream->data(), owner );
+}
+
+py::array_t<uint64_t> Encoder::getEntryPoints()
+{
+  CHECK( !m_Finished, "Entry points are only available after finish()" );
+
+  auto Result = py::array_t<uint64_t, py::array::c_style>(m_EntryPoints.size());
   py::buffer_info bi_Result = Result.request();
-  uint8_t* pResult = (uint8_t*) bi_Result.ptr;
+  uint64_t *pResult = (uint64_t *)bi_Result.ptr;
 
-  for( size_t idx = 0; idx < m_Bytestream.size(); idx ++ )
+  for (size_t idx = 0; idx < m_EntryPoints.size(); idx++)
   {
-    pResult[idx] = m_Bytestream.at(idx);
+    pResult[idx] = m_EntryPoints.at(idx);
   }
   return Result;
 }
@@ -189,7 +352,7 @@ public:
   Decoder() {}
   ~Decoder() {}
 
-  void     setStream    ( py::array_t<uint8_t, py::array::c_style> Bytestream );
+  void     setStream    ( py::buffer Bytestream, size_t offset = 0 );
   void     initCtxModels( uint32_t cabac_unary_length ) { m_CABACDecoder.initCtxMdls( cabac_unary_length ); }
   int32_t  iae_v        (uint8_t v) { return m_CABACDecoder.iae_v(v); }
   uint32_t uae_v        ( uint8_t v )                   { return m_CABACDecoder.uae_v( v ); }
@@ -197,20 +360,27 @@ public:
   py::array_t<uint64_t> decodeLayerAndCreateEPs(py::array_t<int32_t, py::array::c_style> Weights, uint8_t dq_flag, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, HdspMode hdspMode, HdspPyAryType hdspHist, uint32_t codebook_size=0, uint32_t codebook_zero_offset=0 ); //Return value -> Array? Ptr?
   py::array_t<uint64_t> decodeLayerAndCreateEPs2(py::array_t<int32_t, py::array::c_style> Weights, py::array_t<int32_t, py::array::c_style> WeightsBase, uint8_t dq_flag, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, HdspMode hdspMode, HdspPyAryType hdspHist, uint32_t codebook_size=0, uint32_t codebook_zero_offset=0 ); //Return value -> Array? Ptr?
   void     setEntryPoints( py::array_t<uint64_t, py::array::c_style> entryPoints);
+  void     setNumThreads( uint32_t numThreads ) { m_CABACDecoder.setNumThreads( numThreads ); }
   void     decodeLayer  ( py::array_t<int32_t, py::array::c_style> Weights, uint8_t dq_flag, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, HdspMode hdspMode, HdspPyAryType hdspHist, uint32_t codebook_size=0, uint32_t codebook_zero_offset=0  );
   void     decodeLayer2  ( py::array_t<int32_t, py::array::c_style> Weights, py::array_t<int32_t, py::array::c_style> WeightsBase, uint8_t dq_flag, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, HdspMode hdspMode, HdspPyAryType hdspHist, uint32_t codebook_size=0, uint32_t codebook_zero_offset=0  );
   void     dequantLayer ( py::array_t<float32_t, py::array::c_style> Weights, py::array_t<int32_t, py::array::c_style> qIndex, int32_t qpDensity, int32_t qp, int32_t scan_order);
+  void     decodeAndDequantLayer( py::array Weights, uint8_t outputFormat, uint8_t dq_flag, int32_t qpDensity, int32_t qp, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, HdspMode hdspMode, HdspPyAryType hdspHist );
   uint32_t finish       ();
 
 private:
   CABACDecoder  m_CABACDecoder;
+  std::unique_ptr<py::buffer_info> m_StreamInfo;
 };
 
-void Decoder::setStream( py::array_t<uint8_t, py::array::c_style> Bytestream )
+void Decoder::setStream( py::buffer Bytestream, size_t offset )
 {
-  py::buffer_info bi_Bytestream = Bytestream.request();
-  uint8_t* pBytestream          = (uint8_t*) bi_Bytestream.ptr;
+  // the buffer export is held until the next setStream, so the memory cannot be released or resized
+  std::unique_ptr<py::buffer_info> bi_Bytestream( new py::buffer_info( Bytestream.request() ) );
+  CHECK( bi_Bytestream->itemsize != 1 || bi_Bytestream->ndim != 1, "Bytestream must be a one-dimensional byte buffer" );
+  CHECK( offset + 2 > (size_t)bi_Bytestream->size, "Offset exceeds the size of the bytestream" );
+  uint8_t* pBytestream = (uint8_t*) bi_Bytestream->ptr + offset;
   m_CABACDecoder.startCabacDecoding( pBytestream );
+  m_StreamInfo = std::move( bi_Bytestream );
 }
 
 py::array_t<uint64_t> Decoder::decodeLayerAndCreateEPs(py::array_t<int32_t, py::array::c_style> Weights, uint8_t dq_flag, int32_t scan_order,uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, HdspMode hdspMode, HdspPyAryType hdspHist, uint32_t codebook_size, uint32_t codebook_zero_offset )
@@ -233,7 +403,11 @@ py::array_t<uint64_t> Decoder::decodeLayerAndCreateEPs(py::array_t<int32_t, py::
   if (layerWidth == 1 || numWeights == layerWidth)
     scan_order = 0;
 
-  m_CABACDecoder.decodeWeightsAndCreateEPs(pWeights, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, entryPoints, codebook_size, codebook_zero_offset, HdspOpts( hdspMode, hdspHist ) );
+  HdspOpts hdspOpts( hdspMode, hdspHist );
+  {
+    py::gil_scoped_release release;
+    m_CABACDecoder.decodeWeightsAndCreateEPs(pWeights, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, entryPoints, codebook_size, codebook_zero_offset, hdspOpts );
+  }
 
   auto Result = py::array_t<uint64_t, py::array::c_style>(entryPoints.size());
   py::buffer_info bi_Result = Result.request();
@@ -269,7 +443,11 @@ py::array_t<uint64_t> Decoder::decodeLayerAndCreateEPs2(py::array_t<int32_t, py:
   if (layerWidth == 1 || numWeights == layerWidth)
     scan_order = 0;
 
-  m_CABACDecoder.decodeWeightsAndCreateEPs2(pWeights, pWeightsBase, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, entryPoints, codebook_size, codebook_zero_offset, HdspOpts( hdspMode, hdspHist ) );
+  HdspOpts hdspOpts( hdspMode, hdspHist );
+  {
+    py::gil_scoped_release release;
+    m_CABACDecoder.decodeWeightsAndCreateEPs2(pWeights, pWeightsBase, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, entryPoints, codebook_size, codebook_zero_offset, hdspOpts );
+  }
 
   auto Result = py::array_t<uint64_t, py::array::c_style>(entryPoints.size());
   py::buffer_info bi_Result = Result.request();
@@ -314,7 +492,10 @@ void Decoder::decodeLayer( py::array_t<int32_t, py::array::c_style> Weights , ui
   if( layerWidth == 1 || numWeights == layerWidth )
       scan_order = 0;
 
-  m_CABACDecoder.decodeWeights(pWeights, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, codebook_size, codebook_zero_offset, HdspOpts( hdspMode, hdspHist ) );
+  HdspOpts hdspOpts( hdspMode, hdspHist );
+
+  py::gil_scoped_release release;
+  m_CABACDecoder.decodeWeights(pWeights, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, codebook_size, codebook_zero_offset, hdspOpts );
 }
 
 void Decoder::decodeLayer2( py::array_t<int32_t, py::array::c_style> Weights , py::array_t<int32_t, py::array::c_style> WeightsBase , uint8_t dq_flag, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, HdspMode hdspMode, HdspPyAryType hdspHist, uint32_t codebook_size, uint32_t codebook_zero_offset  )
@@ -335,7 +516,10 @@ void Decoder::decodeLayer2( py::array_t<int32_t, py::array::c_style> Weights , p
   if( layerWidth == 1 || numWeights == layerWidth )
       scan_order = 0;
 
-  m_CABACDecoder.decodeWeights2(pWeights, pWeightsBase, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, codebook_size, codebook_zero_offset, HdspOpts( hdspMode, hdspHist ) );
+  HdspOpts hdspOpts( hdspMode, hdspHist );
+
+  py::gil_scoped_release release;
+  m_CABACDecoder.decodeWeights2(pWeights, pWeightsBase, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, codebook_size, codebook_zero_offset, hdspOpts );
 }
 
 
@@ -364,10 +548,109 @@ void Decoder::dequantLayer(py::array_t<float32_t, py::array::c_style> Weights, p
   int32_t mul = k + (qp & (k-1));
   int32_t shift = qp >> qpDensity;
   float32_t qStepSize = mul * pow(2.0, shift - qpDensity);
+
+  py::gil_scoped_release release;
   deQuantize(pWeights, pQIndex, qStepSize, numWeights, layerWidth, scan_order);
 }
 
 
+static uint16_t floatToHalf( float32_t value )
+{
+  uint32_t x;
+  memcpy( &x, &value, sizeof( x ) );
+  uint16_t sign = (x >> 16) & 0x8000;
+  uint32_t absx = x & 0x7fffffff;
+  int32_t  exponent = absx >> 23;
+
+  if( absx > 0x7f800000 )
+  {
+    return sign | 0x7e00;
+  }
+  if( exponent > 142 )
+  {
+    return sign | 0x7c00;
+  }
+  if( exponent < 102 )
+  {
+    return sign;
+  }
+  // round to nearest even, a carry out of the mantissa correctly increments the exponent
+  uint32_t shift = exponent < 113 ? 126 - exponent : 13;
+  uint32_t mant  = exponent < 113 ? (absx & 0x7fffff) | 0x800000 : absx - (112u << 23);
+  uint32_t h     = mant >> shift;
+  uint32_t rem   = mant & ((1u << shift) - 1);
+  uint32_t half  = 1u << (shift - 1);
+  if( rem > half || (rem == half && (h & 1)) )
+  {
+    h++;
+  }
+  return sign | (uint16_t)h;
+}
+
+static uint16_t floatToBfloat16( float32_t value )
+{
+  uint32_t x;
+  memcpy( &x, &value, sizeof( x ) );
+  if( (x & 0x7fffffff) > 0x7f800000 )
+  {
+    return (x >> 16) | 0x40;
+  }
+  return (x + 0x7fff + ((x >> 16) & 1)) >> 16;
+}
+
+// Decodes a uniformly quantized tensor and writes the dequantized values directly to Weights, a
+// C-contiguous array of the decoded shape. outputFormat 0 writes float32 (the indices are decoded
+// in place), 1 float16 and 2 bfloat16 (both given as 16-bit arrays, rounded to nearest even).
+void Decoder::decodeAndDequantLayer( py::array Weights, uint8_t outputFormat, uint8_t dq_flag, int32_t qpDensity, int32_t qp, int32_t scan_order, uint8_t general_profile_idc, uint8_t parent_node_id_present_flag, HdspMode hdspMode, HdspPyAryType hdspHist )
+{
+  CHECK( outputFormat > 2, "outputFormat must be 0 (float32), 1 (float16) or 2 (bfloat16)" );
+  CHECK( Weights.itemsize() != (outputFormat == 0 ? 4 : 2), "The item size of Weights doesn't match outputFormat" );
+  CHECK( !(Weights.flags() & py::array::c_style), "Weights must be C-contiguous" );
+
+  uint8_t* pOutput    = (uint8_t*) Weights.mutable_data();
+  uint32_t layerWidth = 1;
+  uint32_t numWeights = 1;
+  for (size_t idx = 0; idx < (size_t)Weights.ndim(); idx++)
+  {
+    numWeights *= Weights.shape(idx);
+    if( idx == 0 ) { continue; }
+    layerWidth *= Weights.shape(idx);
+  }
+  if( layerWidth == 1 || numWeights == layerWidth )
+      scan_order = 0;
+
+  HdspOpts hdspOpts( hdspMode, hdspHist );
+
+  py::gil_scoped_release release;
+
+  std::vector<int32_t> qIndex( outputFormat == 0 ? 0 : numWeights );
+  int32_t* pQIndex = outputFormat == 0 ? (int32_t*) pOutput : qIndex.data();
+  // rows skipped by row skipping are not written by the decoder, so the in-place buffer has to be zeroed
+  if( outputFormat == 0 )
+  {
+    memset( pOutput, 0, 4 * (size_t)numWeights );
+  }
+  m_CABACDecoder.decodeWeights(pQIndex, layerWidth, numWeights, dq_flag, scan_order, general_profile_idc, parent_node_id_present_flag, 0, 0, hdspOpts );
+
+  float32_t qStepSize = getQStepSize( qpDensity, qp );
+  for( uint32_t i = 0; i < numWeights; i++ )
+  {
+    int32_t level;
+    memcpy( &level, pQIndex + i, sizeof( level ) );
+    float32_t value = qStepSize * float32_t( level );
+    if( outputFormat == 0 )
+    {
+      memcpy( pOutput + 4 * (size_t)i, &value, sizeof( value ) );
+    }
+    else
+    {
+      uint16_t value16 = outputFormat == 1 ? floatToHalf( value ) : floatToBfloat16( value );
+      memcpy( pOutput + 2 * (size_t)i, &value16, sizeof( value16 ) );
+    }
+  }
+}
+
+
 uint32_t Decoder::finish()
 {
   uint32_t bytesRead = m_CABACDecoder.terminateCabacDecoding();
@@ -383,13 +666,17 @@ PYBIND11_MODULE(deepCABAC, m)
         .def( "uae_v",         &Encoder::uae_v         )
         .def( "initCtxModels", &Encoder::initCtxModels )
         .def( "quantLayer",    &Encoder::quantLayer    )
+        .def( "quantizeAndEncodeLayer", &Encoder::quantizeAndEncodeLayer )
         .def( "encodeLayer",   &Encoder::encodeLayer   )
         .def( "encodeLayer2",   &Encoder::encodeLayer2   )
-        .def( "finish",        &Encoder::finish        );
+        .def( "estimateLayerBits", &Encoder::estimateLayerBits )
+        .def( "estimateLayerBits2", &Encoder::estimateLayerBits2 )
+        .def( "finish",        &Encoder::finish        )
+        .def( "getEntryPoints",&Encoder::getEntryPoints);
 
     py::class_<Decoder>(m, "Decoder")
         .def( py::init<>())
-        .def( "setStream",     &Decoder::setStream, py::keep_alive<1, 2>() )
+        .def( "setStream",     &Decoder::setStream, py::arg( "Bytestream" ), py::arg( "offset" ) = 0, py::keep_alive<1, 2>() )
         .def( "initCtxModels", &Decoder::initCtxModels )
         .def( "iae_v",         &Decoder::iae_v         )
         .def( "uae_v",         &Decoder::uae_v         )
@@ -398,7 +685,9 @@ PYBIND11_MODULE(deepCABAC, m)
         .def( "decodeLayer2",   &Decoder::decodeLayer2   )
         .def( "decodeLayerAndCreateEPs2",   &Decoder::decodeLayerAndCreateEPs2   )
         .def( "setEntryPoints",&Decoder::setEntryPoints)
+        .def( "setNumThreads", &Decoder::setNumThreads )
         .def( "dequantLayer",  &Decoder::dequantLayer  )
+        .def( "decodeAndDequantLayer", &Decoder::decodeAndDequantLayer )
         .def( "finish",        &Decoder::finish        );
   py::enum_<HdspMode>( m, "HdspMode" )
     .value("TensorOff"      , HdspMode::TensorOff        )
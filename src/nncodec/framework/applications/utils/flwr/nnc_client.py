@@ -45,6 +45,7 @@ from collections import OrderedDict
 import flwr as fl
 from typing import Dict, Tuple
 from flwr.common import (Scalar, ndarrays_to_parameters)
+from nncodec.framework.pytorch_model import tensor_to_numpy
 
 def model_diff(state_dict_a, state_dict_b): # new, old
     state_dict_diff = OrderedDict()
@@ -95,7 +96,7 @@ class NNClient(fl.client.NumPyClient):
 
         if self.args.compress_upstream:
             print("UP-STREAM compression:")
-            param_dict = {k: np.float32(v.cpu().detach().numpy()) for k, v in self.model.state_dict().items()
+            param_dict = {k: tensor_to_numpy(v, np.float32) for k, v in self.model.state_dict().items()
                           if v.shape != torch.Size([])}
 
             if self.args.compress_differences: ## TODO: replace w/ checking mps_parent_signalling_enabled_flag
@@ -159,7 +160,8 @@ class NNClient(fl.client.NumPyClient):
 
 
         self.set_parameters(parameters)
-        self.internal_states["prev_mdl"] = {k: np.float32(v.cpu().detach().numpy())
+        ## snapshot before local training, must not share memory with the model
+        self.internal_states["prev_mdl"] = {k: tensor_to_numpy(v, np.float32, copy=True)
                                             for k, v in self.model.state_dict().items()
                                             if v.shape != torch.Size([])}
 
@@ -172,7 +174,7 @@ class NNClient(fl.client.NumPyClient):
                                                     args=self.args, round=self.internal_states["comm_round"])
 
         if self.args.bnf:
-            self.internal_states["local_bn_params"] = {n: v.detach().cpu().numpy() for n, v in
+            self.internal_states["local_bn_params"] = {n: tensor_to_numpy(v, copy=True) for n, v in
                                                        self.model.state_dict().items() if
                                                        v.shape != torch.Size([]) and self.mdl_info["parameter_type"][n]
                                                        in ["bn.beta", "bn.gamma", "bn.mean", "bn.var"]}
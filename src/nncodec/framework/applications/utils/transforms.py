@@ -221,7 +221,7 @@ def split_datasets(testset, trainset, num_partitions: int, batch_size: int, num_
     return trainloaders, valloaders, testloader
 
 def torch_mdl_to_flwr_params(mdl):
-    param_dict = {k: np.float32(v.cpu().detach().numpy()) for k, v in mdl.state_dict().items()
+    param_dict = {k: v.detach().cpu().float().numpy() for k, v in mdl.state_dict().items()
                   if v.shape != torch.Size([])}
     params = [v for _, v in param_dict.items() if v.shape != ()]
     return ndarrays_to_parameters(params)
\ No newline at end of file
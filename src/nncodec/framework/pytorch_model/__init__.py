@@ -38,7 +38,7 @@ ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 POSSIBILITY OF SUCH DAMAGE.
 '''
 
-import copy, logging, os
+import copy, json, logging, os
 import numpy as np
 LOGGER = logging.getLogger()
 from nncodec import nnc_core
@@ -47,6 +47,7 @@ from nncodec.framework.applications.utils import evaluation, transforms
 import torch
 from collections import OrderedDict
 import wandb
+import ml_dtypes
 
 
 def is_pyt_model( model_object ):
@@ -94,11 +95,12 @@ def create_NNC_model_instance_from_file(
                  num_workers=1,
                  model_struct=None,
                  lsa=False,
-                 use_case=None
+                 use_case=None,
+                 mmap=False
                 ):
 
     PYTModel = PytorchModel()
-    model_parameters, loaded_model_struct = PYTModel.load_model(model_path)
+    model_parameters, loaded_model_struct = PYTModel.load_model(model_path, mmap=mmap)
     if model_struct == None and loaded_model_struct != None:
         model_struct = loaded_model_struct
 
@@ -204,12 +206,71 @@ def save_to_pytorch_file( model_data, path ):
         model_dict[module_name] = torch.tensor(model_data[module_name])
     torch.save(model_dict, path)
 
+SAFETENSORS_DTYPES = {"F64": np.float64, "F32": np.float32, "F16": np.float16, "BF16": np.int16, "I64": np.int64, "I32": np.int32,
+                      "I16": np.int16, "I8": np.int8, "U8": np.uint8, "BOOL": np.bool_}
+
+def load_safetensors( path ):
+    ##state dict of a .safetensors file whose tensors are memory-mapped (copy-on-write), i.e., the file is only read
+    ##when a tensor's data is accessed; bfloat16 tensors are mapped as int16 and reinterpreted
+    with open(path, "rb") as f:
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+    state_dict = OrderedDict()
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        assert info["dtype"] in SAFETENSORS_DTYPES, "Unsupported safetensors dtype {} of {}".format(info["dtype"], name)
+        begin, end = info["data_offsets"]
+        dtype = np.dtype(SAFETENSORS_DTYPES[info["dtype"]])
+        if end == begin:
+            array = np.zeros(info["shape"], dtype=dtype)
+        else:
+            array = np.memmap(path, dtype=dtype, mode="c", offset=8 + header_size + begin, shape=tuple(info["shape"]))
+        tensor = torch.from_numpy(array)
+        state_dict[name] = tensor.view(torch.bfloat16) if info["dtype"] == "BF16" else tensor
+    return state_dict
+
+def get_output_buffers( state_dict ):
+    ##zero-copy NumPy views of the contiguous CPU tensors of a state dict that the decoder can write directly
+    ##(float32, float16 and bfloat16, the latter as int16 bit patterns)
+    buffers = {}
+    for name, tensor in state_dict.items():
+        if tensor.device.type != "cpu" or not tensor.is_contiguous():
+            continue
+        if tensor.dtype in (torch.float32, torch.float16):
+            buffers[name] = tensor.detach().numpy()
+        elif tensor.dtype == torch.bfloat16:
+            buffers[name] = tensor.detach().view(torch.int16).numpy()
+    return buffers
+
+def copy_to_tensor( tensor, array ):
+    ##copies a decoded array into the storage of tensor (any device and dtype) without an intermediate tensor copy
+    assert tuple(tensor.shape) == tuple(array.shape), "Shape mismatch: tensor {} vs. decoded {}".format(tuple(tensor.shape), tuple(array.shape))
+    with torch.no_grad():
+        tensor.copy_( torch.from_numpy( np.ascontiguousarray( array ) ) )
+
+def tensor_to_numpy( tensor, dtype=None, copy=False, keep_bfloat16=False ):
+    ##single NumPy conversion of a tensor: CPU tensors are returned as zero-copy views of their storage, data is only
+    ##copied for tensors on other devices, bfloat16 (converted to float32, with keep_bfloat16 returned as ml_dtypes.bfloat16
+    ##array instead), a different dtype or copy=True
+    tensor = tensor.detach()
+    if tensor.dtype == torch.bfloat16 and keep_bfloat16:
+        array = tensor.cpu().view(torch.int16).numpy().view(ml_dtypes.bfloat16)
+        shares_memory = tensor.device.type == "cpu"
+    else:
+        shares_memory = tensor.device.type == "cpu" and tensor.dtype != torch.bfloat16
+        if tensor.dtype == torch.bfloat16:
+            tensor = tensor.float()
+        array = tensor.cpu().numpy()
+    if dtype is not None and array.dtype != dtype:
+        return array.astype(dtype)
+    return array.copy() if copy and shares_memory else array
+
 def np_to_torch(parameter_dict):
     return {name: torch.tensor(copy.deepcopy(parameter_dict[name])) for name in parameter_dict}
 
 def torch_to_numpy(parameter_dict):
-    return {name: copy.deepcopy(param).numpy() if param.get_device == -1 else
-    copy.deepcopy(param).cpu().detach().numpy() for name, param in parameter_dict.items() if not "num_batches_tracked" in name}
+    return {name: tensor_to_numpy(param) for name, param in parameter_dict.items() if not "num_batches_tracked" in name}
 
 def model_diff(state_dict_a, state_dict_b):
     state_dict_diff = OrderedDict()
@@ -231,7 +292,7 @@ def get_model_file_with_parameters( parameters, model_struct ):
 
     state_dict = OrderedDict()
     for param in parameters.keys():
-        state_dict[param] = torch.tensor( parameters[param] )
+        state_dict[param] = torch.from_numpy( np.ascontiguousarray( parameters[param] ) )
         assert param in new_model_struct.state_dict(), "The provided model_strcut does not fit the parameter state dict decoded from the bitstream! Parameter '{}' not found in model_struct state dict!".format(param)
 
     new_model_struct.load_state_dict(state_dict)
@@ -260,10 +321,17 @@ class PytorchModel(nnc_core.nnr_model.NNRModel):
 
     
     def load_model(self, 
-                   model_path
+                   model_path,
+                   mmap=False
                   ):
-        
-        model_file = torch.load(model_path, map_location=self.device) ##loads the state_dict
+        ##with mmap (and always for .safetensors files), the tensors are memory-mapped on the CPU instead of being read
+        ##into memory, so that each tensor is only read from the file when it is quantized and encoded
+        if model_path.endswith(".safetensors"):
+            model_file = load_safetensors(model_path)
+        elif mmap:
+            model_file = torch.load(model_path, map_location="cpu", mmap=True)
+        else:
+            model_file = torch.load(model_path, map_location=self.device) ##loads the state_dict
         model_struct = None
         
         try:
@@ -333,21 +401,28 @@ class PytorchModel(nnc_core.nnr_model.NNRModel):
 
         type_list_int = ['int8', 'int16', 'int32', 'uint8', 'uint16', 'uint32']
         type_list_1_bytes = ['int8', 'uint8']
-        type_list_2_bytes = ['int16', 'uint16', 'float16']
+        type_list_2_bytes = ['int16', 'uint16', 'float16', 'bfloat16']
         original_size = 0
 
         for i, module_name in enumerate(model_dict):
             if '.num_batches_tracked' in module_name:
                 continue
-            if model_dict[module_name].data.cpu().detach().numpy().dtype in type_list_1_bytes:
-                original_size += model_dict[module_name].numel()
-            elif model_dict[module_name].data.cpu().detach().numpy().dtype in type_list_2_bytes:
-                original_size += model_dict[module_name].numel()*2
+            tensor = model_dict[module_name]
+            ## size from the tensor's metadata, the NumPy array is obtained once (zero-copy for CPU tensors)
+            tensor_type = str(tensor.dtype).replace("torch.", "")
+            if tensor_type in type_list_1_bytes:
+                original_size += tensor.numel()
+            elif tensor_type in type_list_2_bytes:
+                original_size += tensor.numel()*2
             else:
-                original_size += model_dict[module_name].numel()*4
-            model_data['parameters'][module_name] = np.int32(model_dict[module_name].data.cpu().detach().numpy()) if model_dict[module_name].data.cpu().detach().numpy().dtype in type_list_int else model_dict[module_name].data.cpu().detach().numpy()
+                original_size += tensor.numel()*4
+            ## floating point tensors keep their type (e.g. memory-mapped float16/bfloat16), they are converted when they are quantized
+            param = tensor_to_numpy(tensor, keep_bfloat16=True)
+            if param.dtype in type_list_int:
+                param = param.astype(np.int32, copy=False)
             if '.weight_scaling' in module_name:
-                model_data['parameters'][module_name] = model_data['parameters'][module_name].flatten()
+                param = param.reshape(-1)
+            model_data['parameters'][module_name] = param
             mdl_shape = model_data['parameters'][module_name].shape
             model_info['parameter_dimensions'][module_name] = mdl_shape
             if len(mdl_shape) == 0:  # scalar
@@ -57,6 +57,7 @@ nncargs = {'approx_method': 'uniform',
             'tca': False,
             'use_dq': True,
             'qp_per_tensor': None,  # dict containing one qp value per parameter {Tensor1: -32, Tensor2: -40}
+            'target_size': None,  # optional size limit of the bitstream in bytes; overwrites the weight QPs
             'verbose': True,
             'bnf': False,
             'lsa': False,
@@ -95,6 +96,7 @@ def encode(model, args=None, use_case_name=None, incremental=False, approx_param
             qp_per_tensor=args["qp_per_tensor"],
             use_dq=args["use_dq"],
             opt_qp=args["opt_qp"],
+            target_size_bytes=args["target_size"],
             int_quant_bw=args["bitdepth"],
             row_skipping=args["row_skipping"],
             tca=args["tca"],
@@ -131,6 +133,7 @@ def encode(model, args=None, use_case_name=None, incremental=False, approx_param
                                               lsa=args["lsa"],
                                               bnf=args["bnf"],
                                               opt_qp=args["opt_qp"],
+                                              target_size_bytes=args["target_size"],
                                               int_quant_bw=args["bitdepth"],
                                               row_skipping=args["row_skipping"],
                                               tca=args["tca"],
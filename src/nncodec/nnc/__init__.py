@@ -38,4 +38,5 @@ ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 POSSIBILITY OF SUCH DAMAGE.
 '''
     
-from .compression import compress, decompress, compress_model, decompress_model, guess_block_id_and_param_type
\ No newline at end of file
+from .compression import compress, compress_iter, sweep, decompress, decompress_iter, decompress_into, decompress_sharded, index, compress_model, compress_sharded, decompress_model, guess_block_id_and_param_type
+from nncodec.nnc_core import QuantizationCache
\ No newline at end of file
@@ -45,6 +45,9 @@ import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 import numpy as np
 import copy
+import json
+import mmap
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from timeit import default_timer as timer
 from nncodec import nnc_core
 from nncodec.nnc_core import nnr_model
@@ -87,45 +90,24 @@ def guess_block_id_and_param_type(model_struct, add_lsa_params=False):
     return block_id_and_param_type
         
 
-def compress_model( model_path_or_object,
-                    bitstream_path="./bitstream.nnc",
-                    qp=-38,
-                    qp_density=2,
-                    nonweight_qp=-75,
-                    qp_per_tensor=None,
-                    use_dq=True,
-                    codebook_mode=0,
-                    scan_order=0,
-                    lambda_scale=0,
-                    param_opt=True,
-                    cabac_unary_length_minus1=10,
-                    opt_qp=False,
-                    ioq=False,
-                    bnf=False,
-                    lsa=False,
-                    fine_tune=False,
-                    row_skipping=False,
-                    tca=False,
-                    block_id_and_param_type=None,
-                    model_name=None,
-                    model_executer=None,
-                    model_struct=None,
-                    dataset_path=None,
-                    use_case=None,
-                    learning_rate=1e-4,
-                    batch_size=64,
-                    epochs=30,
-                    max_batches=None,
-                    num_workers=8,
-                    return_model_data=False,
-                    verbose=True,
-                    return_bitstream=False,
-                    wandb_logging=False,
-                    approx_param_base = None,
-                    device_id = 0,
-                    int_quant_bw = False,
-                   ):
-
+def __load_model( model_path_or_object,
+                  bnf=False,
+                  lsa=False,
+                  block_id_and_param_type=None,
+                  model_name=None,
+                  model_executer=None,
+                  model_struct=None,
+                  dataset_path=None,
+                  use_case=None,
+                  learning_rate=1e-4,
+                  batch_size=64,
+                  epochs=30,
+                  max_batches=None,
+                  num_workers=8,
+                  mmap=False,
+                 ):
+    ##loads the model (object or file), creates the model executer if none is given and guesses the block ids for BNF/LSA;
+    ##with mmap, PyTorch checkpoint files are memory-mapped instead of being read into memory
     is_pyt_model = False
     is_tef_model = False
     dataset_path = None if dataset_path is None else os.path.expanduser(dataset_path)
@@ -201,11 +183,12 @@ def compress_model( model_path_or_object,
                     model_name=model_name
                     )
 
-        elif model_path_or_object.endswith(".pt") or model_path_or_object.endswith(".pth"):
+        elif model_path_or_object.endswith(".pt") or model_path_or_object.endswith(".pth") or model_path_or_object.endswith(".safetensors"):
             is_pyt_model = True
             if model_executer:
                 nnc_mdl, _, model_parameters = pytorch_model.create_NNC_model_instance_from_file(
                  model_path_or_object,
+                 mmap=mmap,
                 )
             else:    
                 nnc_mdl, nnc_mdl_executer, model_parameters = pytorch_model.create_NNC_model_instance_from_file(
@@ -218,6 +201,7 @@ def compress_model( model_path_or_object,
                     lsa=lsa,
                     epochs=epochs,
                     max_batches=max_batches,
+                    mmap=mmap,
                     )
 
         else:
@@ -248,7 +232,74 @@ def compress_model( model_path_or_object,
             for key in model_parameters.keys():
                 if "weight_scaling" in key:
                     del model_parameters[key]
-            
+
+    return nnc_mdl, nnc_mdl_executer, model_parameters, block_id_and_param_type, bnf, lsa, is_pyt_model
+
+
+def compress_model( model_path_or_object,
+                    bitstream_path="./bitstream.nnc",
+                    qp=-38,
+                    qp_density=2,
+                    nonweight_qp=-75,
+                    qp_per_tensor=None,
+                    use_dq=True,
+                    codebook_mode=0,
+                    scan_order=0,
+                    lambda_scale=0,
+                    param_opt=True,
+                    cabac_unary_length_minus1=10,
+                    opt_qp=False,
+                    ioq=False,
+                    bnf=False,
+                    lsa=False,
+                    fine_tune=False,
+                    row_skipping=False,
+                    tca=False,
+                    block_id_and_param_type=None,
+                    model_name=None,
+                    model_executer=None,
+                    model_struct=None,
+                    dataset_path=None,
+                    use_case=None,
+                    learning_rate=1e-4,
+                    batch_size=64,
+                    epochs=30,
+                    max_batches=None,
+                    num_workers=8,
+                    return_model_data=False,
+                    verbose=True,
+                    return_bitstream=False,
+                    wandb_logging=False,
+                    approx_param_base = None,
+                    device_id = 0,
+                    int_quant_bw = False,
+                    ioq_workers=1,
+                    target_size_bytes=None,
+                    encode_threads=1,
+                    cache=None,
+                    fused_quantization=False,
+                    mmap=False,
+                   ):
+    ##with mmap, a PyTorch checkpoint (.pt/.pth saved with the zipfile format, .safetensors files are always mapped) is
+    ##memory-mapped and each tensor is only read when it is encoded; combined with fused_quantization, no quantized
+    ##copy is held either, so the memory peak stays near a single tensor plus the bitstream
+
+    nnc_mdl, nnc_mdl_executer, model_parameters, block_id_and_param_type, bnf, lsa, is_pyt_model = __load_model( model_path_or_object,
+                                                                                                                 bnf=bnf,
+                                                                                                                 lsa=lsa,
+                                                                                                                 block_id_and_param_type=block_id_and_param_type,
+                                                                                                                 model_name=model_name,
+                                                                                                                 model_executer=model_executer,
+                                                                                                                 model_struct=model_struct,
+                                                                                                                 dataset_path=dataset_path,
+                                                                                                                 use_case=use_case,
+                                                                                                                 learning_rate=learning_rate,
+                                                                                                                 batch_size=batch_size,
+                                                                                                                 epochs=epochs,
+                                                                                                                 max_batches=max_batches,
+                                                                                                                 num_workers=num_workers,
+                                                                                                                 mmap=mmap,
+                                                                                                                )
 
     bitstream = compress(   model_parameters,
                             bitstream_path=bitstream_path,
@@ -278,6 +329,11 @@ def compress_model( model_path_or_object,
                             approx_param_base=approx_param_base,
                             device_id=device_id,
                             int_quant_bw = int_quant_bw,
+                            ioq_workers=ioq_workers,
+                            target_size_bytes=target_size_bytes,
+                            encode_threads=encode_threads,
+                            cache=cache,
+                            fused_quantization=fused_quantization,
                             )
 
     if bnf: #ADDED for ICML
@@ -292,9 +348,79 @@ def compress_model( model_path_or_object,
         return bitstream
 
 
-def compress( 
+def _compress_shard(shard_path, bitstream_path, compress_args):
+    ##process pool worker of compress_sharded: compresses one shard and returns its tensors' NNR units from the bitstream index
+    compress_model(shard_path, bitstream_path=bitstream_path, **compress_args)
+    units = index(bitstream_path)
+    tensors = {}
+    for unit in units:
+        for param in unit.get("topology_elem_ids", []):
+            tensors[param] = {"offset": unit["offset"], "nnr_unit_size": unit["nnr_unit_size"]}
+    return tensors, os.path.getsize(bitstream_path)
+
+
+def compress_sharded( shard_paths,
+                      output_dir="./",
+                      manifest_path=None,
+                      qp=-38,
+                      qp_density=2,
+                      nonweight_qp=-75,
+                      qp_per_tensor=None,
+                      use_dq=True,
+                      codebook_mode=0,
+                      scan_order=0,
+                      lambda_scale=0,
+                      param_opt=True,
+                      cabac_unary_length_minus1=10,
+                      opt_qp=False,
+                      row_skipping=False,
+                      int_quant_bw=False,
+                      fused_quantization=True,
+                      mmap=True,
+                      workers=None,
+                      verbose=False,
+                     ):
+    ##compresses the shard files of a checkpoint (e.g. model-00001-of-00008.safetensors) concurrently in a pool of
+    ##up to workers processes, each shard into its own bitstream <output_dir>/<shard name>.nnc. A JSON manifest
+    ##(default: <output_dir>/manifest.json) maps each tensor to its shard bitstream and to the offset and size of the NNR
+    ##unit (NDU) carrying it; the manifest is returned. Bitstream paths in the manifest are relative to the manifest.
+    shard_paths = [os.path.expanduser(path) for path in shard_paths]
+    output_dir = os.path.expanduser(output_dir)
+    manifest_path = os.path.join(output_dir, "manifest.json") if manifest_path is None else os.path.expanduser(manifest_path)
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    os.makedirs(output_dir, exist_ok=True)
+
+    bitstream_paths = [os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + ".nnc") for path in shard_paths]
+    assert len(set(bitstream_paths)) == len(bitstream_paths), "Shard file names must be unique!"
+
+    compress_args = {"qp": qp, "qp_density": qp_density, "nonweight_qp": nonweight_qp, "qp_per_tensor": qp_per_tensor, "use_dq": use_dq,
+                     "codebook_mode": codebook_mode, "scan_order": scan_order, "lambda_scale": lambda_scale, "param_opt": param_opt,
+                     "cabac_unary_length_minus1": cabac_unary_length_minus1, "opt_qp": opt_qp, "row_skipping": row_skipping,
+                     "int_quant_bw": int_quant_bw, "fused_quantization": fused_quantization, "mmap": mmap, "verbose": verbose}
+
+    start = timer()
+    __print_output_line("COMPRESSING {} SHARDS...\n".format(len(shard_paths)), verbose=verbose)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_compress_shard, shard_paths, bitstream_paths, [compress_args] * len(shard_paths)))
+
+    manifest = {"shards": [], "tensors": {}}
+    for shard_path, bitstream_path, (tensors, bitstream_size) in zip(shard_paths, bitstream_paths, results):
+        bitstream = os.path.relpath(os.path.abspath(bitstream_path), manifest_dir)
+        manifest["shards"].append({"bitstream": bitstream, "source": os.path.basename(shard_path), "bitstream_size": bitstream_size})
+        for param, unit in tensors.items():
+            assert param not in manifest["tensors"], "Tensor {} is contained in more than one shard!".format(param)
+            manifest["tensors"][param] = {"bitstream": bitstream, **unit}
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    end = timer()
+
+    bitstream_size = sum(shard["bitstream_size"] for shard in manifest["shards"])
+    __print_output_line("COMPRESSED {} SHARDS TO {} BYTES ({:.2f} MB) in {:.4f} s\n".format(len(shard_paths), bitstream_size, bitstream_size/1000000.0, end-start), verbose=True)
+    return manifest
+
+
+def __approximate(
     parameter_dict,
-    bitstream_path="./bitstream.nnc",
     qp=-38,
     qp_density=2,
     nonweight_qp=-75,
@@ -307,6 +433,8 @@ def compress(
     cabac_unary_length_minus1=10,
     opt_qp=False,
     ioq=False,
+    ioq_workers=1,
+    target_size_bytes=None,
     bnf=False,
     lsa=False,
     fine_tune=False,
@@ -316,21 +444,26 @@ def compress(
     model=None,
     model_executer=None,
     verbose=False,
-    return_bitstream=False,
     bnf_mapping=False,
     wandb_logging=False,
-    approx_param_base=None,
     device_id=0,
     compress_differences=False,
     int_quant_bw=False,
-    quantize_only=False
+    approx_param_base=None,
+    preprocess_only=False,
+    cache=None,
+    fused_quantization=False,
+    quantize_only=False,
     ):
+    ##the quantization and coding options of all compress functions, which pass them on by name.
+    ##With preprocess_only, (nnc_mdl, enc_info, approx_data, approx_info, get_qps) is returned before the quantization, where
+    ##get_qps(qp) derives the QPs for another qp as for this one; with fused_quantization, uniformly quantized tensors are only
+    ##quantized while being encoded (not with quantize_only)
 
     try:
         start = timer()
-        start_overall = start
         __print_output_line("INITIALIZE APPROXIMATOR AND ENCODER...", verbose=verbose)
-        if isinstance(parameter_dict, dict) and all( [isinstance(a, np.ndarray) for a in parameter_dict.values()] ) and (all([ (a.dtype==np.float32 or a.dtype==np.int32) for a in parameter_dict.values()])):
+        if isinstance(parameter_dict, dict) and all( [isinstance(a, np.ndarray) for a in parameter_dict.values()] ) and (all([ (nnc_core.common.is_float_tensor(a) or a.dtype==np.int32) for a in parameter_dict.values()])):
             model_parameters = parameter_dict
             
             if isinstance(model, nnc_core.nnr_model.NNRModel):
@@ -341,10 +474,14 @@ def compress(
             if model_executer is not None:
                 assert isinstance( model_executer, nnc_core.nnr_model.ModelExecute ), "model_executer must be of type ModelExecute!"
         else:
-            raise SystemExit("Parameter dict must be a dict (key-value pairs). The keys shall be stings, specifying the tensor names. The values shalls be numpy arrays (ndarray) of type float32 or int32!")
+            raise SystemExit("Parameter dict must be a dict (key-value pairs). The keys shall be stings, specifying the tensor names. The values shalls be numpy arrays (ndarray) of type float32 (or float16, bfloat16, float64) or int32!")
     except:
         raise SystemExit("Can not read parameter_dict: {}".format(parameter_dict))
 
+    ##other floating point types are converted to float32 tensor by tensor while quantizing, except for tools that process the whole model
+    if codebook_mode > 0 or bnf or bnf_mapping or lsa or fine_tune or ioq or opt_qp or int_quant_bw or target_size_bytes is not None or preprocess_only:
+        model_parameters = {param: nnc_core.common.to_float32(value) if nnc_core.common.is_float_tensor(value) else value for param, value in model_parameters.items()}
+
     if block_id_and_param_type is not None:
         blkIdParamTypeOk = nnc_core.nnr_model.sanity_check_block_id_and_param_type( block_id_and_param_type, parameter_dict )
         if blkIdParamTypeOk:
@@ -436,6 +573,7 @@ def compress(
             enc_info["param_opt_flag"],
             enc_info["cabac_unary_length_minus1"],
             verbose=verbose,
+            workers=ioq_workers,
         )
         end = timer()
         __print_output_line("DONE in {:.4f} s\n".format( end-start ), verbose=verbose)   
@@ -467,45 +605,433 @@ def compress(
         end = timer()
         __print_output_line("DONE in {:.4f} s\n".format(end-start), verbose=verbose)
         if bnf_mapping:
-            return nnc_mdl.model_info
+            return nnc_mdl, None, None
+
+    if preprocess_only:
+        ##QPs of parameters added by BNF or LSA are shifted by the difference to qp unless they are fixed by nonweight_qp
+        def get_qps(qp_point):
+            approx_data_init = nnc_core.approximator.init_approx_data( model_parameters, nnc_mdl.model_info, qp_density=qp_density, scan_order=scan_order )
+            qp_init = nnc_core.approximator.ApproxInfo( approx_data_init,
+                                                        nnc_mdl.model_info,
+                                                        "uniform" if codebook_mode==0 else "codebook",
+                                                        codebook_mode,
+                                                        qp_point,
+                                                        opt_qp,
+                                                        not use_dq,
+                                                        cabac_unary_length_minus1,
+                                                        lambda_scale,
+                                                        nonweight_qp=nonweight_qp,
+                                                        qp_per_tensor=qp_per_tensor,
+                                                        int_quant_bw=int_quant_bw
+                                                      ).approx_info["qp"]
+            return {param: qp_init[param] if param in qp_init else np.int32(param_qp + (0 if nonweight_qp else qp_point - qp)) for param, param_qp in approx_info["qp"].items()}
+        return nnc_mdl, enc_info, approx_data, approx_info, get_qps
 
     #####QUANTIZATION AND ENCODING
     start = timer() 
-    __print_output_line("APPROXIMATING WITH METHOD {}...".format(approx_info["approx_method"]), verbose=verbose)
-    approx_data_enc = nnc_core.approximator.approx( approx_info,
-                                                nnc_mdl.model_info,
-                                                approx_data,
-                                                enc_info
-                                               )
+    if target_size_bytes is not None:
+        __print_output_line("APPROXIMATING WITH METHOD {} FOR A TARGET SIZE OF {} BYTES...\n".format(approx_info["approx_method"], target_size_bytes), verbose=verbose)
+        approx_data_enc = nnc_core.approximator.target_size_qp_opt( approx_info,
+                                                                    nnc_mdl.model_info,
+                                                                    approx_data,
+                                                                    enc_info,
+                                                                    target_size_bytes,
+                                                                    approx_param_base=approx_param_base,
+                                                                    verbose=verbose
+                                                                   )
+    else:
+        __print_output_line("APPROXIMATING WITH METHOD {}...".format(approx_info["approx_method"]), verbose=verbose)
+        approx_data_enc = nnc_core.approximator.approx( approx_info,
+                                                    nnc_mdl.model_info,
+                                                    approx_data,
+                                                    enc_info,
+                                                    cache=cache,
+                                                    fused=fused_quantization and not quantize_only and not enc_info["mps_parent_signalling_enabled_flag"] and not approx_param_base
+                                                   )
     end = timer()
     __print_output_line("DONE in {:.4f} s\n".format( end-start ), verbose=verbose)
 
+    return nnc_mdl, enc_info, approx_data_enc
+
+
+def __compress_units( parameter_dict, encode_threads=1, reconstruction=None, **kwargs ):
+    ##shared entry point of compress and compress_iter, which pass their options to __approximate by name (kwargs);
+    ##returns (nnc_mdl, approx_data_enc, units), where units is a generator encoding the NNR units one by one
+    nnc_mdl, enc_info, approx_data_enc = __approximate( parameter_dict, **kwargs )
+    if enc_info is None: # bnf_mapping
+        return nnc_mdl, None, None
+    units = nnc_core.coder.encode_iter(enc_info=enc_info,
+                                       model_info=nnc_mdl.model_info,
+                                       approx_data=approx_data_enc,
+                                       approx_param_base=kwargs.get("approx_param_base"),
+                                       encode_threads=encode_threads,
+                                       cache=kwargs.get("cache"),
+                                       reconstruction=reconstruction,
+                                       )
+    return nnc_mdl, approx_data_enc, units
+
+
+def compress( 
+    parameter_dict,
+    bitstream_path="./bitstream.nnc",
+    qp=-38,
+    qp_density=2,
+    nonweight_qp=-75,
+    qp_per_tensor=None,
+    use_dq=True,
+    codebook_mode=0,
+    scan_order=0,
+    lambda_scale=0,
+    param_opt=True,
+    cabac_unary_length_minus1=10,
+    opt_qp=False,
+    ioq=False,
+    bnf=False,
+    lsa=False,
+    fine_tune=False,
+    row_skipping=False,
+    tca=False,
+    block_id_and_param_type=None,
+    model=None,
+    model_executer=None,
+    verbose=False,
+    return_bitstream=False,
+    bnf_mapping=False,
+    wandb_logging=False,
+    approx_param_base=None,
+    device_id=0,
+    compress_differences=False,
+    int_quant_bw=False,
+    quantize_only=False,
+    ioq_workers=1,
+    target_size_bytes=None,
+    encode_threads=1,
+    sink=None,
+    cache=None,
+    fused_quantization=False,
+    return_reconstruction=False,
+    ):
+    ##with fused_quantization, each tensor is quantized and entropy coded in one pass, so that no quantized copy of the model
+    ##is held in memory; with return_reconstruction, the dequantized parameters are returned (with the bitstream, if requested)
+
+    start_overall = timer()
+    reconstruction = {} if return_reconstruction else None
+    nnc_mdl, approx_data_enc, units = __compress_units( parameter_dict,
+                                                        encode_threads=encode_threads,
+                                                        reconstruction=reconstruction,
+                                                        qp=qp,
+                                                        qp_density=qp_density,
+                                                        nonweight_qp=nonweight_qp,
+                                                        qp_per_tensor=qp_per_tensor,
+                                                        use_dq=use_dq,
+                                                        codebook_mode=codebook_mode,
+                                                        scan_order=scan_order,
+                                                        lambda_scale=lambda_scale,
+                                                        param_opt=param_opt,
+                                                        cabac_unary_length_minus1=cabac_unary_length_minus1,
+                                                        opt_qp=opt_qp,
+                                                        ioq=ioq,
+                                                        ioq_workers=ioq_workers,
+                                                        target_size_bytes=target_size_bytes,
+                                                        bnf=bnf,
+                                                        lsa=lsa,
+                                                        fine_tune=fine_tune,
+                                                        row_skipping=row_skipping,
+                                                        tca=tca,
+                                                        block_id_and_param_type=block_id_and_param_type,
+                                                        model=model,
+                                                        model_executer=model_executer,
+                                                        verbose=verbose,
+                                                        bnf_mapping=bnf_mapping,
+                                                        wandb_logging=wandb_logging,
+                                                        device_id=device_id,
+                                                        compress_differences=compress_differences,
+                                                        int_quant_bw=int_quant_bw,
+                                                        approx_param_base=approx_param_base,
+                                                        cache=cache,
+                                                        fused_quantization=fused_quantization,
+                                                        quantize_only=quantize_only,
+                                                       )
+    if bnf_mapping:
+        return nnc_mdl.model_info
+
     if quantize_only:
         nnc_core.approximator.rec(approx_data_enc)
         return approx_data_enc["parameters"]
 
     start = timer()
     __print_output_line("ENCODING...", verbose=verbose)
-    bitstream, _ = nnc_core.coder.encode(enc_info=enc_info,
-                                         model_info=nnc_mdl.model_info,
-                                         approx_data=approx_data_enc,
-                                         approx_param_base=approx_param_base
-                                         )
+    ##NNR units are flushed to the file and the sink as soon as they are finished; the file is written to a temporary
+    ##path next to bitstream_path, which replaces bitstream_path only once the encoding succeeded
+    bitstream = bytearray() if return_bitstream else None
+    writers = [nnc_core.coder.unit_writer(sink)] if sink is not None else []
+    if bitstream is not None:
+        writers.append(bitstream.extend)
+    br_file = None
+    if bitstream_path is not None:
+        bitstream_tmp_path = "{}.{}.tmp".format(bitstream_path, os.getpid())
+        br_file = open( bitstream_tmp_path, "wb" )
+        writers.append(br_file.write)
+    bitstream_size = 0
+    try:
+        for bs_unit in units:
+            for write in writers:
+                write(bs_unit)
+            bitstream_size += len(bs_unit)
+    except BaseException:
+        if br_file is not None:
+            br_file.close()
+            os.remove(bitstream_tmp_path)
+        raise
+    if br_file is not None:
+        br_file.close()
+        os.replace(bitstream_tmp_path, bitstream_path)
     end = timer()
     __print_output_line("DONE in {:.4f} s\n".format( end-start ), verbose=verbose)
 
     original_size = nnc_mdl.model_info["original_size"]
 
-    __print_output_line("COMPRESSED FROM {} BYTES TO {} BYTES ({:.2f} KB, {:.2f} MB, COMPRESSION RATIO: {:.2f} %) in {:.4f} s\n".format(original_size, len(bitstream), len(bitstream)/1000.0, len(bitstream)/1000000.0, len(bitstream)/original_size*100, end-start_overall), verbose=True)
-    
-    if bitstream_path is not None:
-        with open( bitstream_path, "wb" ) as br_file:
-            br_file.write( bitstream )
+    __print_output_line("COMPRESSED FROM {} BYTES TO {} BYTES ({:.2f} KB, {:.2f} MB, COMPRESSION RATIO: {:.2f} %) in {:.4f} s\n".format(original_size, bitstream_size, bitstream_size/1000.0, bitstream_size/1000000.0, bitstream_size/original_size*100, end-start_overall), verbose=True)
+
+    if return_reconstruction:
+        ##tensors quantized on encode have been reconstructed by the encoder, the others are dequantized here
+        approx_data_rec = {k: copy.copy(v) for k, v in approx_data_enc.items()}
+        for param in approx_data_rec["parameters"]:
+            if param not in reconstruction:
+                nnc_core.approximator.rec_param(param, approx_data_rec)
+                reconstruction[param] = approx_data_rec["parameters"][param]
+        return (bitstream, reconstruction) if return_bitstream else reconstruction
 
     if return_bitstream:
         return bitstream
 
 
+def compress_iter( 
+    parameter_dict,
+    qp=-38,
+    qp_density=2,
+    nonweight_qp=-75,
+    qp_per_tensor=None,
+    use_dq=True,
+    codebook_mode=0,
+    scan_order=0,
+    lambda_scale=0,
+    param_opt=True,
+    cabac_unary_length_minus1=10,
+    opt_qp=False,
+    ioq=False,
+    bnf=False,
+    lsa=False,
+    fine_tune=False,
+    row_skipping=False,
+    tca=False,
+    block_id_and_param_type=None,
+    model=None,
+    model_executer=None,
+    verbose=False,
+    wandb_logging=False,
+    approx_param_base=None,
+    device_id=0,
+    compress_differences=False,
+    int_quant_bw=False,
+    ioq_workers=1,
+    target_size_bytes=None,
+    encode_threads=1,
+    cache=None,
+    fused_quantization=False,
+    ):
+    ##yields the NNR units while they are encoded; the options are the same as for compress
+
+    _, _, units = __compress_units( parameter_dict,
+                                    encode_threads=encode_threads,
+                                    qp=qp,
+                                    qp_density=qp_density,
+                                    nonweight_qp=nonweight_qp,
+                                    qp_per_tensor=qp_per_tensor,
+                                    use_dq=use_dq,
+                                    codebook_mode=codebook_mode,
+                                    scan_order=scan_order,
+                                    lambda_scale=lambda_scale,
+                                    param_opt=param_opt,
+                                    cabac_unary_length_minus1=cabac_unary_length_minus1,
+                                    opt_qp=opt_qp,
+                                    ioq=ioq,
+                                    ioq_workers=ioq_workers,
+                                    target_size_bytes=target_size_bytes,
+                                    bnf=bnf,
+                                    lsa=lsa,
+                                    fine_tune=fine_tune,
+                                    row_skipping=row_skipping,
+                                    tca=tca,
+                                    block_id_and_param_type=block_id_and_param_type,
+                                    model=model,
+                                    model_executer=model_executer,
+                                    verbose=verbose,
+                                    wandb_logging=wandb_logging,
+                                    device_id=device_id,
+                                    compress_differences=compress_differences,
+                                    int_quant_bw=int_quant_bw,
+                                    approx_param_base=approx_param_base,
+                                    cache=cache,
+                                    fused_quantization=fused_quantization,
+                                   )
+
+    start = timer()
+    __print_output_line("ENCODING (STREAMING)...", verbose=verbose)
+    yield from units
+    end = timer()
+    __print_output_line("DONE in {:.4f} s\n".format( end-start ), verbose=verbose)
+
+
+def sweep(
+    model_path_or_object,
+    qps,
+    qp_density=2,
+    nonweight_qp=-75,
+    qp_per_tensor=None,
+    use_dq=True,
+    codebook_mode=0,
+    scan_order=0,
+    lambda_scale=0,
+    param_opt=True,
+    cabac_unary_length_minus1=10,
+    opt_qp=False,
+    bnf=False,
+    lsa=False,
+    fine_tune=False,
+    row_skipping=False,
+    tca=False,
+    block_id_and_param_type=None,
+    model_name=None,
+    model_executer=None,
+    model_struct=None,
+    dataset_path=None,
+    use_case=None,
+    learning_rate=1e-4,
+    batch_size=64,
+    epochs=30,
+    max_batches=None,
+    num_workers=8,
+    evaluate=False,
+    return_bitstreams=False,
+    sweep_threads=1,
+    encode_threads=1,
+    verbose=False,
+    wandb_logging=False,
+    approx_param_base=None,
+    device_id=0,
+    compress_differences=False,
+    int_quant_bw=False,
+    cache=None,
+    ):
+    ##rate-distortion sweep: the model is loaded and preprocessed (BNF, LSA/FT tuned at qps[0]) once, then each QP is quantized and
+    ##encoded (up to sweep_threads QPs concurrently).
+    ##Returns a list with one dict per QP: {"qp", "bitstream_size", "mse" (per tensor, of the decoded to the original parameters),
+    ##"accuracy" (with evaluate), "bitstream" (with return_bitstreams)}
+    assert len(qps) > 0, "qps must contain at least one QP!"
+
+    if isinstance(model_path_or_object, dict):
+        nnc_mdl, nnc_mdl_executer, model_parameters = None, model_executer, model_path_or_object
+    else:
+        nnc_mdl, nnc_mdl_executer, model_parameters, block_id_and_param_type, bnf, lsa, _ = __load_model( model_path_or_object,
+                                                                                                          bnf=bnf,
+                                                                                                          lsa=lsa,
+                                                                                                          block_id_and_param_type=block_id_and_param_type,
+                                                                                                          model_name=model_name,
+                                                                                                          model_executer=model_executer,
+                                                                                                          model_struct=model_struct,
+                                                                                                          dataset_path=dataset_path,
+                                                                                                          use_case=use_case,
+                                                                                                          learning_rate=learning_rate,
+                                                                                                          batch_size=batch_size,
+                                                                                                          epochs=epochs,
+                                                                                                          max_batches=max_batches,
+                                                                                                          num_workers=num_workers,
+                                                                                                         )
+    if evaluate:
+        assert nnc_mdl_executer is not None and nnc_mdl_executer.has_test(), "model_executer with test_model must be available in order to evaluate the sweep!"
+
+    start = timer()
+    __print_output_line("PREPROCESSING FOR SWEEP...\n", verbose=verbose)
+    ##the QPs of each point are derived as in compress (including opt_qp and qp_per_tensor), see get_qps of __approximate
+    nnc_mdl, enc_info, approx_data, approx_info, get_qps = __approximate( model_parameters,
+                                                                          qp=qps[0],
+                                                                          qp_density=qp_density,
+                                                                          nonweight_qp=nonweight_qp,
+                                                                          qp_per_tensor=qp_per_tensor,
+                                                                          use_dq=use_dq,
+                                                                          codebook_mode=codebook_mode,
+                                                                          scan_order=scan_order,
+                                                                          lambda_scale=lambda_scale,
+                                                                          param_opt=param_opt,
+                                                                          cabac_unary_length_minus1=cabac_unary_length_minus1,
+                                                                          opt_qp=opt_qp,
+                                                                          bnf=bnf,
+                                                                          lsa=lsa,
+                                                                          fine_tune=fine_tune,
+                                                                          row_skipping=row_skipping,
+                                                                          tca=tca,
+                                                                          block_id_and_param_type=block_id_and_param_type,
+                                                                          model=nnc_mdl,
+                                                                          model_executer=nnc_mdl_executer,
+                                                                          verbose=verbose,
+                                                                          wandb_logging=wandb_logging,
+                                                                          device_id=device_id,
+                                                                          compress_differences=compress_differences,
+                                                                          int_quant_bw=int_quant_bw,
+                                                                          approx_param_base=approx_param_base,
+                                                                          preprocess_only=True,
+                                                                         )
+    end = timer()
+    __print_output_line("DONE in {:.4f} s\n".format( end-start ), verbose=verbose)
+    model_info = nnc_mdl.model_info
+
+    def sweep_point(qp):
+        start = timer()
+        approx_info_qp = copy.deepcopy(approx_info)
+        approx_info_qp["qp"] = get_qps(qp)
+        approx_data_enc = nnc_core.approximator.approx(approx_info_qp, model_info, approx_data, enc_info, cache=cache)
+
+        bitstream = bytearray() if return_bitstreams else None
+        bitstream_size = 0
+        for bs_unit in nnc_core.coder.encode_iter(enc_info=enc_info,
+                                                  model_info=model_info,
+                                                  approx_data=approx_data_enc,
+                                                  approx_param_base=approx_param_base,
+                                                  encode_threads=encode_threads,
+                                                  cache=cache,
+                                                  ):
+            if bitstream is not None:
+                bitstream.extend(bs_unit)
+            bitstream_size += len(bs_unit)
+
+        ##reconstructed as by decompress_model (BN unfolded, LSA applied), so that the parameters are evaluated and compared
+        ##to the original ones like a decoded model; model_info is copied as apply_lsa and recompose_params modify it
+        nnc_core.approximator.rec(approx_data_enc)
+        rec_model_info = copy.deepcopy(model_info)
+        rec_approx_data = {k: copy.copy(v) for k, v in approx_data_enc.items()}
+        nnc_core.approximator.unfold_bn(rec_model_info, rec_approx_data)
+        nnc_core.approximator.apply_lsa(rec_model_info, rec_approx_data)
+        rec_params = nnc_core.approximator.recompose_params(rec_model_info, rec_approx_data)["parameters"]
+        result = {
+            "qp": qp,
+            "bitstream_size": bitstream_size,
+            "mse": {param: float(np.mean((np.asarray(rec_params[param], dtype=np.float64) - np.asarray(model_parameters[param], dtype=np.float64)) ** 2)) for param in rec_params if param in model_parameters},
+        }
+        if evaluate:
+            result["accuracy"] = nnc_mdl_executer.test_model(rec_params, verbose=False)
+        if return_bitstreams:
+            result["bitstream"] = bitstream
+        end = timer()
+        __print_output_line("QP {}: {} BYTES in {:.4f} s\n".format(qp, bitstream_size, end-start), verbose=verbose)
+        return result
+
+    if sweep_threads > 1:
+        with ThreadPoolExecutor(max_workers=sweep_threads) as pool:
+            return list(pool.map(sweep_point, qps))
+    return [sweep_point(qp) for qp in qps]
+
+
 def decompress( bitstream_or_path, 
                 block_id_and_param_type=None, 
                 return_model_information=False, 
@@ -515,7 +1041,14 @@ def decompress( bitstream_or_path,
                 approx_param_base=None,
                 update_base_param=False,
                 internal_states_path=None,
+                decode_threads=1,
+                ndu_threads=1,
+                tensors=None,
+                out=None,
                 ):
+    ##with out (a dict-like of param -> preallocated array, e.g. the state of an existing model), the reconstructed parameters
+    ##are written into these arrays: uniformly quantized tensors are dequantized directly into C-contiguous float32, float16
+    ##or bfloat16 (ml_dtypes.bfloat16 or int16/uint16 bit patterns) targets while decoding, all other parameters are copied
 
     dec_model_info  = {'parameter_type': {},
                       'parameter_dimensions': {},
@@ -548,23 +1081,38 @@ def decompress( bitstream_or_path,
     oob_dict = {}
     start = timer()
     __print_output_line("DECODING...", verbose=verbose)
-    if isinstance(bitstream_or_path, bytearray):
+    ##files are memory-mapped, so that only the NNR units which are decoded (see tensors) are read
+    br_file = None
+    if isinstance(bitstream_or_path, (bytearray, bytes, memoryview, mmap.mmap)):
         bitstream = bitstream_or_path
     elif os.path.exists(os.path.expanduser(bitstream_or_path)):
-        with open( os.path.expanduser(bitstream_or_path), "rb" ) as br_file:
-            bitstream = br_file.read()
+        br_file = open( os.path.expanduser(bitstream_or_path), "rb" )
+        bitstream = mmap.mmap( br_file.fileno(), 0, access=mmap.ACCESS_READ )
     else:
         raise SystemExit( "Could not read bitstream or bitstream_path: {}".format(bitstream_or_path) )
 
     if internal_states_path and approx_param_base is None: # loading co-located params for temporal tool
-        ndu_header = nnc_core.coder.decode_ndu_unit_header(copy.deepcopy(bitstream), dec_model_info, hls_stats=hls_bytes)
+        ndu_header = nnc_core.coder.decode_ndu_unit_header(bitstream, dec_model_info, hls_stats=hls_bytes)
         _int_states_path = internal_states_path + f"/client_ID{ndu_header['device_id']}_internal_states.npz"
         loaded_states = np.load(_int_states_path, allow_pickle=True)  # TODO get rid of allow_pickle
         loaded_internal_states = {k: loaded_states[k].item() for k in loaded_states.files}
         approx_param_base = loaded_internal_states['approx_param_base']
 
-    dec_approx_data = nnc_core.coder.decode(bitstream, dec_model_info, hls_stats=hls_bytes, oob_dict=oob_dict,
-                                            approx_param_base=approx_param_base, update_base_param=update_base_param)
+    ##uniformly quantized tensors are dequantized while decoding (LSA is applied in place, so it is only applied to float32 targets)
+    dequant_out = {}
+    if out is not None:
+        dequant_out = {param: target for param, target in out.items() if isinstance(target, np.ndarray) and (not reconstruct_lsa or target.dtype == np.float32)}
+    try:
+        dec_approx_data = nnc_core.coder.decode(bitstream, dec_model_info, hls_stats=hls_bytes, oob_dict=oob_dict,
+                                                approx_param_base=approx_param_base, update_base_param=update_base_param,
+                                                decode_threads=decode_threads, ndu_threads=ndu_threads,
+                                                rec_func=nnc_core.approximator.rec_param, tensors=tensors,
+                                                out=dequant_out if approx_param_base is None else None)
+    finally:
+        if br_file is not None:
+            br_file.close()
+    if br_file is not None:
+        bitstream.close()
 
     if internal_states_path and approx_param_base["parameters"]:
         np.savez(f"{_int_states_path}", **loaded_internal_states)
@@ -581,6 +1129,13 @@ def decompress( bitstream_or_path,
     if reconstruct_lsa: ## TODO: check if there are cases where must be dis/enabled
         nnc_core.approximator.apply_lsa(dec_model_info, rec_approx_data)
     rec_approx_data = nnc_core.approximator.recompose_params( dec_model_info, rec_approx_data)
+    if tensors is not None: # block NDUs may carry further tensors
+        rec_approx_data["parameters"] = {k: v for k, v in rec_approx_data["parameters"].items() if k in tensors}
+    if out is not None:
+        for param, value in rec_approx_data["parameters"].items():
+            if param in out and out[param] is not value:
+                __copy_into(out[param], value)
+        rec_approx_data["parameters"] = {k: out[k] if k in out else v for k, v in rec_approx_data["parameters"].items()}
     end = timer()
     __print_output_line("DONE in {:.4f} s\n".format( end-start ), verbose=verbose)
     
@@ -594,6 +1149,192 @@ def decompress( bitstream_or_path,
         return rec_approx_data["parameters"]
 
 
+def __copy_into(target, value):
+    assert tuple(target.shape) == tuple(value.shape), "Shape mismatch of the output array: {} != {}".format(tuple(target.shape), tuple(value.shape))
+    if nnc_core.coder.baseline.get_dequant_format(target) == 2 and target.dtype.name != "bfloat16":
+        ##bfloat16 bit patterns, rounded to nearest even as in Decoder.decodeAndDequantLayer
+        bits = np.ascontiguousarray(value, dtype=np.float32).view(np.uint32)
+        value = ((bits + 0x7fff + ((bits >> 16) & 1)) >> 16).astype(np.uint16).view(target.dtype)
+    np.copyto(target, value, casting="unsafe")
+
+
+def decompress_iter( bitstream_or_path,
+                     block_id_and_param_type=None,
+                     verbose=False,
+                     decode_threads=1,
+                     tensors=None,
+                     out=None,
+                     ):
+    ##with out, the tensors are written into the preallocated arrays out[param] (as in decompress) before they are yielded
+
+    dec_model_info  = {'parameter_type': {},
+                      'parameter_dimensions': {},
+                      'parameter_index': {},
+                      'block_identifier': {},
+                      'topology_storage_format' : None,
+                      'topology_compression_format' : None,
+                      'performance_maps' : { "mps" : {}, "lps" : {}},
+                      'performance_map_flags' : { "mps_sparsification_flag" : {}, "lps_sparsification_flag" : {},
+                                                  "mps_pruning_flag" : {}, "lps_pruning_flag" : {},
+                                                  "mps_unification_flag" : {}, "lps_unification_flag" : {},
+                                                  "mps_decomposition_performance_map_flag" : {}, "lps_decomposition_performance_map_flag" : {},
+                                                } 
+                      }
+
+    if block_id_and_param_type is not None:
+        blkIdParamTypeOk = nnc_core.nnr_model.sanity_check_block_id_and_param_type( block_id_and_param_type )
+        if blkIdParamTypeOk == False:
+            print("INFO: Sanity check for block_id_and_param_type failed! block_id_and_param_type has been set to 'None'!")
+            block_id_and_param_type = None
+        else:
+            nnc_core.nnr_model.set_block_id_and_param_type( dec_model_info, block_id_and_param_type )
+
+    __print_output_line("DECODING (STREAMING)...", verbose=verbose)
+    start = timer()
+    br_file = None
+    if isinstance(bitstream_or_path, (bytearray, bytes, memoryview)):
+        bitstream = bitstream_or_path
+    elif os.path.exists(os.path.expanduser(bitstream_or_path)):
+        br_file = open( os.path.expanduser(bitstream_or_path), "rb" )
+        bitstream = mmap.mmap( br_file.fileno(), 0, access=mmap.ACCESS_READ )
+    else:
+        raise SystemExit( "Could not read bitstream or bitstream_path: {}".format(bitstream_or_path) )
+
+    dequant_out = {param: target for param, target in out.items() if isinstance(target, np.ndarray)} if out is not None else {}
+    units = nnc_core.coder.decode_iter(bitstream, dec_model_info, oob_dict={}, hls_stats={}, decode_threads=decode_threads,
+                                       rec_func=nnc_core.approximator.rec_param, tensors=tensors, out=dequant_out)
+    try:
+        pending_dc = {}
+        for param, value in units:
+            ##decomposed weights are recomposed as soon as both factors are available
+            base = param[:-2]
+            if param[-2:] in ("_G", "_H") and base in dec_model_info["parameter_dimensions"]:
+                pending_dc.setdefault(base, {})[param[-1]] = value
+                if len(pending_dc[base]) < 2:
+                    continue
+                dc = pending_dc.pop(base)
+                param, value = base, dc["G"].dot(dc["H"]).reshape(dec_model_info["parameter_dimensions"][base])
+            if tensors is not None and param not in tensors: # block NDUs may carry further tensors
+                continue
+            if out is not None and param in out:
+                if out[param] is not value:
+                    __copy_into(out[param], value)
+                value = out[param]
+            yield param, value
+        assert not pending_dc, "Incomplete decomposition for: {}".format(sorted(pending_dc))
+    finally:
+        units.close() # releases all views into the bitstream before unmapping it
+        if br_file is not None:
+            bitstream.close()
+            br_file.close()
+
+    end = timer()
+    __print_output_line("DONE in {:.4f} s\n".format( end-start ), verbose=verbose)
+
+
+def decompress_into( model,
+                     bitstream_or_path,
+                     block_id_and_param_type=None,
+                     reconstruct_bnf=True,
+                     reconstruct_lsa=True,
+                     stream=False,
+                     verbose=False,
+                     decode_threads=1,
+                     ndu_threads=1,
+                     tensors=None,
+                    ):
+    ##decodes a bitstream in place into a PyTorch model (or a state dict of tensors): contiguous float32/float16/bfloat16 CPU
+    ##tensors are dequantized directly into their storage, all other tensors are filled via copy_ (e.g. on the GPU).
+    ##Returns the model; with stream=True, a generator is returned instead that decodes NDU by NDU and yields the name of each
+    ##tensor once it has been written (BNF and LSA are not reconstructed when streaming)
+    state_dict = model.state_dict() if hasattr(model, "state_dict") else model
+    buffers = pytorch_model.get_output_buffers(state_dict)
+
+    def copy_param(param, value):
+        assert param in state_dict, "The model does not fit the bitstream! Parameter '{}' not found in the model state dict!".format(param)
+        if buffers.get(param) is not value:
+            pytorch_model.copy_to_tensor(state_dict[param], value)
+
+    if stream:
+        def stream_params():
+            for param, value in decompress_iter(bitstream_or_path, block_id_and_param_type=block_id_and_param_type, verbose=verbose,
+                                                decode_threads=decode_threads, tensors=tensors, out=buffers):
+                copy_param(param, value)
+                yield param
+        return stream_params()
+
+    params = decompress(bitstream_or_path, block_id_and_param_type=block_id_and_param_type, verbose=verbose, reconstruct_lsa=reconstruct_lsa,
+                        reconstruct_bnf=reconstruct_bnf, decode_threads=decode_threads, ndu_threads=ndu_threads, tensors=tensors, out=buffers)
+    for param, value in params.items():
+        copy_param(param, value)
+    return model
+
+
+def index( bitstream_or_path ):
+    if isinstance(bitstream_or_path, (bytearray, bytes, memoryview)):
+        return nnc_core.coder.index(bitstream_or_path)
+    elif os.path.exists(os.path.expanduser(bitstream_or_path)):
+        with open( os.path.expanduser(bitstream_or_path), "rb" ) as br_file:
+            with mmap.mmap( br_file.fileno(), 0, access=mmap.ACCESS_READ ) as bitstream:
+                return nnc_core.coder.index(bitstream)
+    else:
+        raise SystemExit( "Could not read bitstream or bitstream_path: {}".format(bitstream_or_path) )
+
+
+def decompress_sharded( manifest_path,
+                        tensors=None,
+                        workers=None,
+                        decode_threads=1,
+                        verbose=False,
+                       ):
+    ##decodes the shard bitstreams listed in a manifest written by compress_sharded concurrently in up to workers threads
+    ##(the entropy decoding releases the GIL). With tensors, only the shards containing these tensors are read, and within
+    ##a shard only the units preceding the first NDU (NNR_STR, NNR_MPS) and the NDUs carrying the requested tensors are
+    ##read, at the offsets given by the manifest. Returns a dict of tensor name -> array in manifest order.
+    manifest_path = os.path.expanduser(manifest_path)
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    requested = list(manifest["tensors"]) if tensors is None else list(tensors)
+    missing = [param for param in requested if param not in manifest["tensors"]]
+    assert not missing, "Tensors not found in the manifest: {}".format(missing)
+
+    shard_tensors = {}
+    for param in requested:
+        shard_tensors.setdefault(manifest["tensors"][param]["bitstream"], []).append(param)
+    shard_units = {}
+    for param, unit in manifest["tensors"].items():
+        shard_units.setdefault(unit["bitstream"], {})[unit["offset"]] = unit["nnr_unit_size"]
+
+    def decompress_shard(bitstream):
+        ##shards of which all tensors are requested are decoded completely, otherwise a bitstream of the header units
+        ##and the requested NDUs (in bitstream order) is assembled and decoded
+        params = shard_tensors[bitstream]
+        path = os.path.join(manifest_dir, bitstream)
+        units = sorted(set(manifest["tensors"][param]["offset"] for param in params))
+        if len(units) == len(shard_units[bitstream]):
+            return decompress(path, decode_threads=decode_threads)
+        with open(path, "rb") as br_file:
+            partial_bitstream = bytearray(br_file.read(min(shard_units[bitstream])))
+            for offset in units:
+                br_file.seek(offset)
+                partial_bitstream += br_file.read(shard_units[bitstream][offset])
+        return decompress(partial_bitstream, decode_threads=decode_threads, tensors=params)
+
+    start = timer()
+    __print_output_line("DECODING {} SHARDS...".format(len(shard_tensors)), verbose=verbose)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(decompress_shard, shard_tensors))
+    end = timer()
+    __print_output_line("DONE in {:.4f} s\n".format( end-start ), verbose=verbose)
+
+    parameters = {}
+    for result in results:
+        parameters.update(result)
+    return {param: parameters[param] for param in requested}
+
+
 def decompress_model( bitstream_or_path,
                       model_path=None,#"./rec.mdl",
                       block_id_and_param_type=None,
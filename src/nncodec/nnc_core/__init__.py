@@ -43,4 +43,6 @@ import sys
 assert sys.version_info >= (3, 6)
     
 from . import approximator
-from . import coder
\ No newline at end of file
+from . import coder
+from . import common
+from .cache import QuantizationCache
@@ -38,6 +38,7 @@ ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 POSSIBILITY OF SUCH DAMAGE.
 '''
 import copy
+import itertools
 import sys
 from collections import OrderedDict
 import numpy as np
@@ -48,7 +49,11 @@ from nncodec import nnc_core
 from nncodec.nnc_core.nnr_model import NNRModelAccess, NNRBlockAccess, W_TYPES
 from nncodec.nnc_core import hls
 from nncodec.nnc_core.common import get_qp_from_stepsize
+from nncodec.nnc_core.hdsp.hdsp_tool import HDSP_OPTS_OFF
+from nncodec.extensions import deepCABAC
 from timeit import default_timer as timer
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 def __print_output_line( outputString, verbose=True ):
     if verbose:
@@ -149,7 +154,8 @@ def fold_bn(model_info, approx_data, ap_info, bnf_mapping=False):
             g = ad[block_access.bn_gamma] / np.sqrt( ad[block_access.bn_var] + eps )
             del_param(approx_data, ap_info.approx_info, block_access.bn_gamma)
             del_param(approx_data, ap_info.approx_info, block_access.bn_var)
-            ad[alpha] *= g
+            ##out of place: the parameters may be views of the caller's tensors (e.g. LSA parameters of a PyTorch model)
+            ad[alpha] = ad[alpha] * g
             ad[delta] = (ad[delta] - ad[block_access.bn_mean]) * g + ad[block_access.bn_beta]
             del_param(approx_data, ap_info.approx_info, block_access.bn_mean)
             del_param(approx_data, ap_info.approx_info, block_access.bn_beta)
@@ -258,218 +264,413 @@ def recompose_params(model_info, approx_data_in):
     resorted_param_dict = dict()
     resorted_param_id_dict = {k: v for k, v in sorted(model_info["parameter_index"].items(), key=lambda item: item[1])}
     for param in resorted_param_id_dict.keys():
-        resorted_param_dict[param] = copy.deepcopy(approx_data_out["parameters"][param])
+        resorted_param_dict[param] = approx_data_out["parameters"][param] # no copy, the arrays may be output buffers given to decompress
 
     approx_data_out["parameters"] = resorted_param_dict
 
     return approx_data_out
 
 
-def inference_based_qp_opt( 
-        approx_info,
-        model_info,
-        model_executer,
-        approx_data,
-        param_opt,
-        cabac_unary_length_minus1,
-        verbose,
-    ):
-    approx_data_qp = approx(
-        approx_info,
-        model_info,
-        approx_data,
-        param_opt,
-    )
-    rec_approx_data_qp = copy.deepcopy(approx_data_qp)
-    rec(
-        rec_approx_data_qp,
-    )
-    
-    ##encode
-    start = timer()
-    __print_output_line("\tIOQ: PROCESSING QP FOR ALL TENSORS...", verbose=verbose) 
-    enc_info_qp = {
-        "cabac_unary_length_minus1" : cabac_unary_length_minus1,
-        "param_opt_flag" : param_opt,
-    }
-    bitstream_qp = nnc_core.coder.encode(enc_info_qp, model_info, approx_data_qp)
+def __requant_param(approx_info, model_info, approx_data, approx_data_qp, param, enc_info):
+    ##re-quantizes only param, all other tensors are taken over (already quantized) from approx_data_qp
+    approx_data_in = {k: copy.copy(v) for k, v in approx_data_qp.items()}
+    approx_data_in["parameters"][param] = approx_data["parameters"][param]
+    for key in ["approx_method", "codebooks", "codebooks_egk", "codebook_zero_offsets"]:
+        approx_data_in[key].pop(param, None)
+    return approx(approx_info, model_info, approx_data_in, enc_info)
 
-    acc_qp = model_executer.eval_model(
-        rec_approx_data_qp["parameters"],
-        False,
-    )
-    
-    refBSSize = len(bitstream_qp)
-    refAcc = acc_qp[0]
 
-    bestCost = 0.0
-    end = timer()
-    __print_output_line("DONE in {:.4f} s\n".format( end-start ), verbose=verbose) 
+def __rec_param_of(approx_data_qp, param):
+    ##returns the reconstruction of param from approx_data_qp
+    rec_data = {k: copy.copy(v) for k, v in approx_data_qp.items()}
+    rec_param(param, rec_data)
+    return rec_data["parameters"][param]
 
 
-    ############################ eval with QP-1
-    start = timer()
-    __print_output_line("\tIOQ: PROCESSING QP-1 FOR ALL TENSORS...", verbose=verbose) 
- 
-    approx_info_qp = copy.deepcopy(approx_info)
+def __ndu_size_key(ndu_params, approx_info):
+    return ndu_params, tuple(approx_info["qp"].get(param) for param in ndu_params)
 
-    for p in approx_info_qp["qp"].keys():
-        if model_info["parameter_type"][p] in nnc_core.nnr_model.W_TYPES:
-            approx_info_qp["qp"][p] -= 1
 
+def __approx_all_tensors_qp(approx_info_qp, model_info, approx_data, enc_info, size_cache):
+    ##quantizes, reconstructs and encodes all tensors; the NDU sizes are added to size_cache
     approx_data_qp = approx(
         approx_info_qp,
         model_info,
         approx_data,
-        param_opt,
+        enc_info,
     )
     rec_approx_data_qp = copy.deepcopy(approx_data_qp)
     rec(
         rec_approx_data_qp,
     )
-    
-    ##encode
-    enc_info_qp = {
-        "cabac_unary_length_minus1" : cabac_unary_length_minus1,
-        "param_opt_flag" : param_opt,
-    }
-    bitstream_qp = nnc_core.coder.encode(enc_info_qp, model_info, approx_data_qp)
-    ##eval
-    acc_qp = model_executer.eval_model(
-        rec_approx_data_qp["parameters"],
-        False,
-    )
-
-    currBSSize = len(bitstream_qp)
-    currAcc = acc_qp[0]
-
-    diffBR = currBSSize - refBSSize
-    diffAcc = refAcc - currAcc
-
-    lambdaM1 = -diffAcc/diffBR 
-
-    end = timer()
-    __print_output_line("DONE in {:.4f} s\n".format( end-start ), verbose=verbose)  
-
 
-    ############################### eval with QP+1
-    start = timer()
-    __print_output_line("\tIOQ: PROCESSING QP+1 FOR ALL TENSORS...", verbose=verbose) 
-
-    approx_info_qp = copy.deepcopy(approx_info)
+    ##encode
+    ndu_sizes = nnc_core.coder.get_ndu_sizes(enc_info, model_info, approx_data_qp)
+    for ndu_params, size in ndu_sizes.items():
+        size_cache[__ndu_size_key(ndu_params, approx_info_qp)] = size
+
+    return approx_data_qp, rec_approx_data_qp["parameters"], ndu_sizes
+
+
+##state of an IOQ worker process, set once by the pool initializer: a replica of the model executer and of the best parameters
+##so far, which are kept up to date from the log of accepted (param, array) changes shared by the pool
+_ioq_model_executer = None
+_ioq_parameters = None
+_ioq_accepted = None
+_ioq_num_applied = 0
+
+def _init_ioq_worker(model_executer, parameters, accepted):
+    global _ioq_model_executer, _ioq_parameters, _ioq_accepted, _ioq_num_applied
+    _ioq_model_executer = model_executer
+    _ioq_parameters = dict(parameters)
+    _ioq_accepted = accepted
+    _ioq_num_applied = 0
+
+def _eval_ioq_candidate(num_accepted, changes):
+    global _ioq_num_applied
+    while _ioq_num_applied < num_accepted:
+        param, value = _ioq_accepted[_ioq_num_applied]
+        _ioq_parameters[param] = value
+        _ioq_num_applied += 1
+    return _ioq_model_executer.eval_model({**_ioq_parameters, **changes}, False)[0]
+
+
+class _IOQEvaluator:
+    ##evaluates IOQ candidates given as the tensors ({param: array}) in which they differ from the best parameters so far.
+    ##With workers > 1 the candidates are evaluated concurrently by a pool of processes, which is started on the first
+    ##evaluation; each worker holds its own replica of model_executer and of the best parameters, so only the changed
+    ##tensors of a candidate and each accepted change are sent to it
+    def __init__(self, model_executer, workers):
+        self.model_executer = model_executer
+        self.workers = workers
+        self.parameters = None
+        self.num_accepted = 0
+        self.manager = None
+        self.pool = None
+
+    def reset(self, parameters):
+        assert self.pool is None, "The parameters of the IOQ workers can only be set before the first evaluation!"
+        self.parameters = dict(parameters)
+
+    def eval(self, candidate_changes):
+        ##returns the accuracies in the order of candidate_changes, so the parallel path makes the same decisions as the serial one
+        if self.workers <= 1:
+            return [self.model_executer.eval_model({**self.parameters, **changes}, False)[0] for changes in candidate_changes]
+        if self.pool is None:
+            self.manager = multiprocessing.Manager()
+            self.accepted = self.manager.list()
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_ioq_worker, initargs=(self.model_executer, self.parameters, self.accepted))
+        return list(self.pool.map(_eval_ioq_candidate, [self.num_accepted] * len(candidate_changes), candidate_changes))
+
+    def accept(self, param, value):
+        self.parameters[param] = value
+        if self.pool is not None:
+            self.accepted.append((param, value))
+            self.num_accepted += 1
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.manager.shutdown()
+            self.pool = None
 
-    for p in approx_info_qp["qp"].keys():
-        if model_info["parameter_type"][p] in nnc_core.nnr_model.W_TYPES:
-            approx_info_qp["qp"][p] += 1
 
-    approx_data_qp = approx(
-        approx_info_qp,
+def inference_based_qp_opt( 
+        approx_info,
         model_info,
+        model_executer,
         approx_data,
         param_opt,
-    )
-    rec_approx_data_qp = copy.deepcopy(approx_data_qp)
-    rec(
-        rec_approx_data_qp,
-    )
-    
-    ##encode
+        cabac_unary_length_minus1,
+        verbose,
+        workers=1,
+    ):
+    ##with workers > 1 the candidates are evaluated concurrently by a pool of processes (see _IOQEvaluator)
+    evaluator = _IOQEvaluator(model_executer, workers)
+    try:
+        return __inference_based_qp_opt(approx_info, model_info, approx_data, param_opt, cabac_unary_length_minus1, verbose, evaluator)
+    finally:
+        evaluator.close()
+
+
+def __inference_based_qp_opt(approx_info, model_info, approx_data, param_opt, cabac_unary_length_minus1, verbose, evaluator):
     enc_info_qp = {
         "cabac_unary_length_minus1" : cabac_unary_length_minus1,
         "param_opt_flag" : param_opt,
     }
-    bitstream_qp = nnc_core.coder.encode(enc_info_qp, model_info, approx_data_qp)
-    ##eval
-    acc_qp = model_executer.eval_model(
-        rec_approx_data_qp["parameters"],
-        False,
-    )
+    ##(NDU params, their QPs) -> NDU size in bytes; the bitstream size of a candidate is the sum of its NDU sizes,
+    ##so only the NDU of the tensor whose QP is varied has to be encoded (the START, MPS and TPL units do not depend on the QPs)
+    size_cache = {}
 
-    currBSSize = len(bitstream_qp)
-    currAcc = acc_qp[0]
+    ############################ eval with QP, QP-1 and QP+1
+    start = timer()
+    __print_output_line("\tIOQ: PROCESSING QP, QP-1 AND QP+1 FOR ALL TENSORS...", verbose=verbose) 
 
-    diffBR = currBSSize - refBSSize
-    diffAcc = refAcc - currAcc
+    bitstream_sizes = []
+    rec_params_qp = []
+    for qp_off in [0, -1, 1]:
+        approx_info_qp = copy.deepcopy(approx_info)
 
-    lambdaP1 = -diffAcc/diffBR
-    
+        for p in approx_info_qp["qp"].keys():
+            if model_info["parameter_type"][p] in nnc_core.nnr_model.W_TYPES:
+                approx_info_qp["qp"][p] += qp_off
+
+        approx_data_qp, rec_params, ndu_sizes = __approx_all_tensors_qp(approx_info_qp, model_info, approx_data, enc_info_qp, size_cache)
+        if qp_off == 0:
+            approx_data_ref, rec_params_ref, ndu_sizes_ref = approx_data_qp, rec_params, ndu_sizes
+        bitstream_sizes.append(sum(ndu_sizes.values()))
+        rec_params_qp.append(rec_params)
+
+    ##the workers start from the parameters at QP, the full parameter sets at QP-1 and QP+1 are only sent once
+    evaluator.reset(rec_params_ref)
+    refAcc, accM1, accP1 = evaluator.eval([{}] + rec_params_qp[1:])
+    del rec_params_qp
+    refBSSize, bsSizeM1, bsSizeP1 = bitstream_sizes
+
+    lambdaM1 = -(refAcc - accM1)/(bsSizeM1 - refBSSize)
+    lambdaP1 = -(refAcc - accP1)/(bsSizeP1 - refBSSize)
+
+    bestCost = 0.0
     end = timer()
-    __print_output_line("DONE in {:.4f} s\n".format( end-start ), verbose=verbose) 
+    __print_output_line("DONE in {:.4f} s\n".format( end-start ), verbose=verbose)  
 
     ################################
 
     ##sort parameters by size
     mapParamToSize = []
     approx_info_qp = copy.deepcopy(approx_info)
-    for p in rec_approx_data_qp["parameters"]:
+    for p in rec_params_ref:
         if model_info["parameter_type"][p] in nnc_core.nnr_model.W_TYPES:
-            mapParamToSize.append([p , np.size(approx_data_qp["parameters"][p])])
+            mapParamToSize.append([p , np.size(approx_data_ref["parameters"][p])])
     
     mapParamToSize.sort(key = lambda x: x[1],reverse=True) 
     
     setNeg = [-4, -3, -2, -1 ]
     setPos = [1, 2, 3, 4 ]
 
-    qpOffsetSet = [setNeg, setPos]
+    qpOffsetSet = setNeg + setPos
 
-    timeLastQp = "n/a"
+    timeLastTensor = "n/a"
+
+    ##the candidates only differ from the best configuration so far in the QP of a single tensor, so all
+    ##candidates of a tensor are independent of each other and are evaluated together
+    approx_data_best = approx_data_ref
+    ndu_sizes_best = dict(ndu_sizes_ref)
+    ndu_of_param = {param: ndu_params for ndu_params in ndu_sizes_ref for param in ndu_params}
 
     for iParam, item in enumerate(mapParamToSize[1::]):
-        for iQpSet, qpSet in enumerate(qpOffsetSet):
-            for iQpOff, qp_off in enumerate(qpSet):
-                __print_output_line("\r\tIOQ: PROCESSING TENSOR {}/{} AND QP {}/{} (LAST QP-ITERATION TOOK: {})".format( iParam+1, len(mapParamToSize)-1, iQpSet*len(qpOffsetSet[0])+ iQpOff + 1, len(qpOffsetSet[0])+len(qpOffsetSet[1]), timeLastQp), verbose=verbose)
-                start = timer()
-                approx_info_qp_curr = copy.deepcopy(approx_info_qp)
-                approx_info_qp_curr["qp"][item[0]] = approx_info["qp"][item[0]] + qp_off
-
-                approx_data_qp = approx(
-                    approx_info_qp_curr,
-                    model_info,
-                    approx_data,
-                    param_opt,
-                )
-                    
-                rec_approx_data_qp = copy.deepcopy(approx_data_qp)
-                rec(
-                    rec_approx_data_qp,
-                )
-                
-                ##encode
-                enc_info_qp = {
-                    "cabac_unary_length_minus1" : cabac_unary_length_minus1,
-                    "param_opt_flag" : param_opt,
-                }
-                
-                bitstream_qp = nnc_core.coder.encode(enc_info_qp, model_info, approx_data_qp)
+        __print_output_line("\r\tIOQ: PROCESSING TENSOR {}/{} ({} QPS, LAST TENSOR TOOK: {})".format( iParam+1, len(mapParamToSize)-1, len(qpOffsetSet), timeLastTensor), verbose=verbose)
+        start = timer()
+        ndu_params = ndu_of_param.get(item[0])
+        candidates = []
+        for qp_off in qpOffsetSet:
+            approx_info_qp_curr = copy.deepcopy(approx_info_qp)
+            approx_info_qp_curr["qp"][item[0]] = approx_info["qp"][item[0]] + qp_off
+
+            approx_data_qp = __requant_param(
+                approx_info_qp_curr,
+                model_info,
+                approx_data,
+                approx_data_best,
+                item[0],
+                enc_info_qp,
+            )
+
+            rec_param_qp = __rec_param_of(
+                approx_data_qp,
+                item[0],
+            )
             
-                ##eval
-                acc_qp = model_executer.eval_model(
-                    rec_approx_data_qp["parameters"],
-                    False,
-                )
-                
-                currBSSize = len(bitstream_qp)
-                currAcc = acc_qp[0]
+            ##encode (only if the NDU of the tensor has not been encoded with these QPs before)
+            if ndu_params is not None:
+                size_key = __ndu_size_key(ndu_params, approx_info_qp_curr)
+                if size_key not in size_cache:
+                    size_cache[size_key] = nnc_core.coder.get_ndu_sizes(enc_info_qp, model_info, approx_data_qp, params=[item[0]])[ndu_params]
+                ndu_size = size_cache[size_key]
+                currBSSize = sum(ndu_sizes_best.values()) - ndu_sizes_best[ndu_params] + ndu_size
+            else:
+                ndu_size = None
+                currBSSize = sum(ndu_sizes_best.values())
 
-                diffBR = currBSSize - refBSSize
-                diffAcc = refAcc - currAcc
+            candidates.append((approx_info_qp_curr, approx_data_qp, rec_param_qp, ndu_size, currBSSize))
 
-                lamb = max( (lambdaP1 + lambdaM1) / 2, 0.0 )
+        ##eval
+        accs = evaluator.eval([{item[0]: rec_param_qp} for _, _, rec_param_qp, _, _ in candidates])
 
-                currCost = diffAcc + lamb * diffBR
+        rec_param_best = None
+        for (approx_info_qp_curr, approx_data_qp, rec_param_qp, ndu_size, currBSSize), currAcc in zip(candidates, accs):
+            diffBR = currBSSize - refBSSize
+            diffAcc = refAcc - currAcc
 
-                if currCost < bestCost:
-                    approx_info_qp = copy.deepcopy(approx_info_qp_curr)
-                    bestCost = currCost
-                
-                end = timer()
-                timeLastQp = "{:.4f} s".format( end-start )
+            lamb = max( (lambdaP1 + lambdaM1) / 2, 0.0 )
+
+            currCost = diffAcc + lamb * diffBR
+
+            if currCost < bestCost:
+                approx_info_qp = copy.deepcopy(approx_info_qp_curr)
+                approx_data_best = approx_data_qp
+                rec_param_best = rec_param_qp
+                if ndu_params is not None:
+                    ndu_sizes_best[ndu_params] = ndu_size
+                bestCost = currCost
+        if rec_param_best is not None:
+            evaluator.accept(item[0], rec_param_best)
+        
+        end = timer()
+        timeLastTensor = "{:.4f} s".format( end-start )
 
     __print_output_line("\n")
     approx_info.clear()
     approx_info.update(approx_info_qp)
 
 
+def __get_rate_distortion_curves(approx_info, approx_data, params, enc_info, max_trial_size, qp_step, num_qps):
+    ##estimated rate (bits) and distortion (SSE) of each param for a grid of QPs, from a subsample of rows
+    qp_density = approx_data["qp_density"]
+    encoder = deepCABAC.Encoder()
+    decoder = deepCABAC.Decoder()
+    general_profile_idc = enc_info.get("general_profile_idc", 0)
+    qps, rates, dists = [], [], []
+    for param in params:
+        values = approx_data["parameters"][param]
+        trial = values.reshape(values.shape[0], -1) if values.ndim > 1 else values.reshape(1, -1)
+        if trial.size > max_trial_size:
+            num_rows = max(max_trial_size // trial.shape[1], 1)
+            trial = trial[np.linspace(0, trial.shape[0] - 1, num_rows).astype(np.int64)]
+        trial = np.ascontiguousarray(trial, dtype=np.float32)
+        scale = values.size / trial.size
+
+        ##the grid starts at the QP whose step size is about the largest magnitude (i.e. almost all values are quantized to zero)
+        qp_max = int(np.ceil(get_qp_from_stepsize(np.max(np.abs(trial)), qp_density)))
+        param_qps, param_rates, param_dists = [], [], []
+        for qp in range(qp_max, qp_max - num_qps * qp_step, -qp_step):
+            quantizedValues = np.zeros(trial.shape, dtype=np.int32)
+            encoder.initCtxModels( approx_info["cabac_unary_length_minus1"], 0 )
+            qp = encoder.quantLayer(
+                trial,
+                quantizedValues,
+                approx_info["dq_flag"][param],
+                qp_density,
+                np.int32(qp),
+                approx_info["lambda_scale"],
+                approx_info["cabac_unary_length_minus1"],
+                0,
+                general_profile_idc
+            )
+            encoder.initCtxModels( approx_info["cabac_unary_length_minus1"]+1, enc_info.get("param_opt_flag", 0) )
+            bits = encoder.estimateLayerBits(quantizedValues, approx_info["dq_flag"][param], 0, general_profile_idc, enc_info.get("parent_node_id_present_flag", 0), 0, np.zeros(trial.shape[0], dtype=np.int32), *HDSP_OPTS_OFF(), 0, 0)
+            recValues = np.zeros(trial.shape, dtype=np.float32)
+            decoder.dequantLayer(recValues, quantizedValues, qp_density, qp, 0)
+            param_qps.append(qp)
+            param_rates.append(bits * scale)
+            param_dists.append(np.sum((recValues.astype(np.float64) - trial) ** 2) * scale)
+        qps.append(param_qps)
+        rates.append(param_rates)
+        dists.append(param_dists)
+    return np.array(qps, dtype=np.int32), np.array(rates), np.array(dists)
+
+
+def __allocate_rate(rates, dists, budget_bits):
+    ##returns the grid index per param minimizing D + lambda * R, with lambda (found by bisection) as small as possible such that
+    ##the rate fits the budget; the remaining budget is then spent greedily on the steps with the best distortion reduction per bit
+    rows = np.arange(rates.shape[0])
+    def select(lamb):
+        return np.argmin(dists + lamb * rates, axis=1)
+    lo, hi = -40.0, 40.0 ##log10 of lambda
+    if rates[rows, select(10.0 ** hi)].sum() > budget_bits:
+        return select(10.0 ** hi)
+    for _ in range(100):
+        mid = (lo + hi) / 2
+        if rates[rows, select(10.0 ** mid)].sum() > budget_bits:
+            lo = mid
+        else:
+            hi = mid
+    selected = select(10.0 ** hi)
+
+    ##distortion reduction per bit and additional rate of switching each param to any grid point
+    remaining = budget_bits - rates[rows, selected].sum()
+    while True:
+        delta_rate = rates - rates[rows, selected][:, None]
+        gain = (dists[rows, selected][:, None] - dists) / np.where(delta_rate > 0, delta_rate, np.inf)
+        gain[(delta_rate <= 0) | (delta_rate > remaining)] = 0
+        best = np.unravel_index(np.argmax(gain), gain.shape)
+        if gain[best] <= 0:
+            return selected
+        remaining -= delta_rate[best]
+        selected[best[0]] = best[1]
+
+
+def target_size_qp_opt(
+        approx_info,
+        model_info,
+        approx_data,
+        enc_info,
+        target_size_bytes,
+        approx_param_base=None,
+        verbose=False,
+        max_trial_size=1 << 14,
+        max_bits=12,
+        max_iterations=8,
+        tolerance=0.001,
+    ):
+    ##sets the QPs of the weight tensors by Lagrangian rate-distortion optimisation such that the bitstream does not exceed
+    ##target_size_bytes, and returns the approximated data. The rate curves are estimated once; the allocation is then
+    ##corrected with the measured bitstream size, which also accounts for the units and tensors with fixed QPs.
+    params = [param for param in approx_info["qp"] if param in approx_data["parameters"] and param not in approx_data["approx_method"]
+              and model_info["parameter_type"][param[:-2] if param not in model_info["parameter_type"] else param] in nnc_core.nnr_model.W_TYPES
+              and approx_data["parameters"][param].dtype == np.float32 and np.any(approx_data["parameters"][param])]
+
+    start = timer()
+    __print_output_line("\tTARGET SIZE: ESTIMATING RATE-DISTORTION CURVES...", verbose=verbose)
+    qp_density = approx_data["qp_density"]
+    qp_step = max((1 << qp_density) >> 2, 1) ##a quarter of an octave of the step size
+    qps, rates, dists = __get_rate_distortion_curves(approx_info, approx_data, params, enc_info, max_trial_size, qp_step, (max_bits << qp_density) // qp_step)
+    end = timer()
+    __print_output_line("DONE in {:.4f} s\n".format( end-start ), verbose=verbose)
+
+    rows = np.arange(len(params))
+    overhead_bits = 0.0
+    approx_data_qp, best = None, None
+    for iteration in range(max_iterations):
+        start = timer()
+        selected = __allocate_rate(rates, dists, target_size_bytes * 8 - overhead_bits)
+        for param, qp in zip(params, qps[rows, selected]):
+            approx_info["qp"][param] = qp
+
+        ##only the tensors whose QP changed are quantized and encoded again
+        if approx_data_qp is None:
+            approx_data_qp = approx(approx_info, model_info, approx_data, enc_info)
+            size_cache = nnc_core.coder.get_ndu_sizes(enc_info, model_info, approx_data_qp, approx_param_base=approx_param_base)
+            num_header_units = 3 if model_info["topology_storage_format"] is not None else 2
+            header_size = sum(len(bs) for bs in itertools.islice(nnc_core.coder.encode_iter(enc_info, model_info, approx_data_qp, approx_param_base), num_header_units))
+        else:
+            changed = [param for param in params if approx_info["qp"][param] != qp_prev[param]]
+            if not changed:
+                break
+            for param in changed:
+                approx_data_qp = __requant_param(approx_info, model_info, approx_data, approx_data_qp, param, enc_info)
+            size_cache.update(nnc_core.coder.get_ndu_sizes(enc_info, model_info, approx_data_qp, params=changed, approx_param_base=approx_param_base))
+        qp_prev = copy.deepcopy(approx_info["qp"])
+        size = header_size + sum(size_cache.values())
+
+        end = timer()
+        __print_output_line("\tTARGET SIZE: ITERATION {}, {} BYTES (TARGET {} BYTES) in {:.4f} s\n".format(iteration+1, size, target_size_bytes, end-start), verbose=verbose)
+
+        if size <= target_size_bytes and (best is None or size > best[0]):
+            best = (size, copy.deepcopy(approx_info["qp"]), approx_data_qp)
+        if size <= target_size_bytes and size >= target_size_bytes * (1 - tolerance):
+            break
+        ##the difference between the measured and the estimated rate is carried over to the next allocation
+        overhead_bits = size * 8 - rates[rows, selected].sum()
+
+    if best is None:
+        print("INFO: Target size of {} bytes not reached, the bitstream has {} bytes!".format(target_size_bytes, size))
+        return approx_data_qp
+
+    approx_info["qp"].update(best[1])
+    return best[2]
+
+
 def run_ft_and_lsa(model_info, approx_data, ap_info, model_executer, block_id_and_param_type, lsa_flag, ft_flag, use_dq, verbose, wandb_logging):
     approx_info_ft = copy.deepcopy(ap_info.approx_info)
     if not lsa_flag:
@@ -503,7 +704,7 @@ def run_ft_and_lsa(model_info, approx_data, ap_info, model_executer, block_id_an
         ap_info.set_ls_qps(model_info, approx_data, 1 if use_dq else 0)
 
 
-def approx(approx_info, model_info, approx_data, enc_info=None):
+def approx(approx_info, model_info, approx_data, enc_info=None, cache=None, fused=False):
 
     approx_method = approx_info['approx_method']
     
@@ -512,20 +713,23 @@ def approx(approx_info, model_info, approx_data, enc_info=None):
     if approx_method == 'codebook':
         approx_data, approx_info = codebook.approx(approx_info, model_info, approx_data, enc_info=enc_info)
 
-    return baseline.approx(approx_info, model_info, approx_data, enc_info=enc_info)
+    return baseline.approx(approx_info, model_info, approx_data, enc_info=enc_info, cache=cache, fused=fused)
     
 
+def rec_param(param, approx_data):
+    if param in approx_data["approx_method"]:
+        if approx_data["approx_method"][param] == 'uniform':
+            baseline.rec(param, approx_data)
+        elif approx_data["approx_method"][param] == 'codebook':
+            codebook.rec(param, approx_data)
+        elif approx_data["approx_method"][param] == 'skip':
+            integer.skip_rec(param, approx_data)
+        else:
+            assert param not in approx_data["approx_method"], "unknown approx_method"
+
 def rec(approx_data):
     for param in approx_data['parameters']:
-        if param in approx_data["approx_method"]:
-            if approx_data["approx_method"][param] == 'uniform':
-                baseline.rec(param, approx_data)
-            elif approx_data["approx_method"][param] == 'codebook':
-                codebook.rec(param, approx_data)
-            elif approx_data["approx_method"][param] == 'skip':
-                integer.skip_rec(param, approx_data)
-            else:
-                assert param not in approx_data["approx_method"], "unknown approx_method"
+        rec_param(param, approx_data)
 
 def check_array_all_zero_or_scalar(x):
     if np.isscalar(x):
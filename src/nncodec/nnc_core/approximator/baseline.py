@@ -41,33 +41,59 @@ import copy
 import numpy as np
 from nncodec.extensions import deepCABAC
 from nncodec.nnc_core.nnr_model import NNRModelAccess, W_TYPES
+from nncodec.nnc_core.common import to_float32
 
-def approx(approx_info, model_info, approx_data_in, enc_info=None):
+def approx(approx_info, model_info, approx_data_in, enc_info=None, cache=None, fused=False):
+    ##with fused, tensors are only marked for quantization; they are quantized by the encoder (see coder.baseline.encode)
+    ##so that the quantized tensors are never held in approx_data
     approx_data_out = {k: copy.copy(v) for k, v in approx_data_in.items()} # create copies of dicts in approx_data
+    fused = fused and "integer_aligned_bitdepth" not in approx_info
+    if fused:
+        approx_data_out["quantize_on_encode"] = copy.copy(approx_data_in.get("quantize_on_encode", {}))
     encoder = deepCABAC.Encoder()
     model_access = NNRModelAccess(model_info)
     for block_or_param in model_access.blocks_and_params():
         for par_type, param, _ in block_or_param.param_generator(approx_data_in["compressed_parameter_types"]):
             if (par_type in approx_info["to_approximate"]) and (param not in approx_data_in["approx_method"]):
-                # !!! There seems to be a pybind11 issue when using np.zeros_like for "values" that have been transposed.
-                # !!! It seems that sometimes, encoder.quantLayer returns only zeros for quantizedValues. Needs further study.
-                # !!! For now, using np.zeros instead of np.zeros_like seems to be a workaround.           
-                quantizedValues = np.zeros(approx_data_in["parameters"][param].shape, dtype=np.int32)
-                encoder.initCtxModels( approx_info["cabac_unary_length_minus1"], 0 )
-
                 enc_qp = approx_info['qp'][param]
+                general_profile_idc = enc_info.get("general_profile_idc", 0) if enc_info else 0
 
-                qp = encoder.quantLayer(
-                    approx_data_in["parameters"][param],
-                    quantizedValues,
-                    approx_info['dq_flag'][param],
-                    approx_data_out['qp_density'],
-                    enc_qp,
-                    approx_info["lambda_scale"],
-                    approx_info["cabac_unary_length_minus1"],
-                    approx_data_in["scan_order"].get(param, 0),
-                    enc_info.get("general_profile_idc", 0) if enc_info else 0
-                )
+                if fused:
+                    approx_data_out['qp'][param] = enc_qp
+                    approx_data_out['approx_method'][param] = 'uniform'
+                    approx_data_out['dq_flag'][param] = approx_info['dq_flag'][param]
+                    approx_data_out['quantize_on_encode'][param] = (approx_info["lambda_scale"], approx_info["cabac_unary_length_minus1"])
+                    continue
+
+                ##identical tensors quantized with identical settings are taken from the cache
+                cached = None
+                if cache is not None:
+                    cache_key = cache.key("quantLayer", approx_data_in["parameters"][param], approx_info['dq_flag'][param], approx_data_out['qp_density'], enc_qp,
+                                          approx_info["lambda_scale"], approx_info["cabac_unary_length_minus1"], approx_data_in["scan_order"].get(param, 0), general_profile_idc)
+                    cached = cache.get(cache_key)
+                if cached is not None:
+                    quantizedValues, qp = cached
+                else:
+                    # !!! There seems to be a pybind11 issue when using np.zeros_like for "values" that have been transposed.
+                    # !!! It seems that sometimes, encoder.quantLayer returns only zeros for quantizedValues. Needs further study.
+                    # !!! For now, using np.zeros instead of np.zeros_like seems to be a workaround.           
+                    quantizedValues = np.zeros(approx_data_in["parameters"][param].shape, dtype=np.int32)
+                    encoder.initCtxModels( approx_info["cabac_unary_length_minus1"], 0 )
+
+                    qp = encoder.quantLayer(
+                        to_float32(approx_data_in["parameters"][param]),
+                        quantizedValues,
+                        approx_info['dq_flag'][param],
+                        approx_data_out['qp_density'],
+                        enc_qp,
+                        approx_info["lambda_scale"],
+                        approx_info["cabac_unary_length_minus1"],
+                        approx_data_in["scan_order"].get(param, 0),
+                        general_profile_idc
+                    )
+                    if cache is not None:
+                        quantizedValues.flags.writeable = False
+                        cache.put(cache_key, (quantizedValues, qp), quantizedValues.nbytes)
 
                 if qp != enc_qp:
                     print("INFO: QP for {} has been clipped from {} to {} to avoid int32_t overflow!".format(param, approx_info['qp'][param],qp))
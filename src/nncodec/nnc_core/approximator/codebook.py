@@ -41,7 +41,6 @@ import numpy as np
 import copy
 from nncodec.nnc_core import common
 from nncodec.extensions import deepCABAC
-from nncodec.nnc_core.coder import hls
 from nncodec.nnc_core.nnr_model import NNRModelAccess, W_TYPES
 from nncodec.nnc_core.hdsp.hdsp_tool import HDSP_OPTS_OFF
 
@@ -52,59 +51,111 @@ def derive_sorted_codebook_from_tensor(tensor):
     reshaped_indices = indices.reshape( originalShape )
     return codebook, reshaped_indices.astype('int32')
 
-def get_codebook_offset( codebook, indices, cabac_unary_length_minus1 ):
+def __binary_entropy_bits(num_ones, num_total):
+    ##rate of num_total bins with num_ones ones under an ideally adapted context, whose probability estimate
+    ##is bounded like the one of the CABAC context models (at least 310 / 2^15 bits per bin)
+    min_prob = 1 - 2 ** (-310 / 2 ** 15)
+    num_ones = np.asarray(num_ones, dtype=np.float64)
+    num_total = np.asarray(num_total, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = num_ones / num_total
+    p = np.nan_to_num(p)
+    p_model = np.clip(p, min_prob, 1 - min_prob)
+    return -num_total * (p * np.log2(p_model) + (1 - p) * np.log2(1 - p_model))
+
+def get_codebook_offset_rates( hist, num_gtx_flags ):
+    ##approximate rate in bits of the codebook indices for every zero offset, derived from the index histogram:
+    ##each context coded flag is charged its empirical entropy, as an ideally adapted context would
+    num_total = hist.sum()
+    positions = np.arange(len(hist))
+    rates = np.zeros(len(hist))
+    for cb in range(len(hist)):
+        num_sig = num_total - hist[cb]
+        num_neg = hist[:cb].sum()
+        rate = __binary_entropy_bits(num_sig, num_total) + __binary_entropy_bits(num_neg, num_sig)
+        ##greater flags use separate contexts for negative and positive values
+        for side in (slice(None, cb), slice(cb+1, None)):
+            abs_values = np.abs(positions[side] - cb)
+            num_greater = [hist[side][abs_values > k].sum() for k in range(num_gtx_flags + 1)]
+            rate += __binary_entropy_bits(num_greater[1:], num_greater[:-1]).sum()
+        ##remainder: unary prefix with one context per bin, followed by as many bypass bins as prefix ones
+        abs_values = np.abs(positions - cb)
+        has_rem = abs_values > num_gtx_flags
+        num_ones = np.floor(np.log2(abs_values[has_rem] - num_gtx_flags)).astype(np.int64)
+        ones_hist = np.bincount(num_ones, weights=hist[has_rem]) if num_ones.size else np.zeros(1)
+        num_coded = np.cumsum(ones_hist[::-1])[::-1]
+        rate += __binary_entropy_bits(num_coded[1:], num_coded[:-1]).sum() + np.dot(np.arange(len(ones_hist)), ones_hist)
+        rates[cb] = rate
+    return rates
+
+def __get_trial_indices( indices, max_trial_size ):
+    ##subsample whole rows, so that the neighbourhood of the context modelling is preserved
+    rows = indices.reshape(indices.shape[0], -1) if indices.ndim > 1 else indices.reshape(1, -1)
+    step = -(-rows.size // max_trial_size)
+    if step <= 1:
+        return indices
+    if rows.shape[0] >= step:
+        return np.ascontiguousarray(rows[::step])
+    return np.ascontiguousarray(rows.reshape(-1)[:max_trial_size])
+
+def get_codebook_offset( codebook, indices, cabac_unary_length_minus1, num_candidates=3, max_trial_size=1<<16, exhaustive=True ):
+    ##by default, the rate of every offset is estimated on the whole tensor; exhaustive=False opts in to the faster
+    ##histogram-based search, which may select a slightly worse offset
     codebookOffset = 0
     if indices.dtype == np.int32:
+        if exhaustive:
+            candidates = range( len( codebook ) )
+            trial_indices = indices
+        else:
+            ##only the offsets with the lowest histogram-based rate are estimated on a subsample of the tensor
+            hist = np.bincount( indices.reshape(-1), minlength=len( codebook ) )
+            rates = get_codebook_offset_rates( hist, cabac_unary_length_minus1 )
+            candidates = np.argsort( rates, kind="stable" )[:num_candidates]
+            trial_indices = __get_trial_indices( indices, max_trial_size )
+
         codebookOffset = -1
         minBits = None
-        for cb in range( len( codebook ) ):
-            encoder = deepCABAC.Encoder()
-            encoder.initCtxModels( cabac_unary_length_minus1, 1 )
-            indexes = indices - cb
-            hdsp_opts = HDSP_OPTS_OFF()
-            encoder.encodeLayer(indexes, 0, 0, 0, 0, 0, np.zeros(indexes.shape[0], dtype=np.int32), *hdsp_opts, 0, 0)
-            bits = len( encoder.finish().tobytes() )
+        encoder = deepCABAC.Encoder()
+        encoder.initCtxModels( cabac_unary_length_minus1, 1 )
+        hdsp_opts = HDSP_OPTS_OFF()
+        for cb in candidates:
+            indexes = trial_indices - cb
+            bits = encoder.estimateLayerBits(indexes, 0, 0, 0, 0, 0, np.zeros(indexes.shape[0], dtype=np.int32), *hdsp_opts, 0, 0)
             if minBits == None or bits < minBits:
                 minBits = bits
-                codebookOffset = cb
+                codebookOffset = int(cb)
 
     indexes = indices - codebookOffset
 
     return codebook, indexes, codebookOffset
 
+def get_ue_bits(k, x):
+    ##length of the k-th order Exp-Golomb codes ue(k) of the non-negative integers x
+    x = np.asarray(x, dtype=np.int64)
+    k = np.asarray(k, dtype=np.int64)
+    _, bit_length = np.frexp((x + (1 << k)).astype(np.float64))
+    return 2 * bit_length.astype(np.int64) - k - 1
+
+def get_ie_bits(k, x):
+    x = np.asarray(x, dtype=np.int64)
+    return get_ue_bits(k, np.where(x <= 0, -2 * x, 2 * x - 1))
+
+def get_codebook_bits(codebook, codebookOffset):
+    ##bits of the codebook syntax for all codebook_egk values 0..15 at once: the deltas between neighbouring
+    ##codebook entries, signalled outwards from the zero offset, plus the egk-independent fields
+    codebook = np.asarray(codebook, dtype=np.int64)
+    deltas = np.diff(codebook) - 1
+    delta_bits = get_ue_bits(np.arange(16)[:, None], deltas[None, :]).sum(axis=1)
+    header_bits = 4 + get_ue_bits(2, len(codebook)) + get_ie_bits(2, codebookOffset - (len(codebook) >> 1)) + get_ie_bits(7, codebook[codebookOffset])
+    return delta_bits + header_bits
+
 def get_best_egk(codebook, codebookOffset):
-    cb_hls = {}
-    cb_hls["CbZeroOffset__"] = codebookOffset
-    cb_hls["codebook_size__"] = len( codebook )
-    cb_hls["codebook__"] = codebook
-
-    min_bytes_cb = None
-    for i in range(16):
-        cb_hls["codebook_egk__"] = i
-        bs = bytearray()
-        w = hls.BitWriter(bs)
-        hls_enc = hls.Coder( w, cb_hls )
-        hls_enc.codebook("")
-        bytes_cb = w.getNumBitsTouched()
-        if min_bytes_cb is None or bytes_cb < min_bytes_cb:
-            min_bytes_cb = bytes_cb
-            best_egk = i
-    return best_egk, min_bytes_cb
+    bits_cb = get_codebook_bits(codebook, codebookOffset)
+    best_egk = int(np.argmin(bits_cb))
+    return best_egk, int(bits_cb[best_egk])
 
 def get_codebook_bytes(codebook, codebookOffset, cbEgk):
-    cb_hls = {}
-    cb_hls["CbZeroOffset__"] = codebookOffset
-    cb_hls["codebook_size__"] = len( codebook )
-    cb_hls["codebook__"] = codebook
-    cb_hls["codebook_egk__"] = cbEgk
-    
-    bs = bytearray()
-    w = hls.BitWriter(bs)
-    hls_enc = hls.Coder( w, cb_hls )
-    hls_enc.codebook("")
-    bytes_cb = w.getNumBitsTouched()
-   
-    return bytes_cb
+    return int(get_codebook_bits(codebook, codebookOffset)[cbEgk])
 
 def check_array_all_zero_or_scalar(x):
     if np.isscalar(x):
@@ -205,25 +256,21 @@ def approx(approx_info, model_info, approx_data_in, enc_info):
                     testEnc = deepCABAC.Encoder()
                     testEnc.initCtxModels( approx_info["cabac_unary_length_minus1"], enc_info.get("param_opt_flag", 0) if enc_info else 0 )
                     hdsp_opts = HDSP_OPTS_OFF()
-                    testEnc.encodeLayer(quantizedValues, approx_info['dq_flag'][param], approx_data_in["scan_order"].get(param, 0),
-                                        enc_info.get("general_profile_idc", 0) if enc_info else 0,
-                                        enc_info.get('parent_node_id_present_flag', 0) if enc_info else 0,
-                                        0, np.zeros(quantizedValues.shape[0], dtype=np.int32), *hdsp_opts, 0, 0
-                                        )
-                    bs_par = bytearray( testEnc.finish().tobytes() )
-
-                    bytesUni = len(bs_par)
+                    bitsUni = testEnc.estimateLayerBits(quantizedValues, approx_info['dq_flag'][param], approx_data_in["scan_order"].get(param, 0),
+                                                        enc_info.get("general_profile_idc", 0) if enc_info else 0,
+                                                        enc_info.get('parent_node_id_present_flag', 0) if enc_info else 0,
+                                                        0, np.zeros(quantizedValues.shape[0], dtype=np.int32), *hdsp_opts, 0, 0
+                                                        )
+
+                    bytesUni = int(np.ceil(bitsUni / 8))
                     ##Compute cost for codebook quantized parameters + bytes for encoding the codebooks
-                    testEnc = deepCABAC.Encoder()
-                    testEnc.initCtxModels( approx_info["cabac_unary_length_minus1"], enc_info.get("param_opt_flag", 0) if enc_info else 0 )
-                    testEnc.encodeLayer(indexes, 0, approx_data_in["scan_order"].get(param, 0),
-                                        enc_info.get("general_profile_idc", 0) if enc_info else 0,
-                                        enc_info.get('parent_node_id_present_flag', 0) if enc_info else 0,
-                                        0, np.zeros(quantizedValues.shape[0], dtype=np.int32), *hdsp_opts, 0, 0
-                                        )
-                    bs_par_cb = bytearray( testEnc.finish().tobytes() )
-
-                    bytesCb = len(bs_par_cb) + get_codebook_bytes(codebook, codebookOffset, egk)
+                    bitsCb = testEnc.estimateLayerBits(indexes, 0, approx_data_in["scan_order"].get(param, 0),
+                                                       enc_info.get("general_profile_idc", 0) if enc_info else 0,
+                                                       enc_info.get('parent_node_id_present_flag', 0) if enc_info else 0,
+                                                       0, np.zeros(quantizedValues.shape[0], dtype=np.int32), *hdsp_opts, 0, 0
+                                                       )
+
+                    bytesCb = int(np.ceil((bitsCb + get_codebook_bytes(codebook, codebookOffset, egk)) / 8))
 
                     ##select cheapest
                     if bytesCb < bytesUni:
@@ -0,0 +1,107 @@
+'''
+The copyright in this software is being made available under the Clear BSD
+License, included below. No patent rights, trademark rights and/or
+other Intellectual Property Rights other than the copyrights concerning
+the Software are granted under this license.
+
+The Clear BSD License
+
+Copyright (c) 2019-2025, Fraunhofer-Gesellschaft zur Förderung der angewandten Forschung e.V. & The NNCodec Authors.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification,
+are permitted (subject to the limitations in the disclaimer below) provided that
+the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+     this list of conditions and the following disclaimer.
+
+     * Redistributions in binary form must reproduce the above copyright
+     notice, this list of conditions and the following disclaimer in the
+     documentation and/or other materials provided with the distribution.
+
+     * Neither the name of the copyright holder nor the names of its
+     contributors may be used to endorse or promote products derived from this
+     software without specific prior written permission.
+
+NO EXPRESS OR IMPLIED LICENSES TO ANY PARTY'S PATENT RIGHTS ARE GRANTED BY
+THIS LICENSE. THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND
+CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+'''
+
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class QuantizationCache():
+    ##content-addressed LRU cache for quantized tensors and encoded NDU payloads, keyed by a hash of the tensor bytes and
+    ##all settings that affect the result; the total size of the cached arrays and payloads is bounded by max_bytes
+    def __init__(self, max_bytes=1 << 30):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        self.__num_bytes = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def num_bytes(self):
+        return self.__num_bytes
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @staticmethod
+    def key(*items):
+        hasher = hashlib.blake2b(digest_size=20)
+        def update(item):
+            if isinstance(item, np.ndarray):
+                hasher.update("ndarray{}{}".format(item.dtype.str, item.shape).encode())
+                hasher.update(np.ascontiguousarray(item).reshape(-1).view(np.uint8))
+            elif isinstance(item, (list, tuple)):
+                hasher.update("seq{}".format(len(item)).encode())
+                for x in item:
+                    update(x)
+            else:
+                hasher.update(repr(item).encode())
+        update(items)
+        return hasher.digest()
+
+    def get(self, key):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, num_bytes):
+        ##the least recently used entries are evicted until the cache fits into max_bytes again
+        if num_bytes > self.max_bytes:
+            return
+        with self.__lock:
+            if key in self.__entries:
+                self.__num_bytes -= self.__entries.pop(key)[1]
+            self.__entries[key] = (value, num_bytes)
+            self.__num_bytes += num_bytes
+            while self.__num_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self.__entries.popitem(last=False)
+                self.__num_bytes -= evicted_bytes
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__num_bytes = 0
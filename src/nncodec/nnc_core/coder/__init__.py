@@ -40,6 +40,9 @@ POSSIBILITY OF SUCH DAMAGE.
 
 import numpy as np
 import copy
+import mmap
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from . import syntax_compiler, baseline
 from nncodec.nnc_core import hls
 from nncodec.nnc_core import nnr_model
@@ -211,10 +214,139 @@ def __get_topology_elem_id_order(compressed_parameter_types): ## the FDIS specif
     return id_list
 
     
-def encode(enc_info, model_info, approx_data, approx_param_base=None, tool_if=None):
+def __ordered_map(func, items, num_threads):
+    ##yields (item, func(item)) in the order of items; with num_threads > 1 up to 2*num_threads items are evaluated ahead on a thread pool
+    if num_threads <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append((item, executor.submit(func, item)))
+                if len(pending) > 2 * num_threads:
+                    item, future = pending.popleft()
+                    yield item, future.result()
+            while pending:
+                item, future = pending.popleft()
+                yield item, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def __encode_ndu_payload(enc_info, approx_data, approx_param_base, ndu, params, mps, lps, tool_if, cache=None, reconstruction=None):
+    num_coded_params = 0
+    if enc_info.get("general_profile_idc",0) == 0 or not tool_if or not tool_if.hdsp_enabled:
+        tool_if = []
+
+    ##without HDSP and temporal context the payload only depends on the NDU header fields, the qp offsets and the quantized tensors,
+    ##so an identical NDU is taken from the cache (unless reconstructions are requested, which are only produced by encoding)
+    cache_key = None
+    if cache is not None and not tool_if and not approx_param_base and reconstruction is None:
+        cache_key = cache.key("ndu_payload",
+                              ndu["nnr_compressed_data_unit_payload_type"],
+                              ndu["cabac_unary_length_minus1"],
+                              ndu.get("scan_order", 0),
+                              ndu.get("parent_node_id_present_flag", 0),
+                              lps.get("lps_quantization_parameter") if lps is not None else mps.get("mps_quantization_parameter"),
+                              lps.get("lps_qp_density") if lps is not None else mps.get("mps_qp_density"),
+                              enc_info.get("general_profile_idc", 0),
+                              enc_info["param_opt_flag"],
+                              enc_info.get("row_skip_enabled_flag", 0),
+                              [(param in approx_data["approx_method"], approx_data["approx_method"].get(param), approx_data["qp"].get(param), approx_data["dq_flag"].get(param),
+                                approx_data["codebooks"].get(param), approx_data["codebook_zero_offsets"].get(param), approx_data.get("quantize_on_encode", {}).get(param),
+                                approx_data["parameters"][param]) for param in params])
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    mode = 0
+    if tool_if and tool_if.get_num_modes(params) > 1:
+        ##the HDSP modes are compared by their estimated rate, only the best one is encoded
+        mode_bits = []
+        for mode_idx in range(tool_if.get_num_modes(params)):
+            estimator = deepCABAC.Encoder()
+            mode_bits.append(sum(baseline.estimate_bits(
+                                    estimator,
+                                    approx_data,
+                                    approx_param_base if approx_param_base else None,
+                                    param,
+                                    ndu,
+                                    enc_info.get('general_profile_idc', 0),
+                                    enc_info['param_opt_flag'],
+                                    enc_info.get( 'row_skip_enabled_flag', 0 ),
+                                    tool_if,
+                                    mode_idx)
+                                 for param in params if param in approx_data['approx_method']))
+        mode = tool_if.set_best_mode(params, mode_bits)
+
+    encoder = deepCABAC.Encoder()
+    for param in params:
+        if param in approx_data['approx_method']:
+            baseline.encode(
+                encoder,
+                approx_data,
+                approx_param_base if approx_param_base else None,
+                param,
+                ndu,
+                mps,
+                enc_info.get('general_profile_idc', 0),
+                enc_info['param_opt_flag'],
+                enc_info.get( 'row_skip_enabled_flag', 0 ),
+                tool_if,
+                mode,
+                lps,
+                reconstruction)
+            num_coded_params += 1
+
+    bs_par = encoder.finish()
+    epList = encoder.getEntryPoints()
+
+    if cache_key is not None:
+        cache.put(cache_key, (bs_par, epList, num_coded_params), len(bs_par))
+
+    return bs_par, epList, num_coded_params
+
+
+def unit_writer(sink):
+    ##returns a function writing one NNR unit to the sink, which may be a callable, a file-like object or a socket-like object
+    if hasattr(sink, "write"):
+        return sink.write
+    elif hasattr(sink, "sendall"):
+        return sink.sendall
+    assert callable(sink), "sink must be callable or provide write() or sendall()"
+    return sink
+
+
+def encode(enc_info, model_info, approx_data, approx_param_base=None, tool_if=None, encode_threads=1, sink=None, cache=None, reconstruction=None):
+    ##with a sink, each NNR unit is written as soon as it is finished and no bitstream is returned
+    oob_dict = {}
+    units = encode_iter(enc_info, model_info, approx_data, approx_param_base, tool_if, encode_threads, oob_dict, cache, reconstruction)
+    if sink is not None:
+        write = unit_writer(sink)
+        for bs_unit in units:
+            write(bs_unit)
+        return None, oob_dict
+
+    bs = bytearray()
+    for bs_unit in units:
+        bs.extend(bs_unit)
+    return bs, oob_dict
+
+
+def encode_iter(enc_info, model_info, approx_data, approx_param_base=None, tool_if=None, encode_threads=1, oob_dict=None, cache=None, reconstruction=None):
+    ##yields the NNR units one by one, oob_dict (if given) is filled with the out-of-band information of the NDUs;
+    ##reconstruction (if given) is filled with the dequantized tensors of the parameters quantized on encode
+    if oob_dict is None:
+        oob_dict = {}
+
     ndu_start = syntax_compiler.compile_start_unit(enc_info.get("general_profile_idc", 0))
     bs = hls.encode_nnr_unit_with_size_dummy(ndu_start)
     bs, _ = hls.update_nnr_unit_size(bs)
+    yield bs
     mps = syntax_compiler.compile_mps(approx_data,
                                        "topology_storage_format" in model_info,
                                        enc_info.get("general_profile_idc", 0),
@@ -223,21 +355,23 @@ def encode(enc_info, model_info, approx_data, approx_param_base=None, tool_if=No
     lps = None
     bs_mps = hls.encode_nnr_unit_with_size_dummy( mps )
     bs_mps, _ = hls.update_nnr_unit_size( bs_mps )
-    bs.extend(bs_mps)
+    yield bs_mps
 
 
     if model_info["topology_storage_format"] is not None:
         tpl = syntax_compiler.compile_tpl( model_info )
         bs_tpl = hls.encode_nnr_unit_with_size_dummy( tpl )
         bs_tpl, _ = hls.update_nnr_unit_size( bs_tpl )
-        bs.extend(bs_tpl)
+        yield bs_tpl
+
+    for _, bs_ndu in __encode_ndu_units(enc_info, model_info, approx_data, approx_param_base, tool_if, encode_threads, oob_dict, mps, lps, cache=cache, reconstruction=reconstruction):
+        yield bs_ndu
 
-    oob_dict = {}
 
+def __ndu_jobs(enc_info, model_info, approx_data, approx_param_base, tool_if, mps, oob_dict, only_params=None):
     for ndu, params in ndu_enc_generator(enc_info, model_info, approx_data, approx_param_base if approx_param_base else None, approx_param_base["put_node_depth"] if approx_param_base else None):
-        if enc_info.get("general_profile_idc",0) == 0 or not tool_if or not tool_if.hdsp_enabled:
-            encoder = deepCABAC.Encoder()
-        num_coded_params = 0
+        if only_params is not None and only_params.isdisjoint(params):
+            continue
 
         if mps.get("general_profile_idc", 0) and mps.get("mps_parent_signalling_enabled_flag", 0):
             skipped_ndu = True
@@ -268,85 +402,38 @@ def encode(enc_info, model_info, approx_data, approx_param_base=None, tool_if=No
                             if param not in oob_dict:
                                 oob_dict[param] = {}
                             oob_dict[param].update({ "cabac_unary_length_minus1" : enc_info["cabac_unary_length_minus1"] })
-                    if param in approx_data['approx_method']:
-                        baseline.encode(
-                            encoder,
-                            approx_data,
-                            approx_param_base if approx_param_base else None,
-                            param,
-                            ndu,
-                            mps,
-                            enc_info.get('general_profile_idc', 0),
-                            enc_info['param_opt_flag'],
-                            enc_info.get( 'row_skip_enabled_flag', 0 ),
-                            [],
-                            0,
-                            lps)
-                        num_coded_params += 1
-
-                bs_par = bytearray( encoder.finish().tobytes() )
-            else:
-                num_modes = tool_if.get_num_modes(params)
-                encoders = [deepCABAC.Encoder() for x in range(num_modes)]
-                for mode_idx, cur_encoder in enumerate(encoders):
-                    for param in params:
-                        if param in approx_data['approx_method']:
-                            baseline.encode(
-                                cur_encoder,
-                                approx_data,
-                                approx_param_base if approx_param_base else None,
-                                param,
-                                ndu,
-                                mps,
-                                enc_info.get('general_profile_idc', 0),
-                                enc_info['param_opt_flag'],
-                                enc_info.get( 'row_skip_enabled_flag', 0 ),
-                                tool_if,
-                                mode_idx,
-                                lps
-                                )
-                            if mode_idx == (num_modes-1):
-                               num_coded_params += 1
-
-                bit_streams = [ bytearray( cur_enc.finish().tobytes()) for cur_enc in encoders ]
-
-                if num_modes > 1:
-                    bs_par = tool_if.get_best_bit_stream_and_set_mode( params, bit_streams )
-                else:
-                    bs_par           = bit_streams[0]
+            yield ndu, params
 
 
-            decoder = deepCABAC.Decoder()
-            decoder.setStream( bs_par )
-            approx_data_ep = copy.deepcopy( approx_data )
+def __encode_ndu_units(enc_info, model_info, approx_data, approx_param_base, tool_if, encode_threads, oob_dict, mps, lps, only_params=None, cache=None, reconstruction=None):
+    ##yields (params, bs_ndu) for the NDUs (only for those containing one of only_params, if given)
 
-            epList = np.array([], dtype=np.uint64)
+    def encode_job(job):
+        ndu, params = job
+        return __encode_ndu_payload(enc_info, approx_data, approx_param_base, ndu, params, mps, lps, tool_if, cache, reconstruction)
 
-            for param in params:
-                if param in approx_data_ep['approx_method']:
-                    approx_data_ep["parameters"][param] =  np.zeros_like(approx_data["parameters"][param], dtype=np.int32)
-                    epListPart = baseline.decodeAndCreateEPs(
-                        decoder,
-                        approx_data_ep,
-                        approx_param_base if approx_param_base else None,
-                        param,
-                        ndu,
-                        mps,
-                        ndu_start,
-                        tool_if,
-                        lps
-                        )
-                    if epListPart.size > 0:
-                        epList = np.concatenate([epList, epListPart])
-
-            ndu = syntax_compiler.compile_ndu_eps( ndu, epList )
-
-            bs_ndu = hls.encode_nnr_unit_with_size_dummy(ndu)
-            if num_coded_params > 0:
-                bs_ndu.extend( bs_par )
-            bs_ndu, _ = hls.update_nnr_unit_size(bs_ndu)
-            bs.extend( bs_ndu )
-    return bs, oob_dict
+    ##NDUs are independently decodable, so their payloads may be encoded concurrently (deepCABAC releases the GIL);
+    ##units are still emitted in generator order, yielding the same bitstream as the serial path
+    for (ndu, params), (bs_par, epList, num_coded_params) in __ordered_map(encode_job, __ndu_jobs(enc_info, model_info, approx_data, approx_param_base, tool_if, mps, oob_dict, only_params), encode_threads):
+        ndu = syntax_compiler.compile_ndu_eps( ndu, epList )
+
+        bs_ndu = hls.encode_nnr_unit_with_size_dummy(ndu)
+        if num_coded_params > 0:
+            bs_ndu.extend( bs_par )
+        bs_ndu, _ = hls.update_nnr_unit_size(bs_ndu)
+        yield params, bs_ndu
+
+
+def get_ndu_sizes(enc_info, model_info, approx_data, params=None, approx_param_base=None, tool_if=None, encode_threads=1):
+    ##returns {tuple of the params of an NDU : size of the NDU in bytes}; with params given, only the NDUs
+    ##containing at least one of them are encoded (the START, MPS and TPL units are not included)
+    mps = syntax_compiler.compile_mps(approx_data,
+                                       "topology_storage_format" in model_info,
+                                       enc_info.get("general_profile_idc", 0),
+                                       enc_info.get("mps_parent_signalling_enabled_flag", 0)
+                                      )
+    only_params = set(params) if params is not None else None
+    return {tuple(ndu_params): len(bs_ndu) for ndu_params, bs_ndu in __encode_ndu_units(enc_info, model_info, approx_data, approx_param_base, tool_if, encode_threads, {}, mps, None, only_params)}
 
 
 def __decode_nnr_start_unit(nnr_gen, ndu_start, hls_stats = {}):
@@ -400,9 +487,66 @@ def __decode_nnr_tpl_unit(nnr_gen, reader, ndu_tpl, mps, model_info, hls_stats={
 def __decode_nnr_qnt_unit():
     pass
 
+def __update_base_param(approx_param_base, param, value, ndu):
+    if param not in approx_param_base["put_node_depth"]:
+        approx_param_base["put_node_depth"][
+            param] = 1  # The first node is already the first child node as the base model is the root node
+    else:
+        approx_param_base["put_node_depth"][param] += 1
+    if not approx_param_base["device_id"]:
+        approx_param_base["device_id"] = ndu["device_id"]
+    else:
+        assert approx_param_base["device_id"] == ndu["device_id"], "Unexpected device_id!"
+    if param not in approx_param_base["parameter_id"]:
+        approx_param_base["parameter_id"][param] = ndu["parameter_id"]
+    else:
+        assert approx_param_base["parameter_id"][param] == ndu["parameter_id"], "Unexpected parameter_id!"
+    approx_param_base["parameters"][param] = value
+
+
+def __decode_ndu_payload(bitstream, payload_offset, payload_params, ndu, mps, lps, ndu_start, approx_data, approx_param_base, update_base_param, tool_if, decode_threads=1, rec_func=None, base_updates=None):
+    ##with base_updates (a list), the updates of approx_param_base are appended to it as (param, value, ndu) instead of being applied
+    decoder = deepCABAC.Decoder()
+    decoder.setNumThreads(decode_threads)
+    decoder.setStream(bitstream, payload_offset)
+    for param, entryPoints in payload_params:
+        if entryPoints is not None:
+            decoder.setEntryPoints( entryPoints )
+        baseline.decode(
+            decoder,
+            approx_data,
+            approx_param_base if approx_param_base else None,
+            param,
+            ndu,
+            mps,
+            ndu_start,
+            tool_if,
+            lps
+        )
+        if approx_param_base is not None and update_base_param:
+            value = copy.deepcopy(approx_data["parameters"][param])
+            if base_updates is None:
+                __update_base_param(approx_param_base, param, value, ndu)
+            else:
+                base_updates.append((param, value, ndu))
+        if rec_func is not None:
+            rec_func(param, approx_data)
+    return decoder.finish()
+
+
+def __get_dequant_target(target, dims):
+    ##target, if it can be written by Decoder.decodeAndDequantLayer, otherwise a new float32 array
+    if (
+        isinstance(target, np.ndarray) and baseline.get_dequant_format(target) is not None and
+        target.shape == tuple(dims) and target.flags.c_contiguous and target.flags.writeable
+    ):
+        return target
+    return np.zeros(dims, dtype=np.float32)
+
+
 def __decode_nnr_ndu_unit(nnr_gen, reader, bitstream, ndu, mps, lps, tpl, ndu_start, model_info, approx_data, bytes_read,
                           decoded_dc_tensorG, tool_if, hls_stats={}, set_model_info=True, oob_dict=None,
-                          approx_param_base=None, update_base_param=False):
+                          approx_param_base=None, update_base_param=False, decode_threads=1, payload_jobs=None, rec_func=None, out=None):
     block_id = None
     parameter_index = len(model_info["parameter_index"].keys())
     add_block_id_to_model_info = False
@@ -592,9 +736,9 @@ def __decode_nnr_ndu_unit(nnr_gen, reader, bitstream, ndu, mps, lps, tpl, ndu_st
     hls_stats["ndu_bytes"].append(bytes_ndu)
     if block_id is not None:
         assert approx_data["compressed_parameter_types"][block_id] == cpt
-    decoder = deepCABAC.Decoder()
-    decoder_initialized = False
+    payload_params = []
     for par_type, param, dims in params:
+        entryPoints = None
         if ndu["nnr_compressed_data_unit_payload_type"] == hls.CompressedDataUnitPayloadType.NNR_PT_RAW_FLOAT:
             assert param not in approx_data["approx_method"]
             approx_data["parameters"][param] = ndu["raw_float32_parameter"]
@@ -674,8 +818,6 @@ def __decode_nnr_ndu_unit(nnr_gen, reader, bitstream, ndu, mps, lps, tpl, ndu_st
                         elif param.endswith("_H"):
                             entryPoints =  ndu["cabac_entry_point_list"][numBlockRowsMinus1G:(numBlockRowsMinus1G+numBlockRowsMinus1H)]
 
-                    decoder.setEntryPoints( entryPoints )
-
 
             tensorDimensions = dims
 
@@ -689,40 +831,21 @@ def __decode_nnr_ndu_unit(nnr_gen, reader, bitstream, ndu, mps, lps, tpl, ndu_st
             elif param.endswith("_H"):
                 dims = tensorDimensionsH
 
-            approx_data["parameters"][param] = np.zeros(dims, dtype=np.int32)
+            dequant_target = None
+            if out is not None and approx_data["approx_method"][param] == 'uniform' and approx_param_base is None:
+                dequant_target = __get_dequant_target(out.get(param), dims)
+            if dequant_target is not None:
+                approx_data["parameters"][param] = dequant_target # dequantized while decoding (see baseline.decode)
+            else:
+                approx_data["parameters"][param] = np.zeros(dims, dtype=np.int32)
             if bytes_ndu != 0:  # Decode only if it is not a skipped ndu
-                if not decoder_initialized:
-                    decoder.setStream(bitstream[bytes_read + bytes_ndu:])
-                    decoder_initialized = True
-                baseline.decode(
-                    decoder,
-                    approx_data,
-                    approx_param_base if approx_param_base else None,
-                    param,
-                    ndu,
-                    mps,
-                    ndu_start,
-                    tool_if,
-                    lps
-                )
-                if approx_param_base is not None and update_base_param:
-                    if param not in approx_param_base["put_node_depth"]:
-                        approx_param_base["put_node_depth"][
-                            param] = 1  # The first node is already the first child node as the base model is the root node
-                    else:
-                        approx_param_base["put_node_depth"][param] += 1
-                    if not approx_param_base["device_id"]:
-                        approx_param_base["device_id"] = ndu["device_id"]
-                    else:
-                        assert approx_param_base["device_id"] == ndu["device_id"], "Unexpected device_id!"
-                    if param not in approx_param_base["parameter_id"]:
-                        approx_param_base["parameter_id"][param] = ndu["parameter_id"]
-                    else:
-                        assert approx_param_base["parameter_id"][param] == ndu["parameter_id"], "Unexpected parameter_id!"
-                    approx_param_base["parameters"][param] = copy.deepcopy(approx_data["parameters"][param])
+                payload_params.append( (param, entryPoints) )
             else:
                 approx_data["qp"][param] = 0
                 approx_data["dq_flag"][param] = 0
+                if dequant_target is not None:
+                    dequant_target.fill(0)
+                    del approx_data["approx_method"][param]
 
 
         if lps is not None:
@@ -747,14 +870,25 @@ def __decode_nnr_ndu_unit(nnr_gen, reader, bitstream, ndu, mps, lps, tpl, ndu_st
             model_info["performance_map_flags"]["mps_unification_flag"][param]                   = 0
             model_info["performance_map_flags"]["mps_decomposition_performance_map_flag"][param] = 0
         
-    if decoder_initialized:
-        bytes_ndu += decoder.finish()
-    assert bytes_ndu == ndu["nnr_unit_size"], "nnr_unit_size doesn't match the number of decoded bytes."
+    ##payloads decoded as payload jobs return their updates of approx_param_base, which are applied after all jobs finished
+    def decode_payload(base_updates=None):
+        payload_bytes = 0
+        if payload_params:
+            payload_bytes = __decode_ndu_payload(bitstream, bytes_read + bytes_ndu, payload_params, ndu, mps, lps, ndu_start,
+                                                 approx_data, approx_param_base, update_base_param, tool_if, decode_threads, rec_func,
+                                                 base_updates)
+        assert bytes_ndu + payload_bytes == ndu["nnr_unit_size"], "nnr_unit_size doesn't match the number of decoded bytes."
+        return base_updates
+
+    if payload_jobs is None:
+        decode_payload()
+    else:
+        payload_jobs.append(decode_payload)
 
-    return bytes_ndu, decoded_dc_tensorG
+    return ndu["nnr_unit_size"], decoded_dc_tensorG
 
 
-def __decode_nnr_unit(reader, bitstream, bytes_read, ndu_start, mps, lps, tpl, model_info, approx_data, nnr_ndu_decoded, decoded_dc_tensorG, set_model_info, tool_if, approx_param_base, update_base_param, oob_dict, hls_stats={}):
+def __decode_nnr_unit(reader, bitstream, bytes_read, ndu_start, mps, lps, tpl, model_info, approx_data, nnr_ndu_decoded, decoded_dc_tensorG, set_model_info, tool_if, approx_param_base, update_base_param, oob_dict, hls_stats={}, decode_threads=1, payload_jobs=None, rec_func=None, out=None):
     bytes_ndu = 0
     ndu = {}
     g = hls.decode_nnr_unit_size_and_header(reader, ndu)
@@ -879,7 +1013,8 @@ def __decode_nnr_unit(reader, bitstream, bytes_read, ndu_start, mps, lps, tpl, m
         bytes_ndu, decoded_dc_tensorG = __decode_nnr_ndu_unit(g, reader, bitstream, ndu, mps, lps, tpl, ndu_start,
                                                               model_info, approx_data, bytes_read, decoded_dc_tensorG,
                                                               tool_if, hls_stats, set_model_info, oob_dict,
-                                                              approx_param_base, update_base_param)
+                                                              approx_param_base, update_base_param, decode_threads,
+                                                              payload_jobs, rec_func, out)
 
     else:
         assert 0, "nnr_unit_type: {} is not specified!".format(ndu["nnr_unit_type"])
@@ -888,14 +1023,8 @@ def __decode_nnr_unit(reader, bitstream, bytes_read, ndu_start, mps, lps, tpl, m
 
     return bytes_ndu, mps, lps, tpl, model_info, approx_data, nnr_ndu_decoded, decoded_dc_tensorG
 
-def decode(bitstream, model_info, oob_dict = None , tool_if=None, hls_stats = {}, approx_param_base=None, update_base_param=False):
-    assert isinstance(bitstream, (bytearray, bytes))
-
-    if not isinstance(bitstream, bytearray):
-        bitstream = bytearray(bitstream)
-
-    hls_stats["ndu_bytes"] = []
-    approx_data = {
+def __init_dec_approx_data():
+    return {
         "approx_method": {},
         "parameters": {},
         "compressed_parameter_types": {},
@@ -904,6 +1033,11 @@ def decode(bitstream, model_info, oob_dict = None , tool_if=None, hls_stats = {}
         "codebooks_egk": {},
         "codebook_zero_offsets": {}
     }
+
+
+def __decode_units(bitstream, model_info, approx_data, oob_dict, tool_if, hls_stats, approx_param_base, update_base_param, decode_threads, payload_jobs, rec_func, tensors, out=None):
+    ##decodes the NNR units one after another and yields after each unit
+    hls_stats["ndu_bytes"] = []
     mps = None
     lps = None
     tpl = None
@@ -919,9 +1053,27 @@ def decode(bitstream, model_info, oob_dict = None , tool_if=None, hls_stats = {}
     bytes_start = __decode_nnr_start_unit(nnr_gen, ndu_start, hls_stats )
     bytes_read = [bytes_start]
 
+    ##random access: NDUs not containing any of the requested tensors are skipped based on the bitstream index
+    skipped_units = {}
+    if tensors is not None:
+        requested = set(tensors)
+        found = set()
+        for unit in index(bitstream):
+            if unit["nnr_unit_type"] == hls.NnrUnitType.NNR_NDU:
+                unit_tensors = set(unit["topology_elem_ids"]) | set(__get_base_param_name(x) for x in unit["topology_elem_ids"])
+                if unit_tensors & requested:
+                    found |= unit_tensors & requested
+                else:
+                    skipped_units[unit["offset"]] = unit["nnr_unit_size"]
+        assert found == requested, "Tensors not present in the bitstream: {}".format(sorted(requested - found))
+
     while( bytes_read[0] < len(bitstream) ): ##Check if there are still remaining NNR Units! ##TODO: Consider having an own function for each case!
 
-        reader = hls.BitReader(bitstream[bytes_read[0]:])
+        if bytes_read[0] in skipped_units:
+            bytes_read[0] += skipped_units[bytes_read[0]]
+            continue
+
+        reader = hls.BitReader(bitstream, bytes_read[0])
 
         bytes_ndu, mps, lps, tpl, model_info, approx_data, nnr_ndu_decoded, decoded_dc_tensorG = __decode_nnr_unit( reader,
                                                                                                                     bitstream,
@@ -940,17 +1092,55 @@ def decode(bitstream, model_info, oob_dict = None , tool_if=None, hls_stats = {}
                                                                                                                     update_base_param,
                                                                                                                     oob_dict,
                                                                                                                     hls_stats,
+                                                                                                                    decode_threads,
+                                                                                                                    payload_jobs,
+                                                                                                                    rec_func,
+                                                                                                                    out,
                                                                                                                 )
 
         bytes_read[0] += bytes_ndu
+        yield
+
+
+
+def decode(bitstream, model_info, oob_dict = None , tool_if=None, hls_stats = {}, approx_param_base=None, update_base_param=False, decode_threads=1, ndu_threads=1, rec_func=None, tensors=None, out=None):
+    ##with out (a dict, possibly empty), uniformly quantized tensors are dequantized while decoding: into out[param] if it is a
+    ##C-contiguous float32/float16/bfloat16 array of the decoded shape, otherwise into a new float32 array;
+    ##the bitstream may be any buffer, e.g. a memory-mapped file, it is not copied
+    assert isinstance(bitstream, (bytearray, bytes, memoryview, mmap.mmap))
+
+    approx_data = __init_dec_approx_data()
+
+    ##with ndu_threads > 1 all units are indexed first (headers parsed, arrays allocated) and the NDU payloads are decoded concurrently afterwards
+    payload_jobs = [] if ndu_threads > 1 else None
+
+    for _ in __decode_units(bitstream, model_info, approx_data, oob_dict, tool_if, hls_stats, approx_param_base, update_base_param, decode_threads, payload_jobs, rec_func, tensors, out): pass
+
+    if payload_jobs:
+        ##approx_param_base is only updated after all payloads have been decoded, serially and in bitstream order
+        base_updates = [updates for _, updates in __ordered_map(lambda job: job([]), payload_jobs, ndu_threads)]
+        for updates in base_updates:
+            for param, value, ndu in updates:
+                __update_base_param(approx_param_base, param, value, ndu)
 
     return approx_data
 
 
+def decode_iter(bitstream, model_info, oob_dict = None , tool_if=None, hls_stats = {}, decode_threads=1, rec_func=None, tensors=None, out=None):
+    ##yields (param, array) for the tensors of each NDU as soon as it is decoded and drops them from the decoder state;
+    ##the bitstream may be any buffer, e.g. a memory-mapped file
+    assert isinstance(bitstream, (bytearray, bytes, memoryview, mmap.mmap))
+
+    approx_data = __init_dec_approx_data()
+    for _ in __decode_units(bitstream, model_info, approx_data, oob_dict, tool_if, hls_stats, None, False, decode_threads, None, rec_func, tensors, out):
+        for param in list(approx_data["parameters"]):
+            if rec_func is not None:
+                rec_func(param, approx_data) # tensors of skipped NDUs have not been reconstructed yet
+            yield param, approx_data["parameters"].pop(param)
+
+
 def decode_ndu_unit_header(bitstream, model_info, hls_stats={}):
-    assert isinstance(bitstream, (bytearray, bytes))
-    if not isinstance(bitstream, bytearray):
-        bitstream = bytearray(bitstream)
+    assert isinstance(bitstream, (bytearray, bytes, memoryview, mmap.mmap))
 
     hls_stats["ndu_bytes"] = []
     approx_data = {
@@ -976,7 +1166,7 @@ def decode_ndu_unit_header(bitstream, model_info, hls_stats={}):
 
     while (bytes_read[0] < len(bitstream)):  ##Check if there are still remaining NNR Units! ##TODO: Consider having an own function for each case!
         bytes_ndu = 0
-        reader = hls.BitReader(bitstream[bytes_read[0]:])
+        reader = hls.BitReader(bitstream, bytes_read[0])
         ndu = {}
         g = hls.decode_nnr_unit_size_and_header(reader, ndu)
         next(g)  # start decoding of the nnr unit size and header and stop at nnr unit type
@@ -1026,4 +1216,61 @@ def decode_ndu_unit_header(bitstream, model_info, hls_stats={}):
             next(g)  # continue after decoding nnr unit type and stop after input_parameters_present_flag
 
             return ndu
-        bytes_read[0] += bytes_ndu
\ No newline at end of file
+        bytes_read[0] += bytes_ndu
+
+def __get_base_param_name(param):
+    return param[:-2] if param.endswith("_G") or param.endswith("_H") else param
+
+
+def index(bitstream):
+    ##parses nnr_unit_size and the NDU headers only, NDU payloads are skipped
+    assert isinstance(bitstream, (bytearray, bytes, memoryview, mmap.mmap))
+
+    ndu_start = {}
+    nnr_gen = hls.decode_nnr_unit(bitstream, ndu_start)
+    next(nnr_gen)  # start decoding and stop at nnr unit type
+    assert ndu_start["nnr_unit_type"] == hls.NnrUnitType.NNR_STR, "First nnr unit shall be of type NNR_STR."
+    bytes_start = __decode_nnr_start_unit(nnr_gen, ndu_start)
+
+    units = [{"offset": 0, "nnr_unit_size": bytes_start, "nnr_unit_type": hls.NnrUnitType.NNR_STR}]
+    mps = None
+    bytes_read = bytes_start
+    while bytes_read < len(bitstream):
+        reader = hls.BitReader(bitstream, bytes_read)
+        ndu = {}
+        g = hls.decode_nnr_unit_size_and_header(reader, ndu)
+        next(g)  # start decoding of the nnr unit size and header and stop at nnr unit type
+        unit = {"offset": bytes_read, "nnr_unit_size": ndu["nnr_unit_size"], "nnr_unit_type": hls.NnrUnitType(ndu["nnr_unit_type"])}
+
+        if ndu["nnr_unit_type"] == hls.NnrUnitType.NNR_MPS:
+            __decode_nnr_mps_unit(g, reader, ndu, ndu_start)
+            mps = ndu
+        elif ndu["nnr_unit_type"] == hls.NnrUnitType.NNR_NDU:
+            assert mps is not None, "An NNR_MPS shall precede any NNR_NDU!"
+            ndu.update({"mps_topology_indexed_reference_flag": mps["mps_topology_indexed_reference_flag"]})
+            ndu.update({"mps_parent_signalling_enabled_flag": mps.get("mps_parent_signalling_enabled_flag", 0)})
+            ndu.update({"general_profile_idc": ndu_start.get("general_profile_idc", 0)})
+            next(g)  # continue after decoding nnr unit type and stop after input_parameters_present_flag
+
+            if ndu["mps_topology_indexed_reference_flag"]:
+                raise NotImplementedError("Indexing of topology element references not yet implemented!")
+            if ndu["nnr_multiple_topology_elements_present_flag"]:
+                topology_elem_ids = list(ndu["topology_elem_id_list"])
+            else:
+                topology_elem_ids = [ndu["topology_elem_id"]]
+
+            unit["topology_elem_ids"] = topology_elem_ids
+            unit["nnr_compressed_data_unit_payload_type"] = hls.CompressedDataUnitPayloadType(ndu["nnr_compressed_data_unit_payload_type"])
+            unit["tensor_dimensions"] = None
+            unit["payload_offset"] = None
+            if "count_tensor_dimensions" in ndu: # the rest of the header can only be parsed if the tensor dimensions are transmitted in the bitstream
+                unit["tensor_dimensions"] = [int(x) for x in ndu["tensor_dimensions"]]
+                if ndu["compressed_parameter_types"] & hls.BlockParameterTypes.NNR_CPT_DC != 0:
+                    ndu["_decomposed_tensor_type"] = "G" if topology_elem_ids[0].endswith("_G") else "H"
+                next(g)  # continue decoding of the nnr unit size and header
+                unit["payload_offset"] = bytes_read + reader.getNumBytesTouched()
+
+        units.append(unit)
+        bytes_read += ndu["nnr_unit_size"]
+
+    return units
@@ -39,21 +39,80 @@ POSSIBILITY OF SUCH DAMAGE.
 '''
 
 from nncodec.nnc_core import hls
+from nncodec.nnc_core.common import to_float32
 import numpy as np
 from nncodec.extensions.deepCABAC import HdspMode
 
 from nncodec.nnc_core.hdsp.hdsp_tool import HDSP_OPTS_OFF
 
-def encode(encoder, approx_data, approx_param_base, param, ndu, mps, general_profile_idc, param_opt_flag, rowSkipFlag, tool_if, mode, lps):
-    if (
+def encode(encoder, approx_data, approx_param_base, param, ndu, mps, general_profile_idc, param_opt_flag, rowSkipFlag, tool_if, mode, lps, reconstruction=None):
+    qp_offset_present = (
         (ndu["nnr_compressed_data_unit_payload_type"] == hls.CompressedDataUnitPayloadType.NNR_PT_FLOAT) or
         (ndu["nnr_compressed_data_unit_payload_type"] == hls.CompressedDataUnitPayloadType.NNR_PT_BLOCK)
-    ):
+    )
+    if qp_offset_present:
         quantization_parameter =  lps["lps_quantization_parameter"] if lps is not None else mps["mps_quantization_parameter"]
         qp_density             =  lps["lps_qp_density"] if lps is not None else mps["mps_qp_density"]
+
+    if param in approx_data.get("quantize_on_encode", {}):
+        __quantize_and_encode(encoder, approx_data, param, ndu, quantization_parameter if qp_offset_present else None, general_profile_idc, param_opt_flag, rowSkipFlag, reconstruction)
+        return
+
+    if qp_offset_present:
         encoder.iae_v( 6 + qp_density, approx_data["qp"][param] - quantization_parameter)
     
     encoder.initCtxModels( ndu["cabac_unary_length_minus1"]+1, param_opt_flag )
+    base_param, layer_args = __get_layer_args(approx_data, approx_param_base, param, ndu, general_profile_idc, rowSkipFlag, tool_if, mode)
+    if base_param is not None:
+        encoder.encodeLayer2(approx_data["parameters"][param], base_param, *layer_args)
+    else:
+        encoder.encodeLayer(approx_data["parameters"][param], *layer_args)
+
+
+def __quantize_and_encode(encoder, approx_data, param, ndu, quantization_parameter, general_profile_idc, param_opt_flag, rowSkipFlag, reconstruction):
+    ##quantizes the float tensor and encodes qp offset and indices in one native call; the dequantized tensor is stored
+    ##in reconstruction (if given)
+    assert approx_data["approx_method"][param] == "uniform", "Only uniformly quantized parameters can be quantized on encode."
+    lambda_scale, max_num_no_rem = approx_data["quantize_on_encode"][param]
+    values = to_float32(approx_data["parameters"][param])
+    scan_order = ndu.get("scan_order", 0) if values.ndim > 1 else 0
+    rec_values = np.zeros(values.shape if reconstruction is not None else 0, dtype=np.float32)
+
+    qp = encoder.quantizeAndEncodeLayer(
+        values,
+        rec_values,
+        approx_data["dq_flag"][param],
+        approx_data["qp_density"],
+        approx_data["qp"][param],
+        quantization_parameter is not None,
+        quantization_parameter if quantization_parameter is not None else 0,
+        lambda_scale,
+        max_num_no_rem,
+        ndu["cabac_unary_length_minus1"]+1,
+        param_opt_flag,
+        scan_order,
+        general_profile_idc,
+        ndu.get('parent_node_id_present_flag', 0),
+        rowSkipFlag,
+        *HDSP_OPTS_OFF()
+    )
+    if qp != approx_data["qp"][param]:
+        print("INFO: QP for {} has been clipped from {} to {} to avoid int32_t overflow!".format(param, approx_data["qp"][param], qp))
+        approx_data["qp"][param] = qp
+    if reconstruction is not None:
+        reconstruction[param] = rec_values
+
+
+def estimate_bits(encoder, approx_data, approx_param_base, param, ndu, general_profile_idc, param_opt_flag, rowSkipFlag, tool_if, mode):
+    ##estimated rate of the parameter payload in bits (without the qp), no bytes are produced
+    encoder.initCtxModels( ndu["cabac_unary_length_minus1"]+1, param_opt_flag )
+    base_param, layer_args = __get_layer_args(approx_data, approx_param_base, param, ndu, general_profile_idc, rowSkipFlag, tool_if, mode)
+    if base_param is not None:
+        return encoder.estimateLayerBits2(approx_data["parameters"][param], base_param, *layer_args)
+    return encoder.estimateLayerBits(approx_data["parameters"][param], *layer_args)
+
+
+def __get_layer_args(approx_data, approx_param_base, param, ndu, general_profile_idc, rowSkipFlag, tool_if, mode):
     if param in approx_data["scan_order"]:
         assert ndu["scan_order"] == approx_data["scan_order"][param], "All parameters of a block must use the same scan_order."
     scan_order = ndu.get("scan_order", 0)
@@ -88,13 +147,26 @@ def encode(encoder, approx_data, approx_param_base, param, ndu, mps, general_pro
     else:
         hdsp_opts = HDSP_OPTS_OFF()
 
+    layer_args = (approx_data["dq_flag"][param], scan_order, general_profile_idc, ndu.get('parent_node_id_present_flag', 0), rowSkipFlag, chan_skip_list, *hdsp_opts, codebook_size, codebook_zero_offset)
+
     if ndu.get("temporal_context_modeling_flag", 0) and general_profile_idc == 1 and approx_param_base:
         assert ndu["device_id"] == approx_param_base["device_id"], "device_id of the current NDU and of the reference NDU shall be equal!"
         assert ndu["parameter_id"] == approx_param_base["parameter_id"][param], "parameter_id of the current NDU and of the reference NDU shall be equal!"
         assert ndu["put_node_depth"]-1 == approx_param_base["put_node_depth"][param], "put_node_depth-1 of the current NDU shall be equal to the put_node_depth of the reference NDU!"
-        encoder.encodeLayer2(approx_data["parameters"][param], approx_param_base["parameters"][param], approx_data["dq_flag"][param], scan_order, general_profile_idc, ndu.get('parent_node_id_present_flag', 0), rowSkipFlag, chan_skip_list, *hdsp_opts, codebook_size, codebook_zero_offset)
-    else:
-        encoder.encodeLayer(approx_data["parameters"][param], approx_data["dq_flag"][param], scan_order, general_profile_idc, ndu.get('parent_node_id_present_flag', 0), rowSkipFlag, chan_skip_list, *hdsp_opts , codebook_size, codebook_zero_offset)
+        return approx_param_base["parameters"][param], layer_args
+    return None, layer_args
+
+
+def get_dequant_format(array):
+    ##output format of Decoder.decodeAndDequantLayer for the array: 0 (float32), 1 (float16), 2 (bfloat16, given as
+    ##ml_dtypes.bfloat16 or as its bit patterns in an int16/uint16 array) or None if the dtype is not supported
+    if array.dtype == np.float32:
+        return 0
+    elif array.dtype == np.float16:
+        return 1
+    elif array.dtype.name == "bfloat16" or array.dtype in (np.int16, np.uint16):
+        return 2
+    return None
 
 
 def decode( decoder, approx_data, approx_param_base, param, ndu, mps, ndu_start, tool_if, lps ):
@@ -132,7 +204,13 @@ def decode( decoder, approx_data, approx_param_base, param, ndu, mps, ndu_start,
         hdsp_opts = tool_if.get_opts(param, "d", None)
     else:
         hdsp_opts = HDSP_OPTS_OFF()
-    if ndu.get("temporal_context_modeling_flag", 0) and general_profile_idc == 1 and approx_param_base:
+    if approx_data["parameters"][param].dtype != np.int32:
+        ##the decoder provided a float target (see coder.decode), the tensor is dequantized while decoding and needs no reconstruction
+        assert approx_data["approx_method"][param] == "uniform", "Only uniformly quantized parameters can be dequantized on decode."
+        decoder.decodeAndDequantLayer(approx_data["parameters"][param], get_dequant_format(approx_data["parameters"][param]), approx_data["dq_flag"][param],
+                                      approx_data["qp_density"], approx_data["qp"][param], scan_order, general_profile_idc, ndu.get('parent_node_id_present_flag', 0), *hdsp_opts)
+        del approx_data["approx_method"][param]
+    elif ndu.get("temporal_context_modeling_flag", 0) and general_profile_idc == 1 and approx_param_base:
         assert ndu["device_id"] == approx_param_base["device_id"], "device_id of the current NDU and of the reference NDU shall be equal!"
         assert ndu["parameter_id"] == approx_param_base["parameter_id"][param], "parameter_id of the current NDU and of the reference NDU shall be equal!"
         assert ndu["put_node_depth"]-1 == approx_param_base["put_node_depth"][param], "put_node_depth-1 of the current NDU shall be equal to the put_node_depth of the reference NDU!"
@@ -38,7 +38,7 @@ ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 POSSIBILITY OF SUCH DAMAGE.
 '''
 
-from nncodec.nnc_core import hls
+from nncodec.nnc_core import hls, common
 import numpy as np
 from nncodec.nnc_core import nnr_model
 
@@ -222,7 +222,7 @@ def compile_ndu(param, approx_data, enc_info, model_info, ndu_oob, is_block, cpt
     else:
         assert param not in approx_data["approx_method"], "Unsupported approx_method."
         ndu_header["nnr_compressed_data_unit_payload_type"] = hls.CompressedDataUnitPayloadType.NNR_PT_RAW_FLOAT
-        ndu_header["raw_float32_parameter"] = approx_data["parameters"][param]
+        ndu_header["raw_float32_parameter"] = common.to_float32(approx_data["parameters"][param])
         if enc_info.get("general_profile_idc", 0):
             ndu_header["parameter_id"] = model_info["parameter_index"][param]
 
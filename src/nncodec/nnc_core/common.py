@@ -40,6 +40,15 @@ POSSIBILITY OF SUCH DAMAGE.
 
 import numpy as np
 
+FLOAT_TYPES = ['float16', 'bfloat16', 'float32', 'float64']
+
+def is_float_tensor( x ):
+    return x.dtype.name in FLOAT_TYPES
+
+def to_float32( x ):
+    ##parameters may keep their floating point type (e.g. memory-mapped float16/bfloat16 checkpoints) until they are
+    ##quantized, they are converted tensor by tensor
+    return x if x.dtype == np.float32 else x.astype(np.float32)
 
     
 def get_qp_from_stepsize( stepsize, qp_density ):
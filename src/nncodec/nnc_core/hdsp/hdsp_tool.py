@@ -89,17 +89,15 @@ class HdspTool( ):
                 assert False, "Unknown inst" + inst
         return opts
 
-    def get_best_bit_stream_and_set_mode(self, param_names, bit_streams):
-        lens = [ len(x) for x in bit_streams ]
-
+    def set_best_mode(self, param_names, mode_bits):
         if False:
-            print( "Bytes of Modes: " + str( lens ) )
+            print( "Bits of Modes: " + str( mode_bits ) )
 
         # First is off
-        best_idx = np.argmin( lens )
+        best_idx = int( np.argmin( mode_bits ) )
         for param_name in param_names:
             self.best_mode_idx[param_name] = best_idx
-        return bit_streams[best_idx]
+        return best_idx
 
 
     def add_data_to_hist(self, enc_diff_rec_approx_data):
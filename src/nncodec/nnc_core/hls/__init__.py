@@ -39,6 +39,7 @@ POSSIBILITY OF SUCH DAMAGE.
 '''
 
 import enum
+import mmap
 import numpy as np
 import sys
 from nncodec.nnc_core import nnr_model
@@ -108,39 +109,48 @@ class BitWriter():
 
     def writeBit(self, bit ):
         assert bit == 0 or bit == 1
-        if self.__bitPos < 0:
-            self.__bytePos += 1
-            if len(self.__byteList) <= self.__bytePos:
-                self.__byteList.append( 0 )
-            self.__bitPos = 7
-        if bit:
-            self.__byteList[self.__bytePos] |= 1 << self.__bitPos
-        else:
-            self.__byteList[self.__bytePos] &= 255 - (1 << self.__bitPos)
-        self.__bitPos -= 1
+        self.u(1, int(bit))
 
     def u(self, n, x):
         assert n > 0
+        x = int(x)
         assert x >= 0 and x < (1<<n)
-        for i in range( n-1, -1, -1):
-            self.writeBit( (np.uint64(x) >> np.uint64(i)) & np.uint64(1) )
+        ##writes the field byte-wise, only the touched bits of an existing byte are replaced
+        byteList = self.__byteList
+        bytePos = self.__bytePos
+        bitPos = self.__bitPos
+        while n > 0:
+            if bitPos < 0:
+                bytePos += 1
+                if len(byteList) <= bytePos:
+                    byteList.append( 0 )
+                bitPos = 7
+            numBits = min( bitPos + 1, n )
+            n -= numBits
+            shift = bitPos + 1 - numBits
+            mask = ((1 << numBits) - 1) << shift
+            byteList[bytePos] = (byteList[bytePos] & ~mask) | (((x >> n) << shift) & mask)
+            bitPos -= numBits
+        self.__bytePos = bytePos
+        self.__bitPos = bitPos
 
     def ue(self, k, x):
-        while x >= (1<<k):
-            self.u(1, 0)
-            x -= 1<<k
-            k +=1
-
-        self.u(1, 1)
-        if k > 0:
-            self.u(k, x)
+        x = int(x)
+        assert x >= 0
+        ##number of prefix zeros p and suffix length k+p of the k-th order Exp-Golomb code
+        p = max( (x + (1<<k)).bit_length() - k - 1, 0 )
+        x -= ((1<<p) - 1) << k
+        k += p
+        self.u(p + 1 + k, (1<<k) | x)
 
     def i(self, n, x):
         assert n > 0
+        x = int(x)
         assert x >= -(1<<(n-1)) and x < (1<<(n-1))
         self.u( n, x if x >= 0 else x + (1<<n) )
 
     def ie(self, k, x):
+        x = int(x)
         x = ((-x)<<1) if x <= 0 else ((x<<1)-1)
         self.ue(k,x)
 
@@ -152,8 +162,7 @@ class BitWriter():
         assert n == 32
         assert self.__bytePos + 1 == len(self.__byteList) # only supported at end of the bitstream
         assert isinstance( x, np.float32 )
-        for byte in np.float32(x, dtype='<f4').tobytes():
-            self.u(8, byte)
+        self.u(32, int.from_bytes( np.float32(x, dtype='<f4').tobytes(), "big" ))
 
     def flt_tensor(self, n, dims, x):
         assert self.__bitPos == -1
@@ -188,56 +197,79 @@ class BitWriter():
         self.ie(2, codebook_center_offset)        
 
     def entry_point_list(self, block_rows_minus1, dq_flag, cabac_entry_point_list):
-        for j in range(block_rows_minus1):
-            ep = int(cabac_entry_point_list[j])
+        entry_points = [int(ep) for ep in cabac_entry_point_list[:block_rows_minus1]]
+        prev_bit_offset = 0
+        for j, ep in enumerate(entry_points):
             bit_offset  =  ep >> 11
             value       = (ep >>  3) & 255
             dq_state    =  ep & 7
-            self.u(8, value)
             if dq_flag:
-                self.u(3, dq_state)
+                self.u(11, (value << 3) | dq_state)
+            else:
+                self.u(8, value)
             if j == 0:
                 self.ue(11, bit_offset)
             else:
-                self.ie(7, bit_offset - (int(cabac_entry_point_list[j-1])>>11))
+                self.ie(7, bit_offset - prev_bit_offset)
+            prev_bit_offset = bit_offset
 
         
 class BitReader():
-    def __init__(self, byteList):
-        assert isinstance( byteList, bytearray )
-        self.__byteList = byteList
+    def __init__(self, byteList, offset=0):
+        assert isinstance( byteList, (bytearray, bytes, memoryview, mmap.mmap) )
+        assert 0 <= offset <= len( byteList )
+        ##reads through a view starting at offset, the bitstream is never sliced or copied
+        self.__byteList = memoryview( byteList ).cast( "B" )
+        self.__offset = offset
         self.__bitPos = -1
-        self.__bytePos = -1
+        self.__bytePos = offset - 1
     
     def readBit(self):
-        if self.__bitPos < 0:
-            self.__bytePos += 1
-            self.__bitPos = 7
-        bit = (self.__byteList[self.__bytePos] >> self.__bitPos) & 1
-        self.__bitPos -= 1
-        return bit
+        return self.u(1)
     
     def getNumBytesTouched(self):
-        return self.__bytePos + 1
+        return self.__bytePos + 1 - self.__offset
 
     def getNumBitsTouched(self):
-        return (self.__bytePos + 1) * 8 - self.__bitPos - 1
+        return (self.__bytePos + 1 - self.__offset) * 8 - self.__bitPos - 1
 
     def u(self, n):
+        ##reads the field byte-wise
+        byteList = self.__byteList
+        bytePos = self.__bytePos
+        bitPos = self.__bitPos
         val = 0
-        for i in range( n ):
-            val += val + self.readBit()
+        while n > 0:
+            if bitPos < 0:
+                bytePos += 1
+                bitPos = 7
+            numBits = min( bitPos + 1, n )
+            n -= numBits
+            bitPos -= numBits
+            val = (val << numBits) | ((byteList[bytePos] >> (bitPos + 1)) & ((1 << numBits) - 1))
+        self.__bytePos = bytePos
+        self.__bitPos = bitPos
         return val
 
     def ue(self, k):
-        x = 0
-        bit = 1
-        while bit:
-            bit = 1 - self.u(1)
-            x += bit << k
-            k += 1
-
-        k -= 1
+        ##count the prefix zeros byte-wise up to the terminating one bit
+        byteList = self.__byteList
+        p = 0
+        while True:
+            if self.__bitPos < 0:
+                self.__bytePos += 1
+                self.__bitPos = 7
+            bits = byteList[self.__bytePos] & ((2 << self.__bitPos) - 1)
+            if bits:
+                numZeros = self.__bitPos + 1 - bits.bit_length()
+                p += numZeros
+                self.__bitPos -= numZeros + 1
+                break
+            p += self.__bitPos + 1
+            self.__bitPos = -1
+
+        x = ((1<<p) - 1) << k
+        k += p
         if k > 0:
             x += self.u(k)
         return x
@@ -256,31 +288,34 @@ class BitReader():
 
     def flt(self, n ):
         assert n == 32
-        dec_bytes = np.uint32(0)
-        dec_bytes += self.u(8)
-        dec_bytes += self.u(8) << 8
-        dec_bytes += self.u(8) << 16
-        dec_bytes += self.u(8) << 24
-        z = np.frombuffer( dec_bytes.tobytes(), dtype='<f4', count=1 )
+        z = np.frombuffer( self.u(32).to_bytes( 4, "big" ), dtype='<f4', count=1 )
         return z
 
     def flt_tensor(self, n, dims ):
         assert self.__bitPos == -1
         assert n == 32
-        count = np.prod(dims)
-        z = np.frombuffer( self.__byteList[self.__bytePos+1:], dtype=np.float32, count=count ).reshape(dims)
+        count = int( np.prod(dims) )
+        z = np.frombuffer( self.__byteList, dtype=np.float32, count=count, offset=self.__bytePos+1 ).reshape(dims).copy()
         self.__bytePos += 4 * count 
         return z
 
     def st(self):
+        ##the NUL terminator is searched in windows of growing size, which are the only bytes copied
         assert self.__bitPos == -1
-        remainingBytes = self.__byteList[self.__bytePos+1:]
-        strLen = remainingBytes.find( 0 )
-        self.__bytePos += strLen + 1
-        return  remainingBytes[:strLen].decode( "utf-8", "strict" )
+        strStart = self.__bytePos + 1
+        strLength = -1
+        window = 64
+        while strLength < 0:
+            chunk = bytes( self.__byteList[strStart:strStart + window] )
+            strLength = chunk.find( 0 )
+            if strLength < 0:
+                assert strStart + window < len( self.__byteList ), "String is not terminated!"
+                window *= 4
+        self.__bytePos = strStart + strLength
+        return chunk[:strLength].decode( "utf-8", "strict" )
 
     def codebook(self, codebook_egk, codebook_size, CbZeroOffset):
-        codebook = np.zeros(codebook_size, dtype=np.int32)
+        codebook = [0] * codebook_size
         previousValue = self.ie(7) # codebook_zero_value
         codebook[CbZeroOffset] = previousValue
         for j in range(CbZeroOffset-1, -1, -1):
@@ -290,7 +325,7 @@ class BitReader():
         for j in range(CbZeroOffset+1, codebook_size):
             codebook[j] = self.ue(codebook_egk) + previousValue + 1 # codebook_delta_right
             previousValue = codebook[j]
-        return codebook
+        return np.array(codebook, dtype=np.int32)
 
     def cbZeroOffset( self, codebook_size ):
         codebook_center_offset = self.ie(2)
@@ -298,18 +333,19 @@ class BitReader():
         return CbZeroOffset
         
     def entry_point_list(self, block_rows_minus1, dq_flag):
-        cabac_entry_point_list = np.zeros(block_rows_minus1, dtype=np.uint64)
+        cabac_entry_point_list = [0] * block_rows_minus1
+        bit_offset = 0
         for j in range(block_rows_minus1):
-            value       = self.u(8)
-            dq_state = 0
             if dq_flag:
-                dq_state    = self.u(3)
+                value_and_dq_state = self.u(11)
+            else:
+                value_and_dq_state = self.u(8) << 3
             if j == 0:
                 bit_offset = self.ue(11)
             else:
-                bit_offset = (int(cabac_entry_point_list[j-1])>>11) + self.ie(7)
-            cabac_entry_point_list[j] = (bit_offset<<11) + (value<<3) + dq_state
-        return cabac_entry_point_list
+                bit_offset += self.ie(7)
+            cabac_entry_point_list[j] = (bit_offset<<11) + value_and_dq_state
+        return np.array(cabac_entry_point_list, dtype=np.uint64)
 
 class Coder():
     def __init__(self, coder, seDict ):
@@ -773,8 +809,8 @@ def encode_nnr_unit_with_size_dummy(nnr_unit):
     return bs
 
 
-def decode_nnr_unit(bitstream, nnr_unit):
-    reader = BitReader(bitstream)
+def decode_nnr_unit(bitstream, nnr_unit, offset=0):
+    reader = BitReader(bitstream, offset)
     yield from decode_nnr_unit_size_and_header(reader, nnr_unit)
     decode_nnr_unit_payload(reader, nnr_unit)
     yield reader.getNumBytesTouched()
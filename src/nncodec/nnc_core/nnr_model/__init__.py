@@ -158,7 +158,7 @@ class NNRModel():
 
         type_list_int = ['int8', 'int16', 'int32', 'uint8', 'uint16', 'uint32']
         type_list_1_bytes = ['int8', 'uint8']
-        type_list_2_bytes = ['int16', 'uint16', 'float16']
+        type_list_2_bytes = ['int16', 'uint16', 'float16', 'bfloat16']
         original_size = 0
 
         for i, module_name in enumerate(model_dict):
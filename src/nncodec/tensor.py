@@ -41,6 +41,7 @@ import os
 import torch
 import numpy as np
 from nncodec import nnc
+from nncodec.framework.pytorch_model import tensor_to_numpy
 from nncodec.framework.applications.utils.sparsification import apply_struct_spars_v2, apply_unstruct_spars_v2, get_sparsity
 
 nncargs = {'approx_method': 'uniform',
@@ -62,6 +63,7 @@ nncargs = {'approx_method': 'uniform',
             'tensor_path': None,
             'use_dq': True,
             'qp_per_tensor': None,  # dict containing one qp value per parameter {Tensor1: -32, Tensor2: -40}
+            'target_size': None,  # optional size limit of the bitstream in bytes; overwrites the QPs
             'verbose': True
            }
 
@@ -80,8 +82,8 @@ def encode(tensor, args=None, approx_param_base=None, quantize_only=False):
 
     type_list_int = ['int8', 'int16', 'int32', 'int64', 'uint8', 'uint16', 'uint32', 'uint64']
     if isinstance(tensor, torch.Tensor):
-        nnc_tensor = {f'{args["tensor_id"]}': np.int32(tensor.data.cpu().detach().numpy()) if tensor.data.cpu().detach().numpy().dtype in type_list_int
-                                                                        else tensor.data.cpu().detach().numpy()}
+        array = tensor_to_numpy(tensor)
+        nnc_tensor = {f'{args["tensor_id"]}': array.astype(np.int32, copy=False) if array.dtype in type_list_int else array}
     elif isinstance(tensor, np.ndarray):
         nnc_tensor = {f'{args["tensor_id"]}': np.int32(tensor) if tensor.dtype in type_list_int else np.float32(tensor)}
 
@@ -100,6 +102,7 @@ def encode(tensor, args=None, approx_param_base=None, quantize_only=False):
                       qp_per_tensor=args["qp_per_tensor"],
                       use_dq=args["use_dq"],
                       opt_qp=args["opt_qp"],
+                      target_size_bytes=args["target_size"],
                       row_skipping=args["row_skipping"],
                       tca=args["tca"],
                       verbose=args["verbose"],